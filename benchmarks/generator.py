@@ -0,0 +1,115 @@
+import argparse
+import datetime
+import json
+import math
+import random
+import sys
+
+CLIENTS = ["easyjet", "booking", "airbnb", "skyscanner", "zalando", "asos", "trivago", "expedia", "hostelworld",
+           "deliveroo"]
+LANGUAGES = ["en", "fr", "de", "es", "it", "pt", "nl", "pl", "ja", "zh"]
+START = datetime.datetime(2018, 12, 26, 18, 11, 8, 509654)
+
+
+class EventGenerator:
+    """
+    Reproducible generator of `translation_delivered` events. Arrivals are a Poisson process whose rate switches
+    between a normal and a burst state, with occasional idle gaps of several minutes. Clients and languages follow a
+    Zipf-like popularity, word counts are log-normal and durations grow with the word count
+    """
+
+    def __init__(self, seed=0, rate=60.0, burstiness=0.1, burst_factor=10.0, idle_probability=0.0005,
+                 max_idle_minutes=120, mean_words=50, clients=5):
+        """
+        Event generator constructor
+        :param seed: seed of the random generator, the same seed always gives the same events
+        :param rate: average number of events per minute out of bursts
+        :param burstiness: probability, per event, of switching between the normal and the burst state
+        :param burst_factor: how many times the rate is multiplied during bursts
+        :param idle_probability: probability, per event, of an idle gap before the next event
+        :param max_idle_minutes: maximum length of idle gaps, in minutes
+        :param mean_words: median number of words per event
+        :param clients: number of distinct clients, at most `len(CLIENTS)`
+        """
+        self.random = random.Random(seed)
+        self.rate = rate
+        self.burstiness = burstiness
+        self.burst_factor = burst_factor
+        self.idle_probability = idle_probability
+        self.max_idle_minutes = max_idle_minutes
+        self.mean_words = mean_words
+        self.clients = CLIENTS[:clients]
+        self.client_weights = [1 / (rank + 1) for rank in range(len(self.clients))]
+        self.language_weights = [1 / (rank + 1) for rank in range(len(LANGUAGES))]
+
+    def events(self, count):
+        """
+        :param count: number of events
+        :return: generator of event dicts, in timestamp order
+        """
+        timestamp = START
+        bursting = False
+        for i in range(count):
+            if self.random.random() < self.burstiness:
+                bursting = not bursting
+            rate = self.rate * (self.burst_factor if bursting else 1)
+            seconds = self.random.expovariate(rate / 60)
+            if self.random.random() < self.idle_probability:
+                seconds += 60 * self.random.randint(1, self.max_idle_minutes)
+            timestamp += datetime.timedelta(seconds=seconds)
+
+            source_language, target_language = self.random.choices(LANGUAGES, self.language_weights, k=2)
+            words = max(0, int(self.random.lognormvariate(math.log(self.mean_words), 1)))
+            duration = max(1, int(words * self.random.uniform(0.2, 1.5) + self.random.expovariate(1 / 10)))
+            yield {
+                "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                "translation_id": "{0:020x}".format(self.random.getrandbits(80)),
+                "source_language": source_language,
+                "target_language": target_language,
+                "client_name": self.random.choices(self.clients, self.client_weights)[0],
+                "event_name": "translation_delivered",
+                "nr_words": words,
+                "duration": duration,
+            }
+
+    def write(self, output_file, count):
+        """
+        Writes events as input lines
+        :param output_file: text file object
+        :param count: number of events
+        :return: None
+        """
+        for event in self.events(count):
+            output_file.write(json.dumps(event) + "\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic translation events",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--events', type=int, default=100000, help="number of events")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random generator")
+    parser.add_argument('--rate', type=float, default=60.0, help="average events per minute out of bursts")
+    parser.add_argument('--burstiness', type=float, default=0.1,
+                        help="probability, per event, of entering or leaving a burst")
+    parser.add_argument('--burst_factor', type=float, default=10.0, help="rate multiplier during bursts")
+    parser.add_argument('--idle_probability', type=float, default=0.0005,
+                        help="probability, per event, of an idle gap before the next event")
+    parser.add_argument('--max_idle_minutes', type=int, default=120, help="maximum length of idle gaps")
+    parser.add_argument('--mean_words', type=int, default=50, help="median number of words per event")
+    parser.add_argument('--clients', type=int, default=5, choices=range(1, len(CLIENTS) + 1),
+                        help="number of distinct clients")
+    parser.add_argument('--output_file', help="Path for the output file. If not set stdout will be used")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    generator = EventGenerator(seed=args.seed, rate=args.rate, burstiness=args.burstiness,
+                               burst_factor=args.burst_factor, idle_probability=args.idle_probability,
+                               max_idle_minutes=args.max_idle_minutes, mean_words=args.mean_words,
+                               clients=args.clients)
+    if args.output_file:
+        with open(args.output_file, 'w') as f:
+            generator.write(f, args.events)
+    else:
+        generator.write(sys.stdout, args.events)
@@ -0,0 +1,186 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import tempfile
+import time
+import traceback
+
+from benchmarks.generator import EventGenerator
+from pynopticon.aggregator import AGGREGATOR_REGISTRY
+from pynopticon.api import create_aggregators
+from pynopticon.event_processor import EventProcessor
+from pynopticon.stats import peak_rss_mb
+from pynopticon.util import parse_fixed_timestamp, timestamp_floor
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+# every registered aggregator, the ones registered by a pattern with their 99th percentile
+DEFAULT_AGGREGATORS = [name.replace('<percentile>', '99') for name in AGGREGATOR_REGISTRY.names()]
+DEFAULT_WINDOW_SIZES = [1, 10, 60]
+# seconds between checks that a scenario process is still running while waiting for its result
+RESULT_POLL_SECONDS = 1
+
+
+def scenario_name(aggregator, window_size, use_word_count):
+    return "{0}-w{1}{2}".format(aggregator, window_size, "-words" if use_word_count else "")
+
+
+def run_scenario(input_file, aggregator, window_size, use_word_count, results):
+    """
+    Runs the `EventProcessor` pipeline over `input_file`, in a process of its own so that its peak memory is not
+    mixed up with the one of other scenarios
+    :param results: queue the `(seconds, peak RSS)` of the run are put into
+    :return: None
+    """
+    aggregators = create_aggregators([aggregator], [window_size], use_word_count=use_word_count)
+    start = time.perf_counter()
+    with EventProcessor(input_file, aggregators, ofile=os.devnull) as e:
+        e.execute()
+    results.put((time.perf_counter() - start, peak_rss_mb()))
+
+
+def scenario_process(input_file, aggregator, window_size, use_word_count, results):
+    """
+    Target of the scenario processes, see `run_scenario`. A failed run puts its traceback into `results` instead
+    :return: None
+    """
+    try:
+        run_scenario(input_file, aggregator, window_size, use_word_count, results)
+    except Exception:
+        results.put(traceback.format_exc())
+
+
+def measure(input_file, aggregator, window_size, use_word_count, repeat):
+    """
+    Raises `RuntimeError` if a run fails or its process exits without a result
+    :return: best time, in seconds, and highest peak RSS, in MiB, of `repeat` runs of a scenario
+    """
+    context = multiprocessing.get_context('spawn')
+    name = scenario_name(aggregator, window_size, use_word_count)
+    timings = []
+    for _ in range(repeat):
+        results = context.Queue()
+        process = context.Process(target=scenario_process,
+                                  args=(input_file, aggregator, window_size, use_word_count, results))
+        process.start()
+        timing = None
+        while timing is None:
+            try:
+                timing = results.get(timeout=RESULT_POLL_SECONDS)
+            except queue.Empty:
+                # the result of a process that just exited is still read
+                if not process.is_alive() and results.empty():
+                    break
+        process.join()
+        if isinstance(timing, str):
+            raise RuntimeError("scenario {0} failed:\n{1}".format(name, timing))
+        if timing is None or process.exitcode != 0:
+            raise RuntimeError("scenario {0} exited with code {1} without a result".format(name, process.exitcode))
+        timings.append(timing)
+    return min(seconds for seconds, _ in timings), max(rss for _, rss in timings)
+
+
+def input_size(input_file):
+    """
+    :return: number of events and of output minutes of `input_file`
+    """
+    events = 0
+    first = last = None
+    with open(input_file, 'r') as f:
+        for line in f:
+            timestamp = parse_fixed_timestamp(json.loads(line)['timestamp'])
+            first = first or timestamp
+            last = timestamp
+            events += 1
+    minutes = (timestamp_floor(last) - timestamp_floor(first)).total_seconds() // 60 + 2 if events > 0 else 0
+    return events, int(minutes)
+
+
+def compare(results, baselines, tolerance):
+    """
+    :param results: measured scenarios
+    :param baselines: stored scenarios
+    :param tolerance: relative slowdown or memory growth that is tolerated
+    :return: list of the descriptions of the regressions
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if result['events_per_second'] < baseline['events_per_second'] * (1 - tolerance):
+            regressions.append("{0}: {1:.0f} events/s, baseline {2:.0f}".format(
+                name, result['events_per_second'], baseline['events_per_second']))
+        if result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+            regressions.append("{0}: {1:.1f} MiB peak RSS, baseline {2:.1f}".format(
+                name, result['peak_rss_mb'], baseline['peak_rss_mb']))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the event processing pipeline on synthetic events",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--events', type=int, default=50000, help="number of generated events")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the event generator")
+    parser.add_argument('--input_file', help="benchmark this input instead of generated events")
+    parser.add_argument('--aggregator', nargs='+', default=DEFAULT_AGGREGATORS, help="aggregators to benchmark")
+    parser.add_argument('--window_size', type=int, nargs='+', default=DEFAULT_WINDOW_SIZES,
+                        help="window sizes to benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each scenario, the fastest one is reported")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="file of the stored baselines")
+    parser.add_argument('--save_baseline', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="relative slowdown or memory growth over the baselines reported as a regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_file = args.input_file
+        if input_file is None:
+            input_file = os.path.join(tmp_dir, "events.json")
+            with open(input_file, 'w') as f:
+                EventGenerator(seed=args.seed).write(f, args.events)
+        events, minutes = input_size(input_file)
+
+        results = {}
+        print("{0:<28} {1:>14} {2:>14} {3:>10}".format("scenario", "events/s", "minutes/s", "peak MiB"))
+        for window_size in args.window_size:
+            for aggregator in args.aggregator:
+                for use_word_count in [False, True]:
+                    seconds, rss = measure(input_file, aggregator, window_size, use_word_count, args.repeat)
+                    name = scenario_name(aggregator, window_size, use_word_count)
+                    results[name] = {
+                        'events_per_second': round(events / seconds),
+                        'minutes_per_second': round(minutes / seconds),
+                        'peak_rss_mb': round(rss, 1),
+                    }
+                    print("{0:<28} {1:>14,} {2:>14,} {3:>10.1f}".format(name, results[name]['events_per_second'],
+                                                                        results[name]['minutes_per_second'], rss))
+
+    environment = {'python': platform.python_version(), 'machine': platform.machine(), 'events': events,
+                   'minutes': minutes, 'seed': args.seed}
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': environment, 'scenarios': results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        return 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline['environment'] != environment:
+        print("baselines were measured with {0}, now {1}".format(baseline['environment'], environment))
+    regressions = compare(results, baseline['scenarios'], args.tolerance)
+    for regression in regressions:
+        print("REGRESSION {0}".format(regression))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,11 @@
-import datetime
+import math
+import re
+from bisect import bisect_left, insort
 from collections import deque
-from statistics import median
+
+from pynopticon.sketch import QuantileSketch
+from pynopticon.util import MINUTE_MICROSECONDS
+from pynopticon.window import EventWindow, event_value
 
 
 class BaseAggregator:
@@ -13,7 +18,6 @@ class BaseAggregator:
         :param use_word_count: if set to `True` aggregator will be using `word_count` attribute of the events to
         calculate the value that will be used in the output
         """
-        self.current_events = deque([])
         self.use_word_count = use_word_count
 
     def aggregate(self):
@@ -22,68 +26,130 @@ class BaseAggregator:
         """
         return 0.0
 
-    def add_event(self, event):
-        """
-        Adds event to the list of events that should be considered in aggregation
-        :param event: `Event` object
-        :return: None
-        """
-        self.current_events.append(event)
-
     def get_event_value(self, event):
         """
-        Calculates and returns the value that represents the contribution of the `event` in aggregation calculation
-        if `use_word_count` is set to False this simply returns the `event.duration`, otherwise it returns an average
-        that represents how much time it took to translate one word of that event.
+        Calculates and returns the value that represents the contribution of the `event` in aggregation calculation,
+        see `event_value`
         :param event: `Event` object
         :return: `event`'s contribution to the aggregate value
         """
-        if self.use_word_count:
-            return event.duration if event.word_count == 0 else event.duration / event.word_count
-        else:
-            return event.duration
-
-    @property
-    def last_event(self):
-        """
-        :return: `Event` object with the most recent timestamp
-        """
-        return self.current_events[-1]
+        return event_value(event, self.use_word_count)
 
 
 class MovingAggregator(BaseAggregator):
     """
-    Base class representing an aggregation function that has a moving time window
+    Base class representing an aggregation function that has a moving time window. The aggregator is a reducer of an
+    `EventWindow`: it starts with a window of its own, and can be attached to one shared with other aggregators
     """
+    supports_buckets = True
+    # values of the window are the word counts of the events instead of their delivery times, see `event_value`
+    word_counts = False
 
-    def __init__(self, window_size, **kwargs):
+    def __init__(self, window_size, bucketed=False, **kwargs):
         """
         Base constructor
         :param window_size: size of the window, in minutes, that should be considered for aggregation calculation
+        :param bucketed: if set to `True` the window keeps one record per minute instead of every event, see
+        `EventWindow`
         :param kwargs: arguments passed to the super constructor
         """
+        if bucketed and not self.supports_buckets:
+            raise ValueError("{0} does not support bucketed windows".format(self.__class__.__name__))
         super().__init__(**kwargs)
         self.window_size = window_size
-        self.window_lower_bound = None
+        self.bucketed = bucketed
+        self.window = None
+        self.attach(EventWindow(window_size, use_word_count=self.use_word_count, bucketed=bucketed,
+                                word_counts=self.word_counts))
+
+    def attach(self, window):
+        """
+        Plugs the aggregator into `window`, which is shared with every other aggregator attached to it
+        :param window: `EventWindow` object
+        :return: None
+        """
+        self.window = window
+        window.add_reducer(self)
+
+    @property
+    def window_lower_bound(self):
+        return self.window.window_lower_bound
+
+    @window_lower_bound.setter
+    def window_lower_bound(self, value):
+        self.window.window_lower_bound = value
+
+    @property
+    def current_events(self):
+        """
+        :return: events, or minute buckets, in the window
+        """
+        return self.window.events
+
+    def add_event(self, event):
+        """
+        Adds event to the window of the aggregator
+        :param event: `Event` object
+        :return: None
+        """
+        self.window.add_event(event)
 
     def shift_window(self):
         """
         shifts the time window by 1 unit.
         :return: None
         """
-        self.window_lower_bound += datetime.timedelta(seconds=60)
-        while self._queue_needs_pop():
-            e = self.current_events[0]
-            self.current_events.popleft()
-            self._pop_update_method(e)
+        self.window.shift_window()
 
-    def _queue_needs_pop(self):
-        if len(self.current_events) == 0:
-            return False
-        last_event_ts_delta = self.current_events[0].timestamp + datetime.timedelta(seconds=60 * self.window_size)
-        return last_event_ts_delta < self.window_lower_bound
+    def on_add(self, timestamp, value):
+        """
+        Updates the aggregation state with an event added to the window
+        :param timestamp: timestamp the event will be evicted by, i.e. its own or its minute's when bucketed, in
+        microseconds since the epoch
+        :param value: event's contribution to the aggregate value
+        :return: None
+        """
+        pass
+
+    def get_parameters(self):
+        """
+        :return: JSON serializable constructor parameters the aggregation state depends on, a state is only restored
+        into an aggregator with the same ones
+        """
+        return {'window_size': self.window_size, 'use_word_count': self.use_word_count, 'bucketed': self.bucketed}
+
+    def get_state(self):
+        """
+        Raises `NotImplementedError` if the aggregator can't be checkpointed
+        :return: JSON serializable aggregation state, see `set_state`. The events of the window are kept by its store
+        """
+        raise NotImplementedError("{0} doesn't save its state".format(self.__class__.__name__))
+
+    def set_state(self, state):
+        """
+        Restores the aggregation state of an aggregator configured like this one, see `get_parameters`. Raises
+        `NotImplementedError` if the aggregator can't be checkpointed
+        :param state: state returned by `get_state`
+        :return: None
+        """
+        raise NotImplementedError("{0} doesn't restore its state".format(self.__class__.__name__))
+
+    def on_add_bucket(self, bucket):
+        """
+        Updates the aggregation state with pre-aggregated events of one minute added to a bucketed window
+        :param bucket: `MinuteBucket` of the added events
+        :return: None
+        """
+        raise NotImplementedError()
 
-    def _pop_update_method(self, event):
+    def on_evict(self, timestamp, count, total):
+        """
+        Updates the aggregation state with events evicted from the window
+        :param timestamp: timestamp of the evicted event or bucket
+        :param count: number of evicted events
+        :param total: sum of the values of the evicted events
+        :return: None
+        """
         pass
 
 
@@ -96,55 +162,612 @@ class AverageAggregator(MovingAggregator):
     def __init__(self, window_size, **kwargs):
         super().__init__(window_size, **kwargs)
         self.current_sum = 0.0
+        self.current_count = 0
 
     def aggregate(self):
-        return self.current_sum / len(self.current_events) if len(self.current_events) > 0 else 0.0
+        return self.current_sum / self.current_count if self.current_count > 0 else 0.0
 
-    def add_event(self, event):
-        super().add_event(event)
-        self.current_sum += self.get_event_value(event)
+    def get_state(self):
+        return [self.current_sum, self.current_count]
+
+    def set_state(self, state):
+        self.current_sum, self.current_count = state
 
-    def _pop_update_method(self, event):
-        self.current_sum -= self.get_event_value(event)
+    def on_add(self, timestamp, value):
+        self.current_sum += value
+        self.current_count += 1
 
+    def on_add_bucket(self, bucket):
+        self.current_sum += bucket.total
+        self.current_count += bucket.count
 
-class MedianAggregator(MovingAggregator):
+    def on_evict(self, timestamp, count, total):
+        self.current_sum -= total
+        self.current_count -= count
+
+
+class OrderStatisticAggregator(MovingAggregator):
+    """
+    Base class for moving aggregation functions that depend on the order of the values in the window. Keeps the values
+    of the window in a sorted list that is updated with binary search on every added and evicted event, so any order
+    statistic can be read by index. Needs every value of the window, so it can't be bucketed
+    """
+    supports_buckets = False
+
+    def __init__(self, window_size, **kwargs):
+        super().__init__(window_size, **kwargs)
+        self.sorted_values = []
+
+    def on_add(self, timestamp, value):
+        insort(self.sorted_values, value)
+
+    def on_evict(self, timestamp, count, total):
+        del self.sorted_values[bisect_left(self.sorted_values, total)]
+
+    def aggregate(self):
+        return self.aggregate_sorted(self.sorted_values)
+
+    def get_state(self):
+        return list(self.sorted_values)
+
+    def set_state(self, state):
+        self.sorted_values = list(state)
+
+    def aggregate_sorted(self, sorted_values):
+        """
+        :param sorted_values: values of a window in ascending order
+        :return: aggregation value of that window
+        """
+        raise NotImplementedError()
+
+
+class MedianAggregator(OrderStatisticAggregator):
     """
     Moving median aggregation function
     """
 
     name = "median_delivery_time"
 
-    def aggregate(self):
-        if len(self.current_events) == 0:
+    def aggregate_sorted(self, sorted_values):
+        n = len(sorted_values)
+        if n == 0:
             return 0.0
+        elif n % 2 == 1:
+            return float(sorted_values[n // 2])
         else:
-            return float(median([self.get_event_value(x) for x in self.current_events]))
+            return float((sorted_values[n // 2 - 1] + sorted_values[n // 2]) / 2)
+
+
+class PercentileAggregator(OrderStatisticAggregator):
+    """
+    Moving percentile aggregation function. Values between two ranks are linearly interpolated
+    """
+
+    def __init__(self, percentile, window_size, **kwargs):
+        """
+        Percentile aggregator constructor
+        :param percentile: percentile to compute, between 0 and 100
+        :param window_size: size of the window, in minutes, that should be considered for aggregation calculation
+        :param kwargs: arguments passed to the super constructor
+        """
+        if not 0 <= percentile <= 100:
+            raise ValueError("percentile must be between 0 and 100, got {0}".format(percentile))
+        super().__init__(window_size, **kwargs)
+        self.percentile = percentile
+        self.name = "p{0:g}_delivery_time".format(percentile)
+
+    def get_parameters(self):
+        return dict(super().get_parameters(), percentile=self.percentile)
+
+    def aggregate_sorted(self, sorted_values):
+        n = len(sorted_values)
+        if n == 0:
+            return 0.0
+        rank = (n - 1) * self.percentile / 100
+        lower = int(rank)
+        fraction = rank - lower
+        if fraction == 0:
+            return float(sorted_values[lower])
+        return float(sorted_values[lower] + (sorted_values[lower + 1] - sorted_values[lower]) * fraction)
+
+
+class ApproximatePercentileAggregator(MovingAggregator):
+    """
+    Moving approximate percentile aggregation function. Keeps a `QuantileSketch` of each minute of the window, and the
+    sum of them that percentiles are read from: minute sketches are merged into it along with their events and
+    subtracted from it when they are evicted. Memory depends on the window size and on the range of the values, but not
+    on the number of events, so unlike `PercentileAggregator` it supports bucketed windows
+    """
+
+    def __init__(self, percentile, window_size, relative_accuracy=0.01, **kwargs):
+        """
+        Approximate percentile aggregator constructor
+        :param percentile: percentile to compute, between 0 and 100
+        :param window_size: size of the window, in minutes, that should be considered for aggregation calculation
+        :param relative_accuracy: bound of the relative error of the percentile, see `QuantileSketch`
+        :param kwargs: arguments passed to the super constructor
+        """
+        if not 0 <= percentile <= 100:
+            raise ValueError("percentile must be between 0 and 100, got {0}".format(percentile))
+        super().__init__(window_size, **kwargs)
+        self.percentile = percentile
+        self.relative_accuracy = relative_accuracy
+        self.name = "approx_p{0:g}_delivery_time".format(percentile)
+        self.sketch = QuantileSketch(relative_accuracy)
+        # `(minute, QuantileSketch)` of each minute with events in the window
+        self.minute_sketches = deque([])
+
+    def aggregate(self):
+        return self.sketch.quantile(self.percentile / 100)
+
+    def get_parameters(self):
+        return dict(super().get_parameters(), percentile=self.percentile, relative_accuracy=self.relative_accuracy)
+
+    def get_state(self):
+        return [[minute, sketch.get_state()] for minute, sketch in self.minute_sketches]
+
+    def set_state(self, state):
+        self.sketch = QuantileSketch(self.relative_accuracy)
+        self.minute_sketches = deque([])
+        for minute, sketch_state in state:
+            sketch = QuantileSketch(self.relative_accuracy)
+            sketch.set_state(sketch_state)
+            self.minute_sketches.append((minute, sketch))
+            self.sketch.merge(sketch)
+
+    def on_add(self, timestamp, value):
+        minute = timestamp - timestamp % MINUTE_MICROSECONDS
+        if len(self.minute_sketches) == 0 or self.minute_sketches[-1][0] != minute:
+            self.minute_sketches.append((minute, QuantileSketch(self.relative_accuracy)))
+        # both sketches have the same bins
+        index = self.sketch.index(value)
+        self.minute_sketches[-1][1].add_index(index)
+        self.sketch.add_index(index)
+
+    def on_add_bucket(self, bucket):
+        # the sketch of the bucket, built by a worker, has the bins of this one, see `aggregate_shard`
+        sketch = bucket.sketches[self.relative_accuracy]
+        if len(self.minute_sketches) == 0 or self.minute_sketches[-1][0] != bucket.timestamp:
+            self.minute_sketches.append((bucket.timestamp, QuantileSketch(self.relative_accuracy)))
+        self.minute_sketches[-1][1].merge(sketch)
+        self.sketch.merge(sketch)
+
+    def on_evict(self, timestamp, count, total):
+        # events are evicted by minute, the first evicted event of a minute evicts its whole sketch
+        while len(self.minute_sketches) > 0 and self.minute_sketches[0][0] <= timestamp:
+            self.sketch.subtract(self.minute_sketches.popleft()[1])
+
+
+class ApproximateMedianAggregator(ApproximatePercentileAggregator):
+    """
+    Moving approximate median aggregation function, see `ApproximatePercentileAggregator`
+    """
+
+    def __init__(self, window_size, **kwargs):
+        super().__init__(50, window_size, **kwargs)
+        self.name = "approx_median_delivery_time"
+
+
+class ExtremumAggregator(MovingAggregator):
+    """
+    Base class for moving extremum aggregation functions. Keeps a monotonic deque of `(timestamp, value)` candidates,
+    so every event is pushed and popped at most once and the current extremum is always at the front of the deque
+    """
+
+    def __init__(self, window_size, **kwargs):
+        super().__init__(window_size, **kwargs)
+        self.candidates = deque([])
+
+    def aggregate(self):
+        return float(self.candidates[0][1]) if len(self.candidates) > 0 else 0.0
+
+    def get_state(self):
+        return [list(candidate) for candidate in self.candidates]
 
+    def set_state(self, state):
+        self.candidates = deque((timestamp, value) for timestamp, value in state)
 
-class MaxAggregator(MovingAggregator):
+    def on_add(self, timestamp, value):
+        # a newer candidate leaves the window no sooner than the older ones, so those it beats can never be reported
+        while len(self.candidates) > 0 and not self._precedes(self.candidates[-1][1], value):
+            self.candidates.pop()
+        # and when it leaves at the same time as the best remaining one, it can't be reported either
+        if len(self.candidates) == 0 or self.candidates[-1][0] != timestamp:
+            self.candidates.append((timestamp, value))
+
+    def on_add_bucket(self, bucket):
+        self.on_add(bucket.timestamp, self._bucket_value(bucket))
+
+    def on_evict(self, timestamp, count, total):
+        while len(self.candidates) > 0 and self.candidates[0][0] <= timestamp:
+            self.candidates.popleft()
+
+    def _precedes(self, kept_value, new_value):
+        """
+        :return: `True` if `kept_value` should stay ahead of `new_value` in the candidates deque
+        """
+        raise NotImplementedError()
+
+    def _bucket_value(self, bucket):
+        """
+        :return: value of `bucket` that competes for the extremum
+        """
+        raise NotImplementedError()
+
+
+class MaxAggregator(ExtremumAggregator):
     """
     Moving maximum aggregation function
     """
 
     name = "maximum_delivery_time"
 
-    def aggregate(self):
-        if len(self.current_events) == 0:
-            return 0.0
-        else:
-            return float(max([self.get_event_value(x) for x in self.current_events]))
+    def _precedes(self, kept_value, new_value):
+        return kept_value > new_value
+
+    def _bucket_value(self, bucket):
+        return bucket.maximum
 
 
-class MinAggregator(MovingAggregator):
+class MinAggregator(ExtremumAggregator):
     """
     Moving minimum aggregation function
     """
 
     name = "minimum_delivery_time"
 
+    def _precedes(self, kept_value, new_value):
+        return kept_value < new_value
+
+    def _bucket_value(self, bucket):
+        return bucket.minimum
+
+
+def _add_to_moments(moments, value):
+    """
+    Adds a value to `[count, mean, squares]` moments, where `squares` is the sum of the squared deviations from the
+    mean, with Welford's update
+    :return: None
+    """
+    count = moments[0] + 1
+    delta = value - moments[1]
+    mean = moments[1] + delta / count
+    moments[0] = count
+    moments[1] = mean
+    moments[2] += delta * (value - mean)
+
+
+def _merge_moments(first, second):
+    """
+    :return: `[count, mean, squares]` moments of the values of both moments, with the pairwise update of Chan et al.
+    """
+    count = first[0] + second[0]
+    if first[0] == 0 or second[0] == 0:
+        return list(second if first[0] == 0 else first)
+    delta = second[1] - first[1]
+    return [count, first[1] + delta * second[0] / count,
+            first[2] + second[2] + delta * delta * first[0] * second[0] / count]
+
+
+class VarianceAggregator(MovingAggregator):
+    """
+    Moving variance aggregation function, of the population of values in the window. Keeps the count, mean and sum of
+    squared deviations of each minute of the window, updated with Welford's method, in a queue of two stacks: the
+    newer minutes are summed up as events are added, and the older ones hold the sum of themselves and every older
+    minute up to the newer ones, so evicting a minute is a pop. The older stack is rebuilt from the minutes once it's
+    empty, so each event and each evicted minute take constant time on average. Moments are only ever merged, never
+    subtracted, so no precision is lost like with a running sum of squares
+    """
+
+    name = "variance_delivery_time"
+
+    def __init__(self, window_size, **kwargs):
+        super().__init__(window_size, **kwargs)
+        # `(minute, moments)` of each minute with events in the window
+        self.minute_moments = deque([])
+        # moments of the oldest `len(older_moments)` minutes, where the last item is the one of the oldest minute and
+        # sums them all up, and the moments of every other minute
+        self.older_moments = []
+        self.newer_moments = [0, 0.0, 0.0]
+
     def aggregate(self):
-        if len(self.current_events) == 0:
-            return 0.0
+        count, _, squares = _merge_moments(self.older_moments[-1], self.newer_moments) if self.older_moments else \
+            self.newer_moments
+        return squares / count if count > 0 else 0.0
+
+    def get_state(self):
+        return [[[minute, list(moments)] for minute, moments in self.minute_moments],
+                [list(moments) for moments in self.older_moments], list(self.newer_moments)]
+
+    def set_state(self, state):
+        minute_moments, older_moments, newer_moments = state
+        self.minute_moments = deque((minute, list(moments)) for minute, moments in minute_moments)
+        self.older_moments = [list(moments) for moments in older_moments]
+        self.newer_moments = list(newer_moments)
+
+    def on_add(self, timestamp, value):
+        minute = timestamp - timestamp % MINUTE_MICROSECONDS
+        if len(self.minute_moments) == 0 or self.minute_moments[-1][0] != minute:
+            self.minute_moments.append((minute, [0, 0.0, 0.0]))
+        elif len(self.older_moments) == len(self.minute_moments):
+            # the minute was moved to the older stack, which is left to be rebuilt with it
+            self.older_moments = []
+            self.newer_moments = [0, 0.0, 0.0]
+            for _, moments in self.minute_moments:
+                self.newer_moments = _merge_moments(self.newer_moments, moments)
+        _add_to_moments(self.minute_moments[-1][1], value)
+        _add_to_moments(self.newer_moments, value)
+
+    def on_evict(self, timestamp, count, total):
+        # events are evicted by minute, the first evicted event of a minute evicts its whole moments
+        while len(self.minute_moments) > 0 and self.minute_moments[0][0] <= timestamp:
+            if len(self.older_moments) == 0:
+                moments = [0, 0.0, 0.0]
+                for _, minute_moments in reversed(self.minute_moments):
+                    moments = _merge_moments(minute_moments, moments)
+                    self.older_moments.append(moments)
+                self.newer_moments = [0, 0.0, 0.0]
+            self.older_moments.pop()
+            self.minute_moments.popleft()
+
+
+class StandardDeviationAggregator(VarianceAggregator):
+    """
+    Moving standard deviation aggregation function, see `VarianceAggregator`
+    """
+
+    name = "stddev_delivery_time"
+
+    def aggregate(self):
+        return math.sqrt(super().aggregate())
+
+
+class ExponentialAverageAggregator(MovingAggregator):
+    """
+    Moving exponentially weighted average aggregation function. Events of the window are weighted by their minute, the
+    weight halving every `half_life` minutes back from the newest one, so the latest minutes count the most while
+    events still leave the average with the window. The weighted sums are kept relative to a reference minute, an
+    evicted event is subtracted with the weight it was added with, so each event and each minute take constant time
+    """
+
+    name = "ewma_delivery_time"
+    # exponent of the weight of a minute, past which the sums are rebased on that minute before they could overflow
+    REBASE_EXPONENT = 64
+
+    def __init__(self, window_size, half_life=None, **kwargs):
+        """
+        Exponentially weighted average aggregator constructor
+        :param window_size: size of the window, in minutes, that should be considered for aggregation calculation
+        :param half_life: minutes after which the weight of an event halves, half the window size by default, so the
+        oldest minute of a full window weighs about a quarter of the newest one
+        :param kwargs: arguments passed to the super constructor
+        """
+        if half_life is None:
+            half_life = window_size / 2
+        if half_life <= 0:
+            raise ValueError("half life must be positive, got {0}".format(half_life))
+        super().__init__(window_size, **kwargs)
+        self.half_life = half_life
+        self.half_life_microseconds = half_life * MINUTE_MICROSECONDS
+        self.count = 0
+        self.weighted_sum = 0.0
+        self.weight_sum = 0.0
+        # minute the weights are relative to, `None` while the window is empty
+        self.reference = None
+        # last minute whose weight was computed, and its weight
+        self._minute = None
+        self._minute_weight = 0.0
+
+    def aggregate(self):
+        return self.weighted_sum / self.weight_sum if self.count > 0 else 0.0
+
+    def get_parameters(self):
+        return dict(super().get_parameters(), half_life=self.half_life)
+
+    def get_state(self):
+        return [self.count, self.weighted_sum, self.weight_sum, self.reference]
+
+    def set_state(self, state):
+        self.count, self.weighted_sum, self.weight_sum, self.reference = state
+        self._minute = None
+
+    def _weight(self, timestamp):
+        """
+        :param timestamp: timestamp of an event in the window, in microseconds since the epoch
+        :return: weight of the events of its minute relative to the reference minute
+        """
+        minute = timestamp - timestamp % MINUTE_MICROSECONDS
+        if minute != self._minute:
+            if self.reference is None:
+                self.reference = minute
+            exponent = (minute - self.reference) / self.half_life_microseconds
+            if exponent > self.REBASE_EXPONENT:
+                rebase = 2.0 ** -exponent
+                self.weighted_sum *= rebase
+                self.weight_sum *= rebase
+                self.reference = minute
+                exponent = 0.0
+            self._minute = minute
+            self._minute_weight = 2.0 ** exponent
+        return self._minute_weight
+
+    def on_add(self, timestamp, value):
+        weight = self._weight(timestamp)
+        self.count += 1
+        self.weighted_sum += value * weight
+        self.weight_sum += weight
+
+    def on_add_bucket(self, bucket):
+        weight = self._weight(bucket.timestamp)
+        self.count += bucket.count
+        self.weighted_sum += bucket.total * weight
+        self.weight_sum += bucket.count * weight
+
+    def on_evict(self, timestamp, count, total):
+        weight = self._weight(timestamp)
+        self.count -= count
+        if self.count == 0:
+            # the sums start over exactly once the window is empty
+            self.weighted_sum = 0.0
+            self.weight_sum = 0.0
+            self.reference = None
+            self._minute = None
         else:
-            return float(min([self.get_event_value(x) for x in self.current_events]))
+            self.weighted_sum -= total * weight
+            self.weight_sum -= count * weight
+
+
+class RateAggregator(MovingAggregator):
+    """
+    Base class for moving throughput rates: the total of something counted per event over the window, divided by the
+    size of the window in minutes. Minutes of the window before the first event count as well
+    """
+
+    def __init__(self, window_size, **kwargs):
+        super().__init__(window_size, **kwargs)
+        self.current_total = 0
+
+    def aggregate(self):
+        return self.current_total / self.window_size
+
+    def get_state(self):
+        return self.current_total
+
+    def set_state(self, state):
+        self.current_total = state
+
+
+class EventRateAggregator(RateAggregator):
+    """
+    Moving rate of events per minute
+    """
+
+    name = "events_per_minute"
+
+    def on_add(self, timestamp, value):
+        self.current_total += 1
+
+    def on_add_bucket(self, bucket):
+        self.current_total += bucket.count
+
+    def on_evict(self, timestamp, count, total):
+        self.current_total -= count
+
+
+class WordRateAggregator(RateAggregator):
+    """
+    Moving rate of words per minute, the values of its window are the word counts of the events
+    """
+
+    name = "words_per_minute"
+    word_counts = True
+
+    def __init__(self, window_size, use_word_count=False, **kwargs):
+        # word counts are the same with or without `use_word_count`, so the window is shared either way
+        super().__init__(window_size, **kwargs)
+
+    def on_add(self, timestamp, value):
+        self.current_total += value
+
+    def on_add_bucket(self, bucket):
+        self.current_total += bucket.total
+
+    def on_evict(self, timestamp, count, total):
+        self.current_total -= total
+
+
+class AggregatorRegistry:
+    """
+    Aggregators that can be requested by name, e.g. with `--aggregator` or through `pynopticon.api`. Besides fixed
+    names, patterns can be registered, whose matches parameterize the aggregator, e.g. `p<percentile>`
+    """
+
+    def __init__(self):
+        # name -> (aggregator class, options)
+        self._names = {}
+        # list of (display name, compiled pattern, aggregator class, options, parameters)
+        self._patterns = []
+
+    def register(self, name, aggregator_class=None, options=(), pattern=None, parameters=None):
+        """
+        Registers an aggregator. Without `aggregator_class`, returns a decorator that registers the decorated class
+        :param name: name of the aggregator, or name shown in help and error messages when `pattern` is set
+        :param aggregator_class: moving aggregator class, or any callable that returns a moving aggregator. It's called
+        with the parameters of the name, if any, the window size, and the `use_word_count`, `bucketed` and `options`
+        keyword arguments
+        :param options: names of the keyword arguments the aggregator takes besides `use_word_count` and `bucketed`,
+        e.g. `relative_accuracy`. Other options aren't passed to it
+        :param pattern: regular expression of the names of the aggregator, instead of the fixed `name`
+        :param parameters: callable that converts the groups of a match of `pattern` to the arguments of
+        `aggregator_class` that come before the window size. By default the groups are passed as they are
+        :return: `None`, or the decorator
+        """
+        if aggregator_class is None:
+            def decorator(cls):
+                self.register(name, cls, options=options, pattern=pattern, parameters=parameters)
+                return cls
+            return decorator
+        if pattern is None:
+            self._names[name] = (aggregator_class, tuple(options))
+        else:
+            self._patterns.append((name, re.compile(pattern), aggregator_class, tuple(options),
+                                   parameters or (lambda *groups: groups)))
+
+    def names(self):
+        """
+        :return: list of the fixed names and of the display names of the patterns
+        """
+        return list(self._names) + [name for name, _, _, _, _ in self._patterns]
+
+    def _lookup(self, name):
+        """
+        :return: aggregator class, options and parameters of `name`
+        """
+        if name in self._names:
+            aggregator_class, options = self._names[name]
+            return aggregator_class, options, ()
+        for _, pattern, aggregator_class, options, parameters in self._patterns:
+            match = pattern.fullmatch(name)
+            if match is not None:
+                return aggregator_class, options, tuple(parameters(*match.groups()))
+        raise ValueError("unknown aggregator '{0}' (choose from {1})".format(name, ", ".join(self.names())))
+
+    def aggregator_class(self, name):
+        """
+        :param name: registered name, or match of a registered pattern
+        :return: class that creates the aggregator of `name`
+        """
+        return self._lookup(name)[0]
+
+    def create(self, name, window_size, use_word_count=False, bucketed=False, **options):
+        """
+        Creates an aggregator by name. Raises `ValueError` for unknown names and invalid parameters
+        :param name: registered name, or match of a registered pattern
+        :param window_size: size of the window, in minutes
+        :param use_word_count: see `BaseAggregator`
+        :param bucketed: see `MovingAggregator`
+        :param options: options of the aggregators, each aggregator only gets the ones it was registered with
+        :return: new moving aggregator
+        """
+        aggregator_class, accepted_options, parameters = self._lookup(name)
+        kwargs = {key: value for key, value in options.items() if key in accepted_options}
+        return aggregator_class(*parameters, window_size, use_word_count=use_word_count, bucketed=bucketed, **kwargs)
+
+
+AGGREGATOR_REGISTRY = AggregatorRegistry()
+register_aggregator = AGGREGATOR_REGISTRY.register
+
+register_aggregator('average', AverageAggregator)
+register_aggregator('median', MedianAggregator)
+register_aggregator('min', MinAggregator)
+register_aggregator('max', MaxAggregator)
+register_aggregator('approx_median', ApproximateMedianAggregator, options=('relative_accuracy',))
+register_aggregator('variance', VarianceAggregator)
+register_aggregator('stddev', StandardDeviationAggregator)
+register_aggregator('ewma', ExponentialAverageAggregator, options=('half_life',))
+register_aggregator('events_per_minute', EventRateAggregator)
+register_aggregator('words_per_minute', WordRateAggregator)
+register_aggregator('p<percentile>', PercentileAggregator, pattern=r"p(\d+(?:\.\d+)?)",
+                    parameters=lambda percentile: (float(percentile),))
+register_aggregator('approx_p<percentile>', ApproximatePercentileAggregator, options=('relative_accuracy',),
+                    pattern=r"approx_p(\d+(?:\.\d+)?)", parameters=lambda percentile: (float(percentile),))
@@ -0,0 +1,171 @@
+import datetime
+import numbers
+from itertools import repeat
+
+from pynopticon.aggregator import AGGREGATOR_REGISTRY
+from pynopticon.event_processor import Event, EventProcessor
+from pynopticon.output import RecordWriter
+from pynopticon.util import EPOCH, FIXED_TIME_FORMAT, parse_fixed_timestamp
+
+
+def create_aggregators(names, window_sizes, use_word_count=False, bucketed=False, **options):
+    """
+    :param names: names of registered aggregators, see `AGGREGATOR_REGISTRY`
+    :param window_sizes: window size, in minutes, or list of sizes. With several sizes, every aggregator is created for
+    each one of them, and its name is suffixed with the size, e.g. `average_delivery_time_5m`
+    :param use_word_count: see `BaseAggregator`
+    :param bucketed: see `MovingAggregator`
+    :param options: options of the aggregators, see `AggregatorRegistry.create`
+    :return: new list of aggregators
+    """
+    window_sizes = [window_sizes] if isinstance(window_sizes, int) else list(window_sizes)
+    aggregators = []
+    for window_size in window_sizes:
+        for name in names:
+            aggregator = AGGREGATOR_REGISTRY.create(name, window_size, use_word_count=use_word_count,
+                                                    bucketed=bucketed, **options)
+            if len(window_sizes) > 1:
+                aggregator.name = "{0}_{1}m".format(aggregator.name, window_size)
+            aggregators.append(aggregator)
+    return aggregators
+
+
+def is_number(value):
+    """
+    :return: `True` if `value` is a real number, e.g. an int, a float or a NumPy scalar, but not a boolean
+    """
+    return type(value) in (int, float) or (isinstance(value, numbers.Real) and not isinstance(value, bool))
+
+
+def to_event(record, time_format=EventProcessor.INPUT_TIME_FORMAT):
+    """
+    Raises `TypeError` if the duration or the word count of a record that isn't an `Event` is not a number
+    :param record: `Event`, dict with the fields of the input lines, i.e. `timestamp`, `duration` and `nr_words`, or
+    `(timestamp, duration, word_count)` tuple, where the word count may be left out. Timestamps are `datetime` objects,
+    strings in `time_format` or integer microseconds since the epoch
+    :param time_format: python time format string of the string timestamps
+    :return: `Event` object
+    """
+    if isinstance(record, Event):
+        return record
+    if isinstance(record, dict):
+        timestamp, duration, word_count = record['timestamp'], record['duration'], record.get('nr_words', 0)
+    elif len(record) == 2:
+        (timestamp, duration), word_count = record, 0
+    else:
+        timestamp, duration, word_count = record
+    if not is_number(duration) or not is_number(word_count):
+        raise TypeError("duration and nr_words must be numbers, got {0!r} and {1!r}".format(duration, word_count))
+    if isinstance(timestamp, str):
+        if time_format == FIXED_TIME_FORMAT:
+            timestamp = parse_fixed_timestamp(timestamp)
+        else:
+            timestamp = datetime.datetime.strptime(timestamp, time_format)
+    elif isinstance(timestamp, int):
+        timestamp = EPOCH + datetime.timedelta(microseconds=timestamp)
+    return Event(timestamp, duration, word_count)
+
+
+class IterableEventProcessor(EventProcessor):
+    """
+    Event processor over an iterable of events, whose output is read as records instead of being written to a file,
+    see `records`. There are no files to open, but it's still used as a context manager
+    """
+
+    def __init__(self, events, aggregators, time_format=EventProcessor.INPUT_TIME_FORMAT, allowed_lateness=None):
+        """
+        Iterable Event Processor constructor
+        :param events: iterable of events in timestamp order, see `to_event`
+        :param aggregators: list of aggregators, see `EventProcessor`
+        :param time_format: python time format string of the string timestamps
+        :param allowed_lateness: seconds events may be out of order, see `EventProcessor`
+        """
+        super().__init__([], aggregators, allowed_lateness=allowed_lateness)
+        self._events = events
+        self._time_format = time_format
+
+    def __enter__(self):
+        self.input_file_handlers = []
+        self.writer = RecordWriter([x.name for x in self.aggregators])
+        self._initialized = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def _read_events(self):
+        time_format = self._time_format
+        return (to_event(record, time_format) for record in self._events)
+
+    def records(self):
+        """
+        Processes the events lazily: the records of a minute are yielded as soon as an event of a later minute closes
+        it, and the events are only read as far as the records are
+        Raises `EventProcessorError` if the instance wasn't initialized as a context manager
+        :return: generator of `(minute, {name: value})` of every output minute, see `RecordWriter`
+        """
+        self._check_initialized()
+        writer = self.writer
+        for event in self._ordered_events():
+            self._process_next(event)
+            if len(writer) > 0:
+                yield from writer.records()
+        self._close_minute()
+        yield from writer.records()
+
+
+def aggregate(events, aggregators=('average',), window_size=10, use_word_count=False, bucketed=False,
+              time_format=EventProcessor.INPUT_TIME_FORMAT, allowed_lateness=None, **options):
+    """
+    Computes moving aggregations in the calling process, without any input or output file. Example:
+    `for minute, values in aggregate(events, ['average', 'p99'], window_size=10): ...`
+    :param events: iterable, e.g. a generator, of events in timestamp order, or up to `allowed_lateness` out of it:
+    dicts like the input lines or tuples, see `to_event`
+    :param aggregators: names of registered aggregators, see `AGGREGATOR_REGISTRY`, or aggregator objects, which are
+    used as they are and ignore `window_size`, `use_word_count`, `bucketed` and `options`
+    :param window_size: window size, in minutes, or list of sizes, see `create_aggregators`
+    :param use_word_count: see `BaseAggregator`
+    :param bucketed: see `MovingAggregator`
+    :param time_format: python time format string of the string timestamps
+    :param allowed_lateness: seconds events may arrive after later ones, see `EventProcessor`. Events that arrive later
+    than that are dropped
+    :param options: options of the aggregators, e.g. `relative_accuracy`
+    :return: generator of `(minute, {name: value})`, with the same minutes and values as the lines of the output file
+    of `EventProcessor`, `minute` being a `datetime`
+    """
+    created = []
+    for aggregator in aggregators:
+        if isinstance(aggregator, str):
+            created += create_aggregators([aggregator], window_size, use_word_count=use_word_count, bucketed=bucketed,
+                                          **options)
+        else:
+            created.append(aggregator)
+    with IterableEventProcessor(events, created, time_format=time_format,
+                                allowed_lateness=allowed_lateness) as processor:
+        yield from processor.records()
+
+
+def _column(values):
+    """
+    :return: NumPy arrays converted to lists of python objects, `datetime64` values to `datetime` objects
+    """
+    dtype = getattr(values, 'dtype', None)
+    if dtype is None:
+        return values
+    if dtype.kind == 'M':
+        values = values.astype('datetime64[us]')
+    return values.tolist()
+
+
+def aggregate_columns(timestamps, durations, word_counts=None, **kwargs):
+    """
+    Computes moving aggregations of events given as columns, see `aggregate`
+    :param timestamps: sequence or array of the timestamps of the events, in timestamp order, see `to_event`. NumPy
+    `datetime64` arrays are accepted as well
+    :param durations: sequence or array of the durations of the events
+    :param word_counts: sequence or array of the word counts of the events, if any
+    :param kwargs: arguments of `aggregate`
+    :return: generator of `(minute, {name: value})`, see `aggregate`
+    """
+    word_counts = repeat(0) if word_counts is None else _column(word_counts)
+    return aggregate(zip(_column(timestamps), _column(durations), word_counts), **kwargs)
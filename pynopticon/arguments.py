@@ -1,4 +1,82 @@
 import argparse
+import datetime
+import glob
+
+from pynopticon.aggregator import AGGREGATOR_REGISTRY, MovingAggregator
+from pynopticon.batch import BatchEventProcessor
+from pynopticon.compression import detect_compression
+from pynopticon.server import AggregationServer, parse_address
+
+
+def aggregator_type(value):
+    """
+    Validates an `--aggregator` value, which can be any name of the `AGGREGATOR_REGISTRY`, e.g. `average`, or match one
+    of its patterns, e.g. `p90` or `approx_p99.9`
+    :param value: command line value
+    :return: the validated value
+    """
+    try:
+        AGGREGATOR_REGISTRY.create(value, 1)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def minute_type(value):
+    """
+    Validates a `--start` or `--end` value
+    :param value: command line value, e.g. `2018-12-26 18:11`
+    :return: `datetime` of the value
+    """
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("{0} is not a date and time such as 2018-12-26 18:11".format(value))
+
+
+def supports_buckets(aggregator):
+    """
+    :param aggregator: `--aggregator` value
+    :return: `True` if the aggregator doesn't need every value of its window, see `--bucketed`
+    """
+    return getattr(AGGREGATOR_REGISTRY.aggregator_class(aggregator), 'supports_buckets', True)
+
+
+def merges_buckets(aggregator):
+    """
+    :param aggregator: `--aggregator` value
+    :return: `True` if the aggregator takes the per-minute records of the workers, see `--workers`
+    """
+    aggregator_class = AGGREGATOR_REGISTRY.aggregator_class(aggregator)
+    return getattr(aggregator_class, 'on_add_bucket', None) not in (None, MovingAggregator.on_add_bucket)
+
+
+def supports_numpy_engine(aggregator):
+    """
+    :param aggregator: `--aggregator` value
+    :return: `True` if the numpy engine computes the aggregator, see `BatchEventProcessor`
+    """
+    aggregator_class = AGGREGATOR_REGISTRY.aggregator_class(aggregator)
+    return isinstance(aggregator_class, type) and issubclass(aggregator_class, BatchEventProcessor.AGGREGATORS)
+
+
+def expand_input_files(parser, patterns):
+    """
+    Expands the glob patterns of `--input_file`. Paths without wildcards are kept as they are, e.g. `-`
+    :param parser: `ArgumentParser` that reports patterns without any match
+    :param patterns: command line values
+    :return: list of input file paths
+    """
+    input_files = []
+    for pattern in patterns:
+        if any(wildcard in pattern for wildcard in '*?['):
+            matches = sorted(glob.glob(pattern))
+            if len(matches) == 0:
+                parser.error("no input file matches {0}".format(pattern))
+            input_files += matches
+        else:
+            input_files.append(pattern)
+    return input_files
 
 
 def parse_args():
@@ -11,25 +89,226 @@ def parse_args():
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
     parser.add_argument('--input_file',
-                        help="Path for the json input file",
-                        required=True)
+                        nargs='+',
+                        help="Path for the json input file, `-` to read from stdin. Several time-sorted files, or glob "
+                             "patterns such as 'logs/*.json', are merged into one ordered stream. Required unless "
+                             "--listen is set")
+
+    parser.add_argument('--follow',
+                        action='store_true',
+                        help="keep reading lines appended to the input file once its end is reached, like `tail -f`")
+
+    parser.add_argument('--idle_timeout',
+                        type=float,
+                        help="seconds without new events after which the minute of the last events is closed and "
+                             "output, instead of waiting for an event of a later minute")
+
+    parser.add_argument('--allowed_lateness',
+                        type=float,
+                        metavar='SECONDS',
+                        help="events may arrive up to SECONDS after later ones, e.g. in merged logs of several "
+                             "producers, and are put back in timestamp order by a bounded reorder buffer before they "
+                             "reach the windows. Events that arrive later are dropped, and counted in a report on "
+                             "stderr")
 
     parser.add_argument('--window_size',
-                        default=10,
+                        default=[10],
                         type=int,
-                        help="window size in minutes for which the output will be produced")
+                        nargs='+',
+                        help="window size in minutes for which the output will be produced. When several sizes are "
+                             "given, every output line has the aggregations of each one of them, suffixed with the "
+                             "size")
 
     parser.add_argument('--aggregator',
-                        choices=['average', 'median', 'min', 'max'],
+                        type=aggregator_type,
                         default=['average'],
                         nargs='+',
-                        help="specify how values should be aggregated")
+                        help="specify how values should be aggregated: {0}, where percentiles are requested such "
+                             "as p90 p99. approx_median and approx_p<percentile>, e.g. approx_p99, are estimated from "
+                             "sketches whose memory doesn't depend on the number of events, within "
+                             "--relative_accuracy. variance, stddev and ewma, weighted by --half_life, spread and "
+                             "smooth the delivery times, events_per_minute and words_per_minute are throughput rates "
+                             "over the window".format(", ".join(AGGREGATOR_REGISTRY.names())))
+
+    parser.add_argument('--relative_accuracy',
+                        type=float,
+                        default=0.01,
+                        help="bound of the relative error of approx_median and approx_p<percentile>. Smaller bounds "
+                             "take more memory")
+
+    parser.add_argument('--half_life',
+                        type=float,
+                        metavar='MINUTES',
+                        help="minutes after which the weight of an event halves in ewma, half the window size by "
+                             "default")
 
     parser.add_argument('--use_word_count',
                         action='store_true',
                         help="consider nr_words attribute in events to calculate aggregates")
 
+    parser.add_argument('--bucketed',
+                        action='store_true',
+                        help="keep one pre-aggregated record per minute in the window instead of every event, so "
+                             "memory depends on the window size only. Not supported by median and percentiles, but by "
+                             "their approximate versions")
+
+    parser.add_argument('--group_by',
+                        nargs='+',
+                        help="event fields, e.g. client_name target_language, whose values split the events into "
+                             "groups with windows of their own. Output lines are written per group, for the groups "
+                             "with events in their windows")
+
     parser.add_argument('--output_file',
                         help="Path for the output file. If not set stdout will be used")
 
-    return parser.parse_args()
+    parser.add_argument('--output_format',
+                        choices=['jsonl', 'csv', 'npy'],
+                        default='jsonl',
+                        help="format of the output: one JSON object per line, CSV with a header line, or a NumPy .npy "
+                             "structured array, which requires numpy and --output_file and is only written at the end")
+
+    parser.add_argument('--engine',
+                        choices=['stream', 'numpy'],
+                        default='stream',
+                        help="processing engine. `numpy` loads the whole input in memory and computes all minutes at "
+                             "once, which is much faster for offline replays of large files")
+
+    parser.add_argument('--stats',
+                        nargs='?',
+                        const='-',
+                        metavar='PATH',
+                        help="instrument the processing and report the time spent in each stage, event and output "
+                             "counts, window depths and peak memory. The summary is printed to stderr, or written as "
+                             "JSON to PATH")
+
+    parser.add_argument('--profile',
+                        metavar='PATH',
+                        help="profile the processing loop with cProfile and write its stats to PATH, to be read with "
+                             "`python -m pstats PATH`")
+
+    parser.add_argument('--workers',
+                        type=int,
+                        default=1,
+                        help="number of processes that parse and pre-aggregate byte ranges of the input file in "
+                             "parallel. Every event value is merged, so the output is exactly the sequential one, "
+                             "unless --bucketed is set: one record per minute and range is merged instead, which is "
+                             "faster but may change averages of non-integer values in their last digits")
+
+    parser.add_argument('--checkpoint',
+                        metavar='PATH',
+                        help="resume the processing of an append-only input file from the checkpoint at PATH, if it "
+                             "exists, appending the new minutes to --output_file, and write the checkpoint again at "
+                             "the end. The output is the same as when processing the whole input at once")
+
+    parser.add_argument('--start',
+                        type=minute_type,
+                        help="first minute of the output, e.g. '2018-12-26 18:00'. Only the events of its window and "
+                             "later ones are read: the input is entered with its --build_index sidecar, or with a "
+                             "binary search, so replaying a range of a large file doesn't read the file from its "
+                             "beginning")
+
+    parser.add_argument('--end',
+                        type=minute_type,
+                        help="last minute of the output, the input is read up to it")
+
+    parser.add_argument('--build_index',
+                        action='store_true',
+                        help="write the sidecar index of each input file, INPUT.idx, with the byte offset of the "
+                             "first event of every minute, for --start, and exit")
+
+    parser.add_argument('--listen',
+                        metavar='ADDRESS',
+                        help="run as a daemon listening on HOST:PORT, or on the path of a Unix socket, instead of "
+                             "reading input files. Any number of producers send it events, one JSON line each, and "
+                             "{\"query\": \"current\"} or {\"query\": \"last\", \"minutes\": N} lines are "
+                             "answered with the output of the last closed minutes")
+
+    parser.add_argument('--history',
+                        type=int,
+                        default=AggregationServer.HISTORY,
+                        help="number of minutes whose output --listen keeps in memory to answer queries")
+
+    args = parser.parse_args()
+    if args.allowed_lateness is not None:
+        if args.allowed_lateness < 0:
+            parser.error("--allowed_lateness must not be negative")
+        if args.engine == 'numpy' or args.workers > 1 or args.checkpoint is not None or args.start is not None or \
+                args.end is not None:
+            parser.error("--allowed_lateness is not supported by the numpy engine, with --workers, --checkpoint, "
+                         "--start nor --end")
+    if args.listen is not None:
+        try:
+            parse_address(args.listen)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.input_file is not None or args.output_file is not None or args.follow:
+            parser.error("--listen doesn't take --input_file, --output_file nor --follow")
+        if args.history < 1:
+            parser.error("--history must be at least 1")
+        if args.engine == 'numpy' or args.group_by or args.workers > 1 or args.checkpoint is not None or \
+                args.output_format != 'jsonl':
+            parser.error("--listen is not supported by the numpy engine, with --group_by, --workers, --checkpoint "
+                         "nor other output formats than jsonl")
+        return args
+    if args.input_file is None:
+        parser.error("--input_file is required unless --listen is set")
+    args.input_file = expand_input_files(parser, args.input_file)
+    several_inputs = len(args.input_file) > 1
+    compressed = not several_inputs and detect_compression(args.input_file[0]) is not None
+    if several_inputs and ('-' in args.input_file or args.follow or args.idle_timeout is not None):
+        parser.error("several input files can't be combined with stdin, --follow and --idle_timeout")
+    if not 0 < args.relative_accuracy < 1:
+        parser.error("--relative_accuracy must be between 0 and 1")
+    if args.half_life is not None and args.half_life <= 0:
+        parser.error("--half_life must be positive")
+    if args.bucketed and not all(supports_buckets(agg) for agg in args.aggregator):
+        parser.error("--bucketed is not supported by median and percentiles, use their approximate versions")
+    if args.engine == 'numpy' and (args.follow or args.idle_timeout is not None):
+        parser.error("--follow and --idle_timeout are not supported by the numpy engine")
+    if args.engine == 'numpy' and args.group_by:
+        parser.error("--group_by is not supported by the numpy engine")
+    if args.engine == 'numpy' and not all(supports_numpy_engine(agg) for agg in args.aggregator):
+        parser.error("the numpy engine only supports average, median, min, max and percentiles")
+    if args.output_format == 'npy':
+        if args.output_file is None:
+            parser.error("--output_format npy requires --output_file")
+        if args.group_by or args.follow or args.idle_timeout is not None:
+            parser.error("--output_format npy is not supported with --group_by, --follow and --idle_timeout")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1:
+        if several_inputs or args.input_file == ['-'] or args.follow or args.idle_timeout is not None:
+            parser.error("--workers requires a single input file, and is not supported with --follow and "
+                         "--idle_timeout")
+        if args.engine == 'numpy' or args.group_by:
+            parser.error("--workers is not supported by the numpy engine nor with --group_by")
+        if compressed:
+            parser.error("--workers can't split compressed input files")
+        unmerged = [agg for agg in args.aggregator if not merges_buckets(agg)]
+        if args.bucketed and unmerged:
+            parser.error("{0} can't be merged from the per-minute records of --bucketed with --workers".format(
+                ", ".join(unmerged)))
+    if args.build_index and (args.input_file == ['-'] or args.follow):
+        parser.error("--build_index requires input files, and is not supported with --follow")
+    if args.start is not None or args.end is not None:
+        if several_inputs or args.input_file == ['-'] or args.follow or args.idle_timeout is not None:
+            parser.error("--start and --end require a single input file, and are not supported with --follow and "
+                         "--idle_timeout")
+        if args.engine == 'numpy' or args.group_by or args.workers > 1 or args.checkpoint is not None:
+            parser.error("--start and --end are not supported by the numpy engine, with --group_by, --workers nor "
+                         "--checkpoint")
+        if args.start is not None and args.end is not None and args.end < args.start:
+            parser.error("--end is before --start")
+        if args.start is not None and compressed:
+            parser.error("--start can't be read from compressed input files")
+    if args.checkpoint is not None:
+        if several_inputs or args.input_file == ['-'] or args.follow or args.idle_timeout is not None:
+            parser.error("--checkpoint requires a single input file, and is not supported with --follow and "
+                         "--idle_timeout")
+        if args.output_file is None or args.output_format == 'npy':
+            parser.error("--checkpoint requires --output_file in the jsonl or csv format")
+        if args.engine == 'numpy' or args.group_by or args.workers > 1:
+            parser.error("--checkpoint is not supported by the numpy engine, with --group_by nor with --workers")
+        if compressed:
+            parser.error("--checkpoint can't resume compressed input files")
+    return args
@@ -0,0 +1,158 @@
+import datetime
+from bisect import bisect_left, insort
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pynopticon.aggregator import AverageAggregator, MaxAggregator, MinAggregator, OrderStatisticAggregator
+from pynopticon.event_processor import EventProcessor, EventProcessorError, json_loads
+from pynopticon.util import EPOCH, MINUTE_MICROSECONDS
+
+
+class BatchEventProcessor(EventProcessor):
+    """
+    Batch counterpart of `EventProcessor` meant for offline replays of large inputs. The whole input is loaded into
+    columnar NumPy arrays and every output minute is computed with vectorized operations over per-minute records,
+    instead of shifting the aggregators one minute at a time.
+    Produces the same output lines as `EventProcessor`, as long as values sum up without rounding, e.g. integer
+    durations. Requires numpy to be installed
+    """
+
+    # aggregators computed by the engine, subclasses included
+    AGGREGATORS = (AverageAggregator, MinAggregator, MaxAggregator, OrderStatisticAggregator)
+
+    def __init__(self, ifile, aggregators, ofile=None, **kwargs):
+        if np is None:
+            raise EventProcessorError("{0} requires numpy to be installed".format(self.__class__.__name__))
+        super().__init__(ifile, aggregators, ofile=ofile, **kwargs)
+
+    def execute(self):
+        """
+        executes the event processing
+        Raises `EventProcessorError` if the instance wasn't initialized as a context manager
+        :return: None
+        """
+        self._check_initialized()
+
+        with self._profiling():
+            timestamps, durations, word_counts = self._load_columns()
+            if len(timestamps) == 0:
+                return
+
+            first_minute = timestamps[0] - timestamps[0] % MINUTE_MICROSECONDS
+            event_minutes = (timestamps - first_minute) // MINUTE_MICROSECONDS
+            minutes = np.arange(event_minutes[-1] + 2)
+            lower_bounds = first_minute + minutes * MINUTE_MICROSECONDS
+
+            # the line of a minute covers the events before it, in the `window_size` minutes that precede it
+            columns = []
+            for agg in self.aggregators:
+                values = self._event_values(durations, word_counts, agg.use_word_count)
+                if isinstance(agg, OrderStatisticAggregator):
+                    window_starts = lower_bounds - agg.window_size * MINUTE_MICROSECONDS
+                    lower = np.searchsorted(timestamps, window_starts, side='left')
+                    upper = np.searchsorted(timestamps, lower_bounds, side='left')
+                    columns.append(self._order_statistic_ranges(agg, values, lower, upper).tolist())
+                else:
+                    window_start = np.maximum(minutes - agg.window_size, 0)
+                    columns.append(self._aggregate(agg, values, event_minutes, window_start, minutes).tolist())
+
+            self.writer.write_series(EPOCH + datetime.timedelta(microseconds=int(first_minute)), zip(*columns))
+
+    def _load_columns(self):
+        """
+        :return: arrays of event timestamps, in microseconds since the epoch, durations and word counts
+        """
+        timestamps, durations, word_counts = [], [], []
+        for input_file_handler in self.input_file_handlers:
+            for line in input_file_handler:
+                e = json_loads(line)
+                timestamps.append(e['timestamp'])
+                durations.append(e['duration'])
+                word_counts.append(e['nr_words'])
+        columns = (np.array(timestamps, dtype='datetime64[us]').astype(np.int64),
+                   np.array(durations, dtype=np.float64),
+                   np.array(word_counts, dtype=np.float64))
+        if len(self.input_file_handlers) > 1:
+            # the whole input is in memory anyway, so the inputs are merged by a stable sort, in which ties keep the
+            # order of the inputs like the merge of the stream engine does
+            order = np.argsort(columns[0], kind='stable')
+            columns = tuple(column[order] for column in columns)
+        return columns
+
+    @staticmethod
+    def _event_values(durations, word_counts, use_word_count):
+        if not use_word_count:
+            return durations
+        has_words = word_counts != 0
+        return np.where(has_words, durations / np.where(has_words, word_counts, 1), durations)
+
+    def _aggregate(self, agg, values, event_minutes, lower, upper):
+        """
+        Aggregates per-minute records of the events, counted and summed with `bincount`, over sliding windows of minutes
+        :param agg: aggregator whose function should be computed
+        :param values: values of all events
+        :param event_minutes: index of the minute of each event
+        :param lower: index of the first minute in the window of each minute
+        :param upper: index past the last minute in the window of each minute
+        :return: array with the aggregation value of each minute
+        """
+        minute_count = len(upper)
+        counts = np.concatenate(([0], np.cumsum(np.bincount(event_minutes, minlength=minute_count))))
+        window_counts = counts[upper] - counts[lower]
+        if isinstance(agg, AverageAggregator):
+            minute_sums = np.bincount(event_minutes, weights=values, minlength=minute_count)
+            sums = np.concatenate(([0.0], np.cumsum(minute_sums)))
+            return np.where(window_counts > 0, (sums[upper] - sums[lower]) / np.maximum(window_counts, 1), 0.0)
+        elif isinstance(agg, (MinAggregator, MaxAggregator)):
+            ufunc, identity = (np.minimum, np.inf) if isinstance(agg, MinAggregator) else (np.maximum, -np.inf)
+            minute_starts = np.flatnonzero(np.concatenate(([True], np.diff(event_minutes) != 0)))
+            minute_values = np.full(minute_count, identity)
+            minute_values[event_minutes[minute_starts]] = ufunc.reduceat(values, minute_starts)
+            return np.where(window_counts > 0, self._reduce_ranges(ufunc, minute_values, lower, upper), 0.0)
+        raise EventProcessorError("{0} is not supported by {1}".format(agg.__class__.__name__,
+                                                                       self.__class__.__name__))
+
+    @staticmethod
+    def _reduce_ranges(ufunc, values, lower, upper):
+        """
+        Sliding window reduction over ranges of `values` by doubling: level `k` holds the reduction of every run of
+        `2 ** k` values, and each range is covered by two, possibly overlapping, runs of the largest level that fits it.
+        Only one level is kept in memory at a time
+        :return: array with the reduction of each `[lower, upper)` range, 0.0 for empty ranges
+        """
+        result = np.zeros(len(lower))
+        lengths = upper - lower
+        non_empty = lengths > 0
+        levels = np.frexp(np.maximum(lengths, 1))[1] - 1
+        level_values = values
+        for level in range(int(levels.max()) + 1):
+            if level > 0:
+                half = 1 << (level - 1)
+                level_values = ufunc(level_values[:-half], level_values[half:])
+            selected = non_empty & (levels == level)
+            result[selected] = ufunc(level_values[lower[selected]], level_values[upper[selected] - (1 << level)])
+        return result
+
+    @staticmethod
+    def _order_statistic_ranges(agg, values, lower, upper):
+        """
+        There is no vectorized sliding order statistic, so the ranges are walked in order while a sorted list of the
+        current range is kept up to date, like `OrderStatisticAggregator` does. Both ends of the ranges only move
+        forward, so every value is inserted and removed once
+        :return: array with the aggregation value of each `[lower, upper)` range
+        """
+        result = np.zeros(len(lower))
+        values = values.tolist()
+        sorted_values = []
+        start = end = 0
+        for minute, (range_start, range_end) in enumerate(zip(lower.tolist(), upper.tolist())):
+            for value in values[end:range_end]:
+                insort(sorted_values, value)
+            for value in values[start:range_start]:
+                del sorted_values[bisect_left(sorted_values, value)]
+            start, end = range_start, range_end
+            result[minute] = agg.aggregate_sorted(sorted_values)
+        return result
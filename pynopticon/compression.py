@@ -0,0 +1,106 @@
+import gzip
+import io
+import os
+import threading
+from queue import Queue
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+MAGIC_NUMBERS = {
+    GZIP: b"\x1f\x8b",
+    ZSTD: b"\x28\xb5\x2f\xfd",
+}
+
+END_OF_BATCHES = object()
+
+
+class CompressionError(Exception):
+    pass
+
+
+def detect_compression(path):
+    """
+    Detects compressed files by their magic number, so their names don't matter. Only regular files are looked into,
+    reading from pipes would consume their data
+    :param path: path of the file
+    :return: `GZIP`, `ZSTD` or `None` for uncompressed files
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        header = f.read(max(len(magic) for magic in MAGIC_NUMBERS.values()))
+    for compression, magic in MAGIC_NUMBERS.items():
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def open_input(path):
+    """
+    Opens an input file for reading text, and decompresses it on the fly if it's compressed. Lines of compressed
+    files are decompressed by a reader thread, see `PipelinedReader`
+    :param path: path of the file
+    :return: file object
+    """
+    compression = detect_compression(path)
+    if compression == GZIP:
+        return PipelinedReader(gzip.open(path, 'rt'))
+    elif compression == ZSTD:
+        if zstandard is None:
+            raise CompressionError("zstandard must be installed to read {0}".format(path))
+        # files written by several runs of `zstd` have several frames
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+        return PipelinedReader(io.TextIOWrapper(stream))
+    return open(path, 'r')
+
+
+class PipelinedReader:
+    """
+    File wrapper whose lines are read by a thread of its own and handed over in large batches through a bounded queue.
+    Decompression releases the GIL, so it overlaps with the parsing and aggregation of the previous batches, while the
+    queue bounds the memory used when reading is faster than processing
+    """
+    BATCH_SIZE = 1 << 20
+    QUEUE_SIZE = 8
+
+    def __init__(self, file):
+        """
+        Pipelined reader constructor
+        :param file: text file object
+        """
+        self.file = file
+
+    def __iter__(self):
+        batch_queue = Queue(maxsize=self.QUEUE_SIZE)
+        reader = threading.Thread(target=self._enqueue_batches, args=(batch_queue,), daemon=True)
+        reader.start()
+        while True:
+            batch = batch_queue.get()
+            if isinstance(batch, BaseException):
+                raise batch
+            elif batch is END_OF_BATCHES:
+                return
+            yield from batch
+
+    def _enqueue_batches(self, batch_queue):
+        try:
+            while True:
+                # about `BATCH_SIZE` characters of whole lines
+                batch = self.file.readlines(self.BATCH_SIZE)
+                if len(batch) == 0:
+                    break
+                batch_queue.put(batch)
+        except Exception as e:
+            batch_queue.put(e)
+        batch_queue.put(END_OF_BATCHES)
+
+    def readline(self):
+        return self.file.readline()
+
+    def close(self):
+        self.file.close()
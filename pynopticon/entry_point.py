@@ -1,19 +1,66 @@
-from pynopticon.aggregator import MedianAggregator, AverageAggregator, MaxAggregator, MinAggregator
+import cProfile
+import sys
+
+from pynopticon.api import create_aggregators
+from pynopticon.batch import BatchEventProcessor
 from pynopticon.event_processor import EventProcessor
+from pynopticon.grouping import GroupedEventProcessor
+from pynopticon.index import build_index
+from pynopticon.parallel import ParallelEventProcessor
+from pynopticon.server import serve
+from pynopticon.stats import PipelineStats
+
+
+def build_aggregators(parsed_args):
+    """
+    :param parsed_args: `Namespace` object returned by `parse_args`
+    :return: new list of the aggregators requested in the arguments, for each window size, see `create_aggregators`
+    """
+    return create_aggregators(parsed_args.aggregator, parsed_args.window_size,
+                              use_word_count=parsed_args.use_word_count, bucketed=parsed_args.bucketed,
+                              relative_accuracy=parsed_args.relative_accuracy, half_life=parsed_args.half_life)
 
 
 def run(parsed_args):
-    parsed_args.aggregator = set(parsed_args.aggregator)
-    aggregators = []
-    for agg in parsed_args.aggregator:
-        if agg == 'median':
-            aggregators.append(MedianAggregator(parsed_args.window_size, use_word_count=parsed_args.use_word_count))
-        elif agg == 'max':
-            aggregators.append(MaxAggregator(parsed_args.window_size, use_word_count=parsed_args.use_word_count))
-        elif agg == 'min':
-            aggregators.append(MinAggregator(parsed_args.window_size, use_word_count=parsed_args.use_word_count))
-        else:
-            aggregators.append(AverageAggregator(parsed_args.window_size, use_word_count=parsed_args.use_word_count))
+    # duplicates are dropped, the order of the output columns is kept from one run to the next
+    parsed_args.aggregator = list(dict.fromkeys(parsed_args.aggregator))
+    parsed_args.window_size = sorted(set(parsed_args.window_size))
+    if parsed_args.listen is not None:
+        serve(build_aggregators(parsed_args), parsed_args.listen, history=parsed_args.history,
+              idle_timeout=parsed_args.idle_timeout, allowed_lateness=parsed_args.allowed_lateness)
+        return
+    if parsed_args.build_index:
+        for input_file in parsed_args.input_file:
+            build_index(input_file)
+        return
 
-    with EventProcessor(parsed_args.input_file, aggregators, ofile=parsed_args.output_file) as processor:
+    stats = PipelineStats() if parsed_args.stats else None
+    profiler = cProfile.Profile() if parsed_args.profile else None
+    output_kwargs = {'ofile': parsed_args.output_file, 'output_format': parsed_args.output_format, 'stats': stats,
+                     'profiler': profiler}
+    if parsed_args.checkpoint:
+        output_kwargs['checkpoint'] = parsed_args.checkpoint
+    if parsed_args.allowed_lateness is not None:
+        output_kwargs['allowed_lateness'] = parsed_args.allowed_lateness
+    if parsed_args.engine == 'numpy':
+        processor = BatchEventProcessor(parsed_args.input_file, build_aggregators(parsed_args), **output_kwargs)
+    elif parsed_args.workers > 1:
+        processor = ParallelEventProcessor(parsed_args.input_file, build_aggregators(parsed_args),
+                                           workers=parsed_args.workers, **output_kwargs)
+    elif parsed_args.group_by:
+        processor = GroupedEventProcessor(parsed_args.input_file, lambda: build_aggregators(parsed_args),
+                                          parsed_args.group_by, follow=parsed_args.follow,
+                                          idle_timeout=parsed_args.idle_timeout, **output_kwargs)
+    else:
+        processor = EventProcessor(parsed_args.input_file, build_aggregators(parsed_args), follow=parsed_args.follow,
+                                   idle_timeout=parsed_args.idle_timeout, start=parsed_args.start,
+                                   end=parsed_args.end, **output_kwargs)
+    with processor:
         processor.execute()
+    if processor.late_events > 0:
+        sys.stderr.write("{0} events arrived more than {1}s after later ones and were dropped\n".format(
+            processor.late_events, parsed_args.allowed_lateness))
+    if profiler is not None:
+        profiler.dump_stats(parsed_args.profile)
+    if stats is not None:
+        stats.write_report(parsed_args.stats)
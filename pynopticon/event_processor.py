@@ -1,40 +1,72 @@
+import heapq
+import os
 import sys
-from contextlib import ContextDecorator
+import threading
+import time
+from contextlib import ContextDecorator, nullcontext
+from queue import Queue, Empty
 
 import json
 import datetime
-import math
 
-from pynopticon.util import timestamp_floor
+from pynopticon.aggregator import MovingAggregator
+from pynopticon.compression import detect_compression, open_input
+from pynopticon.index import find_offset
+from pynopticon.output import OUTPUT_WRITERS
+from pynopticon.reorder import ReorderBuffer
+from pynopticon.util import (timestamp_floor, parse_fixed_timestamp, FIXED_TIME_FORMAT, EPOCH, MICROSECOND,
+                             MINUTE_MICROSECONDS, epoch_microseconds)
+from pynopticon.window import share_windows
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+END_OF_INPUT = object()
+CHECKPOINT_VERSION = 3
 
 
 class Event:
     """
-    Python representation of events parsed from the input
+    Python representation of events parsed from the input. The timestamp is also kept as an integer number of
+    microseconds since the epoch, computed once, for the comparisons of the windows
     """
-    def __init__(self, timestamp, duration, word_count):
+    __slots__ = ('timestamp', 'timestamp_microseconds', 'duration', 'word_count', 'group')
+
+    def __init__(self, timestamp, duration, word_count, group=None):
         self.timestamp = timestamp
+        # `epoch_microseconds`, inlined
+        self.timestamp_microseconds = None if timestamp is None else (timestamp - EPOCH) // MICROSECOND
         self.duration = duration
         self.word_count = word_count
+        self.group = group
 
     @classmethod
-    def parse_from_json(cls, json_string, time_format):
+    def parse_from_json(cls, json_string, time_format, group_by=None):
         """
         Parses an input line into `Event` object. Assumes all input lines have correct structure and there are no empty
-        lines between two input lines. Throws `EOFError` if an empty line is found
+        lines between two input lines. Throws `EOFError` if an empty line is found.
+        JSON is decoded with `orjson` when it is installed, and timestamps in `FIXED_TIME_FORMAT` skip
+        `strptime` altogether
         :param json_string: string of the event to parse
         :param time_format: python time format string
+        :param group_by: names of the fields whose values make up the `group` of the event, if any
         :return: returns parsed `Event` object
         """
         if json_string == "":
             raise EOFError()
-        e = json.loads(json_string)
+        e = json_loads(json_string)
         timestamp = e.get('timestamp')
         if timestamp is not None:
-            timestamp = datetime.datetime.strptime(timestamp, time_format)
-        e['timestamp'] = timestamp
+            if time_format == FIXED_TIME_FORMAT:
+                timestamp = parse_fixed_timestamp(timestamp)
+            else:
+                timestamp = datetime.datetime.strptime(timestamp, time_format)
 
-        return cls(timestamp, e['duration'], e['nr_words'])
+        group = tuple(e.get(field) for field in group_by) if group_by else None
+
+        return cls(timestamp, e['duration'], e['nr_words'], group=group)
 
 
 class EventProcessorError(Exception):
@@ -49,32 +81,120 @@ class EventProcessor(ContextDecorator):
      """
     INPUT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
     OUTPUT_TIME_FORMAT = "%Y-%m-%d %H:%M:00"
+    MINUTE = datetime.timedelta(minutes=1)
+    STDIN = "-"
+    FOLLOW_POLL_INTERVAL = 0.25
+    READ_QUEUE_SIZE = 1024
 
-    def __init__(self, ifile, aggregators, ofile=None):
+    def __init__(self, ifile, aggregators, ofile=None, follow=False, idle_timeout=None, output_format='jsonl',
+                 stats=None, profiler=None, checkpoint=None, start=None, end=None, allowed_lateness=None):
         """
         Event Processor constructor
-        :param ifile: input file path
-        :param aggregators: list of aggregators to use in the output
+        :param ifile: input file path, or list of paths of several time-sorted inputs that are merged on the fly into
+        one ordered stream. If set to `-`, stdin will be used. Files compressed with gzip or zstd are decompressed on
+        the fly, see `open_input`
+        :param aggregators: list of aggregators to use in the output. Aggregators configured with the same window share
+        it, and windows of different sizes share their events, see `share_windows`
         :param ofile: output file path. If set to `None`, stdout will be used as default.
+        :param follow: if set to `True`, lines appended to the input file are processed as they come, like `tail -f`
+        does, instead of stopping at the end of the file
+        :param idle_timeout: if set, the minute of the last events is closed and its line written when no event arrives
+        for that many seconds, instead of waiting for an event of a later minute. Events that still arrive for that
+        minute only count in the following minutes
+        :param output_format: format of the output, one of `OUTPUT_WRITERS`
+        :param stats: `PipelineStats` object that instruments the processing, if set
+        :param profiler: context manager entered around the hot loop only, e.g. a `cProfile.Profile` object
+        :param checkpoint: path of a checkpoint file, for append-only input files that are processed again and again.
+        If it exists, the processing resumes where the run that wrote it stopped, and the new lines are appended to the
+        output file. It's then written again, see `_save_checkpoint`. Requires a single uncompressed input file and an
+        output file in a text format
+        :param start: if set, only the lines of this minute and later ones are written. The input is read from the
+        first event of the window of this minute, found with the sidecar index of the input or a binary search, see
+        `find_offset`, so the time taken depends on the range and not on the size of the input. Requires a single
+        time-sorted, uncompressed input file that isn't followed
+        :param end: if set, the input is read up to this minute, whose line is the last one written
+        :param allowed_lateness: if set, events may arrive up to that many seconds after later ones, e.g. in logs of
+        several producers, and are put back in timestamp order by a `ReorderBuffer`. Events that arrive later than that
+        are dropped and counted, see `late_events`. Requires the input to be read from its beginning to its end, so it
+        can't be combined with a checkpoint nor a time range
         """
-        self._input_filename = ifile
+        self._input_filenames = [ifile] if isinstance(ifile, str) else list(ifile)
+        several_inputs = len(self._input_filenames) > 1
+        if several_inputs and (follow or idle_timeout is not None or self.STDIN in self._input_filenames):
+            raise EventProcessorError("several inputs can't be merged from stdin, nor be followed")
+        if checkpoint is not None and (several_inputs or self._input_filenames == [self.STDIN] or follow or
+                                       idle_timeout is not None or not ofile or OUTPUT_WRITERS[output_format].binary):
+            raise EventProcessorError("checkpoints require a single input file that isn't followed, and an output file "
+                                      "in a text format")
+        if (start is not None or end is not None) and (several_inputs or self._input_filenames == [self.STDIN] or
+                                                       follow or idle_timeout is not None or checkpoint is not None):
+            raise EventProcessorError("time ranges require a single input file that isn't followed, and no checkpoint")
+        if start is not None and detect_compression(self._input_filenames[0]) is not None:
+            raise EventProcessorError("time ranges can't be read from compressed files")
+        if allowed_lateness is not None and (checkpoint is not None or start is not None or end is not None):
+            raise EventProcessorError("an allowed lateness can't be combined with a checkpoint nor a time range")
+        if checkpoint is not None:
+            stateless = [x.name for x in aggregators if not self._saves_state(x)]
+            if stateless:
+                raise EventProcessorError("checkpoints require aggregators that save their state, {0} don't".format(
+                    ", ".join(stateless)))
+        self.reorder_buffer = None if allowed_lateness is None else ReorderBuffer(allowed_lateness)
+        self._start = None if start is None else timestamp_floor(start)
+        self._end = None if end is None else timestamp_floor(end)
+        # first event of the input that is past the end, if any
+        self._end_event = None
+        self._checkpoint = checkpoint
+        # bytes of the input consumed so far, only counted with a checkpoint
+        self._input_offset = 0
         self._output_file = ofile
+        self._writer_class = OUTPUT_WRITERS[output_format]
+        self._follow = follow
+        self._idle_timeout = idle_timeout
+        # output is flushed every minute when the input is a live stream
+        self._live = follow or idle_timeout is not None or self._input_filenames == [self.STDIN]
+        self.stats = stats
+        self.profiler = profiler
 
         self.aggregators = aggregators
+        self.stores = share_windows(aggregators)
 
+        self._minute_open = False
         self._initialized = False
 
     def __enter__(self):
-        self.input_file_handler = open(self._input_filename, 'r')
-
-        self.output_file_handler = open(self._output_file, 'w') if self._output_file else sys.stdout
+        checkpoint_state = self._load_checkpoint()
+        if self._checkpoint is not None:
+            self._open_checkpointed_files(checkpoint_state)
+        else:
+            self.input_file_handlers = [sys.stdin if filename == self.STDIN else open_input(filename)
+                                        for filename in self._input_filenames]
+            if self._output_file:
+                self.output_file_handler = open(self._output_file, 'wb' if self._writer_class.binary else 'w')
+            else:
+                self.output_file_handler = sys.stdout.buffer if self._writer_class.binary else sys.stdout
+        self.writer = self._create_writer()
+        if checkpoint_state is not None:
+            self._restore_checkpoint(checkpoint_state)
+        if self._start is not None:
+            self._seek_start()
+        if self.stats is not None:
+            self.stats.instrument(self)
         self._initialized = True
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.input_file_handler.close()
-        self.output_file_handler.close()
-        return exc_type is EOFError
+        for input_file_handler in self.input_file_handlers:
+            if input_file_handler is not sys.stdin:
+                input_file_handler.close()
+        self.writer.close()
+        if self.stats is not None:
+            self.stats.late_events = self.late_events
+            self.stats.finish()
+        if not self._output_file:
+            self.output_file_handler.flush()
+        else:
+            self.output_file_handler.close()
+        return False
 
     def execute(self):
         """
@@ -82,46 +202,352 @@ class EventProcessor(ContextDecorator):
         Raises `EventProcessorError` if the instance wasn't initialized as a context manager
         :return: None
         """
+        self._check_initialized()
+
+        with self._profiling():
+            for event in self._ordered_events():
+                if event is None:
+                    self._close_minute()
+                else:
+                    self._process_next(event)
+            if self._checkpoint is not None:
+                # the last minute is still open, more events of it may be appended to the input
+                self._save_checkpoint()
+            if self._end_event is not None:
+                self._advance_to_end()
+            else:
+                self._close_minute()
+
+    @property
+    def late_events(self):
+        """
+        :return: number of events dropped for arriving later than the allowed lateness
+        """
+        return 0 if self.reorder_buffer is None else self.reorder_buffer.late_events
+
+    def _load_checkpoint(self):
+        """
+        Reads the checkpoint, and checks that it was written by a run configured with the same aggregators before any
+        file is opened
+        :return: state saved by `_save_checkpoint`, or `None` if there is no checkpoint yet
+        """
+        if self._checkpoint is None or not os.path.exists(self._checkpoint):
+            return None
+        with open(self._checkpoint, 'r') as f:
+            state = json.load(f)
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise EventProcessorError("checkpoint {0} has an unsupported version".format(self._checkpoint))
+        store_keys = {self._checkpoint_store_key(store): store for store in self.stores}
+        # output columns follow the order of the aggregators, whose states depend on their parameters
+        if [[name, parameters] for name, parameters, _ in state['aggregators']] != \
+                [[x.name, x.get_parameters()] for x in self.aggregators] or \
+                sorted(state['stores']) != sorted(store_keys) or \
+                any(sorted(state['stores'][key]['windows']) != sorted(str(window.window_size)
+                                                                      for window in store.windows)
+                    for key, store in store_keys.items()):
+            raise EventProcessorError(
+                "checkpoint {0} was written with other aggregators or parameters".format(self._checkpoint))
+        return state
+
+    def _open_checkpointed_files(self, state):
+        """
+        Opens the input in binary mode, so its byte offset is known, and the output for appending. When resuming, the
+        input is read from the offset of the checkpoint, and the output is truncated to the size it had then, which
+        drops the line of the minute that was still open
+        :param state: checkpoint state, or `None` to start from scratch
+        :return: None
+        """
+        input_filename, = self._input_filenames
+        if detect_compression(input_filename) is not None:
+            raise EventProcessorError("checkpoints can't resume compressed files")
+        input_offset, output_offset = (0, 0) if state is None else (state['input_offset'], state['output_offset'])
+        if os.path.getsize(input_filename) < input_offset:
+            raise EventProcessorError(
+                "{0} is shorter than when checkpoint {1} was written".format(input_filename, self._checkpoint))
+        if state is not None and (not os.path.exists(self._output_file) or
+                                  os.path.getsize(self._output_file) < output_offset):
+            raise EventProcessorError(
+                "{0} is shorter than when checkpoint {1} was written".format(self._output_file, self._checkpoint))
+
+        input_file_handler = open(input_filename, 'rb')
+        input_file_handler.seek(input_offset)
+        self.input_file_handlers = [input_file_handler]
+        self._input_offset = input_offset
+        self.output_file_handler = open(self._output_file, 'r+' if state is not None else 'w')
+        self.output_file_handler.seek(output_offset)
+        self.output_file_handler.truncate()
+
+    @staticmethod
+    def _saves_state(aggregator):
+        """
+        :return: `True` if the aggregator implements `get_state` and `set_state`, see `MovingAggregator`
+        """
+        return all(getattr(type(aggregator), method, None) not in (None, getattr(MovingAggregator, method))
+                   for method in ('get_state', 'set_state'))
+
+    def _checkpoint_store_key(self, store):
+        values = 'word_counts' if store.word_counts else 'words' if store.use_word_count else 'duration'
+        return "{0}-{1}".format(values, 'bucketed' if store.bucketed else 'events')
+
+    def _save_checkpoint(self):
+        """
+        Saves the input offset, the output size, the windows of each store and the state of each aggregator while the
+        last minute is still open, i.e. before its line is written. The file is replaced atomically, so an interrupted
+        run leaves the previous checkpoint
+        :return: None
+        """
+        self.writer.flush()
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'input_offset': self._input_offset,
+            'output_offset': self.output_file_handler.tell(),
+            'minute_open': self._minute_open,
+            'stores': {self._checkpoint_store_key(store): store.get_state() for store in self.stores},
+            'aggregators': [[x.name, x.get_parameters(), x.get_state()] for x in self.aggregators],
+        }
+        temporary_file = self._checkpoint + ".tmp"
+        with open(temporary_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary_file, self._checkpoint)
+
+    def _restore_checkpoint(self, state):
+        """
+        :param state: checkpoint state of a run configured with the same aggregators, see `_load_checkpoint`
+        :return: None
+        """
+        for store in self.stores:
+            store.set_state(state['stores'][self._checkpoint_store_key(store)])
+        for aggregator, (_, _, aggregator_state) in zip(self.aggregators, state['aggregators']):
+            aggregator.set_state(aggregator_state)
+        self._minute_open = state['minute_open']
+
+    def _seek_start(self):
+        """
+        Moves the input to the first event of the window of the start minute, from the largest window. When events are
+        skipped, the windows start at that minute as if they had been evicted, otherwise they start with the first
+        event, as usual
+        :return: None
+        """
+        input_filename, = self._input_filenames
+        window_size = max(window.window_size for store in self.stores for window in store.windows)
+        first_minute = self._start - self.MINUTE * window_size
+        offset = find_offset(input_filename, epoch_microseconds(first_minute), self.INPUT_TIME_FORMAT)
+        self.input_file_handlers[0].seek(offset)
+        if offset > 0:
+            for store in self.stores:
+                store.window_lower_bound = first_minute
+
+    def _until_end(self, events):
+        """
+        :param events: events in timestamp order
+        :return: generator of the events before the end minute
+        """
+        end = epoch_microseconds(self._end)
+        for event in events:
+            if event.timestamp_microseconds >= end:
+                self._end_event = event
+                return
+            yield event
+
+    def _advance_to_end(self):
+        """
+        Writes the lines up to the end minute, the ones an event past the end would write
+        :return: None
+        """
+        if self.stores[0].window_lower_bound is None:
+            # no event in the range, the line of the minute of the event past the end is the first one of the output
+            if timestamp_floor(self._end_event.timestamp) == self._end:
+                for store in self.stores:
+                    store.window_lower_bound = self._end
+                self._write_minute()
+            return
+        minutes = (epoch_microseconds(self._end) - self.stores[0].lower_bound_microseconds) // MINUTE_MICROSECONDS
+        if minutes > 0:
+            self._advance(minutes)
+
+    def _profiling(self):
+        """
+        :return: context manager of the profiler, if any, to enter around the hot loop
+        """
+        return self.profiler if self.profiler is not None else nullcontext()
+
+    def _create_writer(self):
+        """
+        :return: `OutputWriter` of the output file
+        """
+        return self._writer_class(self.output_file_handler, [x.name for x in self.aggregators],
+                                  self.OUTPUT_TIME_FORMAT)
+
+    def _check_initialized(self):
         if not self._initialized:
             raise EventProcessorError(
                 "{0} must be used as context manager within a with statement".format(self.__class__.__name__))
 
-        first_event = Event.parse_from_json(self.input_file_handler.readline(), self.INPUT_TIME_FORMAT)
-        self._init_output_file(first_event)
-        next_event = None
-        for line in self.input_file_handler:
-            next_event = Event.parse_from_json(line, self.INPUT_TIME_FORMAT)
-            self._process_next(next_event)
-        if next_event is not None:
-            self._process_next(next_event, is_final=True)
-
-    def _process_next(self, next_event, is_final=False):
-        timespan_minutes = math.floor((next_event.timestamp - self.aggregators[0].last_event.timestamp).seconds / 60)
-        end_range = 2 if is_final else 1
-        for i in range(1, timespan_minutes + end_range):
-            for agg in self.aggregators:
-                agg.shift_window()
-
-            aggregated_dict = {x.name: x.aggregate() for x in self.aggregators}
-            output_dict = {
-                "date": self.aggregators[0].window_lower_bound.strftime(self.OUTPUT_TIME_FORMAT),
-            }
-            output_dict.update(aggregated_dict)
-            self.output_file_handler.write("{0}\n".format(json.dumps(output_dict)))
-        if not is_final:
-            for agg in self.aggregators:
-                agg.add_event(next_event)
+    def _parse_event(self, line):
+        return Event.parse_from_json(line, self.INPUT_TIME_FORMAT)
+
+    def _read_events(self):
+        """
+        Reads the events of the input incrementally. Several inputs are merged with a heap that only holds the next
+        event of each one of them, so they don't need to be sorted together beforehand
+        :return: generator of events in timestamp order. When an idle timeout is set, `None` is yielded every time it
+        expires without a new event
+        """
+        if self._end is not None:
+            yield from self._until_end(self._parse_event(line) for line in self._read_lines())
+        elif len(self.input_file_handlers) == 1:
+            for line in self._read_lines():
+                yield None if line is None else self._parse_event(line)
+        else:
+            yield from heapq.merge(*(map(self._parse_event, input_file_handler)
+                                     for input_file_handler in self.input_file_handlers),
+                                   key=lambda event: event.timestamp)
+
+    def _ordered_events(self):
+        """
+        :return: generator of the events of `_read_events`, put back in timestamp order when an allowed lateness is set
+        """
+        if self.reorder_buffer is None:
+            return self._read_events()
+        return self.reorder_buffer.reorder(self._read_events())
+
+    def _read_lines(self):
+        """
+        Reads the input incrementally
+        :return: generator of input lines. When an idle timeout is set, `None` is yielded every time it expires without
+        a new line
+        """
+        lines = self._follow_lines() if self._follow else self.input_file_handlers[0]
+        if self._checkpoint is not None:
+            lines = self._complete_lines(lines)
+        if self._idle_timeout is None:
+            yield from lines
+            return
+
+        # lines are read by another thread, so waiting for them can time out. The queue is bounded to keep memory
+        # bounded when the input is faster than the processing
+        line_queue = Queue(maxsize=self.READ_QUEUE_SIZE)
+        reader = threading.Thread(target=self._enqueue_lines, args=(lines, line_queue), daemon=True)
+        reader.start()
+        while True:
+            try:
+                line = line_queue.get(timeout=self._idle_timeout)
+            except Empty:
+                yield None
+                continue
+            if isinstance(line, BaseException):
+                raise line
+            elif line is END_OF_INPUT:
+                return
+            yield line
+
+    def _complete_lines(self, lines):
+        """
+        Counts the bytes of the lines that are read, for checkpoints. A last line without line break may still be
+        being written, so it's left for the next run
+        :param lines: lines of the input, in binary mode
+        :return: generator of the lines ended by a line break
+        """
+        for line in lines:
+            if not line.endswith(b"\n"):
+                return
+            self._input_offset += len(line)
+            yield line
+
+    def _enqueue_lines(self, lines, line_queue):
+        try:
+            for line in lines:
+                line_queue.put(line)
+        except Exception as e:
+            line_queue.put(e)
+        line_queue.put(END_OF_INPUT)
+
+    def _follow_lines(self):
+        """
+        :return: generator of the lines of the input that never reaches its end, and waits for lines to be appended
+        """
+        partial_line = ""
+        while True:
+            line = self.input_file_handlers[0].readline()
+            if line == "":
+                time.sleep(self.FOLLOW_POLL_INTERVAL)
+                continue
+            # a line may be read while it is still being written
+            partial_line += line
+            if partial_line.endswith("\n"):
+                yield partial_line
+                partial_line = ""
+
+    def _process_next(self, next_event):
+        if self.stores[0].window_lower_bound is None:
+            self._init_output_file(next_event)
+        else:
+            # the lower bound is the start of a minute, so the event doesn't need to be rounded to its own
+            timespan_minutes = (next_event.timestamp_microseconds - self.stores[0].lower_bound_microseconds) // \
+                MINUTE_MICROSECONDS
+            if timespan_minutes > 0:
+                self._advance(timespan_minutes)
+            for store in self.stores:
+                store.add_event(next_event)
+        self._minute_open = True
+
+    def _close_minute(self):
+        """
+        Closes the minute of the last added events, at the end of the input or when it is idle
+        :return: None
+        """
+        if self._minute_open:
+            self._advance(1)
+            self._minute_open = False
+
+    def _advance(self, minutes):
+        """
+        Shifts the windows and writes the lines of the next `minutes` minutes
+        :param minutes: number of minutes to advance
+        :return: None
+        """
+        for i in range(minutes):
+            for store in self.stores:
+                store.shift_window()
+            self._write_minute()
+            if all(len(store) == 0 for store in self.stores):
+                self._fast_forward(minutes - i - 1)
+                break
+        if self._live:
+            self.writer.flush()
+
+    def _fast_forward(self, minutes):
+        """
+        Skips over minutes in which the windows of all aggregators are empty. Their output only differs in the date,
+        so the values are handed over to the writer once for all of them
+        :param minutes: number of minutes to skip
+        :return: None
+        """
+        if minutes <= 0:
+            return
+        date = self.stores[0].window_lower_bound
+        first_date = date + self.MINUTE
+        if self._start is not None and first_date < self._start:
+            # lines before the start minute are not written
+            skipped = min(minutes, (self._start - first_date) // self.MINUTE)
+            first_date += self.MINUTE * skipped
+            if minutes > skipped:
+                self.writer.write_repeated(first_date, minutes - skipped, [x.aggregate() for x in self.aggregators])
+        else:
+            self.writer.write_repeated(first_date, minutes, [x.aggregate() for x in self.aggregators])
+        for store in self.stores:
+            store.window_lower_bound = date + self.MINUTE * minutes
+
+    def _write_minute(self):
+        date = self.stores[0].window_lower_bound
+        if self._start is not None and date < self._start:
+            return
+        self.writer.write(date, [x.aggregate() for x in self.aggregators])
 
     def _init_output_file(self, first_event):
         ts = timestamp_floor(first_event.timestamp)
-        for agg in self.aggregators:
-            agg.window_lower_bound = ts
-        aggregated_dict = {x.name: x.aggregate() for x in self.aggregators}
-        output_dict = {
-            "date": self.aggregators[0].window_lower_bound.strftime(self.OUTPUT_TIME_FORMAT),
-        }
-        output_dict.update(aggregated_dict)
-        for agg in self.aggregators:
-            agg.add_event(first_event)
-
-        self.output_file_handler.write("{0}\n".format(json.dumps(output_dict)))
+        for store in self.stores:
+            store.window_lower_bound = ts
+        self._write_minute()
+        for store in self.stores:
+            store.add_event(first_event)
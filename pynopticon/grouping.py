@@ -0,0 +1,97 @@
+from pynopticon.event_processor import Event, EventProcessor
+from pynopticon.util import timestamp_floor
+from pynopticon.window import share_windows
+
+
+class EventGroup:
+    """
+    Moving aggregators of the events of one group, i.e. one combination of values of the grouping fields
+    """
+
+    def __init__(self, key, aggregators, window_lower_bound):
+        """
+        Event group constructor
+        :param key: tuple of values of the grouping fields
+        :param aggregators: list of aggregators of the group, without any event yet
+        :param window_lower_bound: `datetime` lower bound of the windows when the group is created
+        """
+        self.key = key
+        self.aggregators = aggregators
+        self.stores = share_windows(aggregators)
+        for store in self.stores:
+            store.window_lower_bound = window_lower_bound
+
+    def __len__(self):
+        return max(len(store) for store in self.stores)
+
+
+class GroupedEventProcessor(EventProcessor):
+    """
+    Event processor that keeps a separate set of moving aggregators for every combination of values of the `group_by`
+    fields of the events, and outputs one line per minute for each group with events in its windows.
+    Groups are created when their first event arrives and dropped as soon as their windows are empty, so minutes only
+    cost as much as the groups that are active in them
+    """
+
+    def __init__(self, ifile, aggregator_factory, group_by, ofile=None, **kwargs):
+        """
+        Grouped Event Processor constructor
+        :param ifile: input file path, see `EventProcessor`
+        :param aggregator_factory: callable that returns a new list of aggregators, called once for each group
+        :param group_by: names of the event fields to group by
+        :param ofile: output file path, see `EventProcessor`
+        :param kwargs: arguments passed to the super constructor
+        """
+        super().__init__(ifile, [], ofile=ofile, **kwargs)
+        self.aggregator_factory = aggregator_factory
+        self.group_by = list(group_by)
+        self.groups = {}
+        self.window_lower_bound = None
+
+    def _parse_event(self, line):
+        return Event.parse_from_json(line, self.INPUT_TIME_FORMAT, group_by=self.group_by)
+
+    def _process_next(self, next_event):
+        if self.window_lower_bound is None:
+            self._init_output_file(next_event)
+        else:
+            timespan_minutes = (timestamp_floor(next_event.timestamp) - self.window_lower_bound) // self.MINUTE
+            if timespan_minutes > 0:
+                self._advance(timespan_minutes)
+        group = self.groups.get(next_event.group)
+        if group is None:
+            group = self.groups[next_event.group] = EventGroup(next_event.group, self.aggregator_factory(),
+                                                               self.window_lower_bound)
+            if self.stats is not None:
+                self.stats.watch(group.stores, group.aggregators)
+        for store in group.stores:
+            store.add_event(next_event)
+        self._minute_open = True
+
+    def _advance(self, minutes):
+        for i in range(minutes):
+            if len(self.groups) == 0:
+                # nothing to output until the next event
+                self.window_lower_bound += self.MINUTE * (minutes - i)
+                break
+            self.window_lower_bound += self.MINUTE
+            drained = []
+            for group in self.groups.values():
+                for store in group.stores:
+                    store.shift_window()
+                if len(group) == 0:
+                    drained.append(group.key)
+                else:
+                    self.writer.write(self.window_lower_bound, [x.aggregate() for x in group.aggregators],
+                                      group=group.key)
+            for key in drained:
+                del self.groups[key]
+        if self._live:
+            self.writer.flush()
+
+    def _create_writer(self):
+        names = [x.name for x in self.aggregator_factory()]
+        return self._writer_class(self.output_file_handler, names, self.OUTPUT_TIME_FORMAT, group_by=self.group_by)
+
+    def _init_output_file(self, first_event):
+        self.window_lower_bound = timestamp_floor(first_event.timestamp)
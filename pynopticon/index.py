@@ -0,0 +1,200 @@
+import datetime
+import json
+import os
+from array import array
+
+from pynopticon.compression import detect_compression
+from pynopticon.util import FIXED_TIME_FORMAT, MINUTE_MICROSECONDS, epoch_microseconds, parse_fixed_timestamp
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"PYNIDX01"
+INDEX_ITEM_SIZE = array('q').itemsize
+
+
+class MinuteIndexError(Exception):
+    pass
+
+
+def index_path(path):
+    """
+    :param path: path of an input file
+    :return: path of its sidecar index
+    """
+    return path + INDEX_SUFFIX
+
+
+def line_timestamp(line, time_format=FIXED_TIME_FORMAT):
+    """
+    :param line: input line
+    :param time_format: python time format string of the timestamps
+    :return: timestamp of the event of the line, in microseconds since the epoch, `None` for a last line without line
+    break that can't be decoded, which may still be being written
+    """
+    try:
+        timestamp = json_loads(line)['timestamp']
+    except ValueError:
+        if line.endswith(b"\n"):
+            raise
+        return None
+    if time_format == FIXED_TIME_FORMAT:
+        return epoch_microseconds(parse_fixed_timestamp(timestamp))
+    return epoch_microseconds(datetime.datetime.strptime(timestamp, time_format))
+
+
+class MinuteIndex:
+    """
+    Byte offset of the first event of every minute of a time-sorted input file, from the minute of its first event to
+    the one of its last event. Minutes without events have the offset of the next event, so any minute is looked up
+    with one subtraction. The sidecar file is the magic number, the size of the input that was indexed and the first
+    minute, then one 8-byte offset per minute, about 350 KiB for a month
+    """
+
+    def __init__(self, indexed_size, first_minute, offsets):
+        """
+        Minute Index constructor
+        :param indexed_size: bytes of the input that were indexed, lines appended later are not
+        :param first_minute: minute of the first event, in microseconds since the epoch
+        :param offsets: `array('q')` of the offset of each minute
+        """
+        self.indexed_size = indexed_size
+        self.first_minute = first_minute
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, path, time_format=FIXED_TIME_FORMAT):
+        """
+        Reads the whole input once. A last line that is still being written is left out
+        :param path: path of a time-sorted, uncompressed input file
+        :param time_format: python time format string of the timestamps
+        :return: `MinuteIndex` object
+        """
+        if detect_compression(path) is not None:
+            raise MinuteIndexError("compressed files can't be indexed, {0} can't be read from an offset".format(path))
+        offsets = array('q')
+        first_minute = None
+        position = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                minute = line_timestamp(line, time_format)
+                if minute is None:
+                    break
+                minute -= minute % MINUTE_MICROSECONDS
+                if first_minute is None:
+                    first_minute = minute
+                # the minutes up to this one that don't have an offset yet start at this line
+                for _ in range((minute - first_minute) // MINUTE_MICROSECONDS + 1 - len(offsets)):
+                    offsets.append(position)
+                position += len(line)
+        return cls(position, first_minute or 0, offsets)
+
+    @staticmethod
+    def read_offset(index_file, minute):
+        """
+        Looks up one minute in the sidecar file, without reading the others
+        :param index_file: path of the sidecar file
+        :param minute: minute, in microseconds since the epoch
+        :return: `(offset, indexed_size)`, where `offset` is the one of the first line of `minute` or later, and `None`
+        if `minute` is after the indexed lines. `None` if there is no valid index
+        """
+        if not os.path.isfile(index_file):
+            return None
+        header_size = len(INDEX_MAGIC) + 2 * INDEX_ITEM_SIZE
+        with open(index_file, 'rb') as f:
+            header = f.read(header_size)
+            if len(header) < header_size or not header.startswith(INDEX_MAGIC):
+                return None
+            indexed_size, first_minute = array('q', header[len(INDEX_MAGIC):])
+            i = (minute - first_minute) // MINUTE_MICROSECONDS
+            if i < 0:
+                return 0, indexed_size
+            f.seek(header_size + i * INDEX_ITEM_SIZE)
+            item = f.read(INDEX_ITEM_SIZE)
+        return (array('q', item)[0] if len(item) == INDEX_ITEM_SIZE else None), indexed_size
+
+    def write(self, index_file):
+        """
+        Writes the sidecar file atomically
+        :param index_file: path of the sidecar file
+        :return: None
+        """
+        temporary_file = index_file + ".tmp"
+        with open(temporary_file, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(array('q', [self.indexed_size, self.first_minute]).tobytes())
+            f.write(self.offsets.tobytes())
+        os.replace(temporary_file, index_file)
+
+
+def build_index(path, time_format=FIXED_TIME_FORMAT):
+    """
+    Builds the sidecar index of an input file, see `MinuteIndex`
+    :param path: path of a time-sorted, uncompressed input file
+    :param time_format: python time format string of the timestamps
+    :return: path of the sidecar file
+    """
+    index_file = index_path(path)
+    MinuteIndex.build(path, time_format).write(index_file)
+    return index_file
+
+
+def search_offset(f, minute, low, high, time_format=FIXED_TIME_FORMAT):
+    """
+    Binary search of the first line of a minute in a time-sorted file, which reads two lines per step
+    :param f: file object of the input, in binary mode
+    :param minute: minute, in microseconds since the epoch
+    :param low: offset of a line that isn't after the searched one
+    :param high: offset past the last line
+    :return: offset of the first line of `minute` or later, `high` if there is none
+    """
+
+    def line_start(position):
+        # first line that starts at `position` or after
+        if position == low:
+            return low
+        f.seek(position - 1)
+        f.readline()
+        return f.tell()
+
+    def is_reached(start):
+        if start >= high:
+            return True
+        f.seek(start)
+        timestamp = line_timestamp(f.readline(), time_format)
+        return timestamp is None or timestamp >= minute
+
+    # first position whose line is reached, past a line that isn't
+    first, last = low, high
+    while first < last:
+        middle = (first + last) // 2
+        if is_reached(line_start(middle)):
+            last = middle
+        else:
+            first = middle + 1
+    return line_start(first)
+
+
+def find_offset(path, minute, time_format=FIXED_TIME_FORMAT):
+    """
+    Looks up the first line of a minute with the sidecar index of the input, see `build_index`, or with a binary
+    search when there is none. Lines appended after the index was built are searched, an index of a larger file, i.e.
+    of another file, is ignored
+    :param path: path of a time-sorted, uncompressed input file
+    :param minute: minute, in microseconds since the epoch
+    :param time_format: python time format string of the timestamps
+    :return: offset of the first line of `minute` or later
+    """
+    size = os.path.getsize(path)
+    low = 0
+    indexed = MinuteIndex.read_offset(index_path(path), minute)
+    if indexed is not None and indexed[1] <= size:
+        offset, indexed_size = indexed
+        if offset is not None:
+            return offset
+        low = indexed_size
+    with open(path, 'rb') as f:
+        return search_offset(f, minute, low, size, time_format)
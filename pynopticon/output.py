@@ -0,0 +1,399 @@
+import csv
+import datetime
+import io
+import json
+from collections import deque
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class OutputError(Exception):
+    pass
+
+
+class MinuteFormatter:
+    """
+    Formats the dates of output minutes. With the default `FAST_FORMAT`, the day is only formatted once per day and the
+    time of day is looked up by its minute number, so consecutive minutes are formatted by incrementing an integer
+    counter instead of calling `strftime` for each one of them
+    """
+    FAST_FORMAT = "%Y-%m-%d %H:%M:00"
+    DAY_FORMAT = "%Y-%m-%d "
+    MINUTES_OF_DAY = ["{0:02d}:{1:02d}:00".format(minute // 60, minute % 60) for minute in range(24 * 60)]
+    MINUTE = datetime.timedelta(minutes=1)
+
+    def __init__(self, time_format):
+        """
+        Minute formatter constructor
+        :param time_format: python time format string of the output dates
+        """
+        self.time_format = time_format
+        self._fast = time_format == self.FAST_FORMAT
+        self._day = None
+        self._day_prefix = None
+
+    def format(self, date):
+        """
+        :param date: `datetime` of the start of a minute
+        :return: formatted `date`
+        """
+        if not self._fast:
+            return date.strftime(self.time_format)
+        day = date.toordinal()
+        if day != self._day:
+            self._day = day
+            self._day_prefix = date.strftime(self.DAY_FORMAT)
+        return self._day_prefix + self.MINUTES_OF_DAY[date.hour * 60 + date.minute]
+
+    def series(self, first_date):
+        """
+        :param first_date: `datetime` of the start of the first minute
+        :return: endless generator of the formatted dates of `first_date` and the minutes that follow it
+        """
+        if not self._fast:
+            date = first_date
+            while True:
+                yield date.strftime(self.time_format)
+                date += self.MINUTE
+        day = first_date.toordinal()
+        minute = first_date.hour * 60 + first_date.minute
+        while True:
+            day_prefix = datetime.date.fromordinal(day).strftime(self.DAY_FORMAT)
+            for time_of_day in self.MINUTES_OF_DAY[minute:]:
+                yield day_prefix + time_of_day
+            day += 1
+            minute = 0
+
+
+class OutputWriter:
+    """
+    Base class for the output stage of the event processors. Processors hand over the aggregation values of each
+    output minute, in the order of `names`, and writers format and write them in large batches
+    """
+    binary = False
+    BUFFER_LINES = 4096
+
+    def __init__(self, file_handler, names, time_format, group_by=None):
+        """
+        Base constructor
+        :param file_handler: file to write to, opened in binary mode if `binary` is set
+        :param names: names of the aggregators
+        :param time_format: python time format string of the output dates
+        :param group_by: names of the grouping fields, if lines are written per group
+        """
+        self.file_handler = file_handler
+        self.names = list(names)
+        self.group_by = list(group_by) if group_by else []
+        self.dates = MinuteFormatter(time_format)
+
+    def write(self, date, values, group=None):
+        """
+        Writes the output of one minute
+        :param date: `datetime` of the minute
+        :param values: aggregation values of the minute
+        :param group: values of the grouping fields, if lines are written per group
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def write_series(self, first_date, rows):
+        """
+        Writes the output of consecutive minutes
+        :param first_date: `datetime` of the first minute
+        :param rows: aggregation values of each minute
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def write_repeated(self, first_date, count, values):
+        """
+        Writes the same aggregation values for consecutive minutes, e.g. minutes without any event in the windows
+        :param first_date: `datetime` of the first minute
+        :param count: number of minutes
+        :param values: aggregation values of every minute
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Writes buffered output, if the format allows it, and flushes the file
+        :return: None
+        """
+        self.file_handler.flush()
+
+    def close(self):
+        """
+        Writes everything that is still buffered. The file itself is left open
+        :return: None
+        """
+        self.flush()
+
+
+class TextOutputWriter(OutputWriter):
+    """
+    Base class for line based text formats. Every line is the formatted date followed by a template, rendered once per
+    group, into which the values are formatted. Lines are buffered and written `BUFFER_LINES` at a time
+    """
+    line_prefix = ""
+    # text of the values that are not finite, by the `repr` of their float
+    non_finite = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+
+    def __init__(self, file_handler, names, time_format, group_by=None):
+        super().__init__(file_handler, names, time_format, group_by=group_by)
+        self._buffer = []
+        self._templates = {}
+
+    def _format_values(self, values):
+        """
+        :param values: aggregation values, python or numpy numbers
+        :return: text of each value, the `repr` of its float, so that numpy numbers are written as plain numbers
+        """
+        non_finite = self.non_finite
+        return [non_finite.get(text, text) for text in map(float.__repr__, map(float, values))]
+
+    def _line_template(self, group):
+        """
+        :param group: values of the grouping fields, `None` when lines are not written per group
+        :return: `str.format` template of the rest of the lines after the date, with one field per aggregator
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def _escape(text):
+        return text.replace("{", "{{").replace("}", "}}")
+
+    def _template(self, group):
+        template = self._templates.get(group)
+        if template is None:
+            template = self._templates[group] = self._line_template(group)
+        return template
+
+    def _append(self, line):
+        self._buffer.append(line)
+        if len(self._buffer) >= self.BUFFER_LINES:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        if len(self._buffer) > 0:
+            self.file_handler.write("".join(self._buffer))
+            self._buffer = []
+
+    def write(self, date, values, group=None):
+        line = self._template(group).format(*self._format_values(values))
+        self._append(self.line_prefix + self.dates.format(date) + line)
+
+    def write_series(self, first_date, rows):
+        template = self._template(None)
+        for date, values in zip(self.dates.series(first_date), rows):
+            self._append(self.line_prefix + date + template.format(*self._format_values(values)))
+
+    def write_repeated(self, first_date, count, values):
+        suffix = self._template(None).format(*self._format_values(values))
+        for date in islice(self.dates.series(first_date), count):
+            self._append(self.line_prefix + date + suffix)
+
+    def flush(self):
+        self._write_buffer()
+        super().flush()
+
+
+class JsonLinesWriter(TextOutputWriter):
+    """
+    One JSON object per line, with the date, the grouping fields and the aggregation values
+    """
+    line_prefix = '{"date": "'
+    non_finite = dict.fromkeys(TextOutputWriter.non_finite, "null")
+
+    def _line_template(self, group):
+        fields = [self._escape(json.dumps(field) + ": " + json.dumps(value))
+                  for field, value in zip(self.group_by, group or ())]
+        fields += [self._escape(json.dumps(name)) + ": {" + str(i) + "}" for i, name in enumerate(self.names)]
+        return '"' + "".join(", " + field for field in fields) + "}}\n"
+
+
+class CsvWriter(TextOutputWriter):
+    """
+    Comma separated values, with a header line of the date, the grouping fields and the aggregator names. Files that
+    are appended to, e.g. when resuming from a checkpoint, already have it
+    """
+
+    def __init__(self, file_handler, names, time_format, group_by=None):
+        super().__init__(file_handler, names, time_format, group_by=group_by)
+        if not (file_handler.seekable() and file_handler.tell() > 0):
+            self._append(self._csv_row(["date"] + self.group_by + self.names) + "\n")
+
+    @staticmethod
+    def _csv_row(values):
+        row = io.StringIO()
+        csv.writer(row, lineterminator="").writerow(values)
+        return row.getvalue()
+
+    def _line_template(self, group):
+        fields = [self._escape(self._csv_row(group))] if group else []
+        fields += ["{" + str(i) + "}" for i in range(len(self.names))]
+        return "".join("," + field for field in fields) + "\n"
+
+
+class NpyWriter(OutputWriter):
+    """
+    NumPy `.npy` file of a structured array, with a `datetime64[m]` date field and one float field per aggregator.
+    The array header needs its final length, so the file is only written when the writer is closed. Requires numpy
+    to be installed, and does not support groups
+    """
+    binary = True
+    EPOCH_DAY = datetime.date(1970, 1, 1).toordinal()
+
+    def __init__(self, file_handler, names, time_format, group_by=None):
+        if np is None:
+            raise OutputError("{0} requires numpy to be installed".format(self.__class__.__name__))
+        if group_by:
+            raise OutputError("{0} does not support groups".format(self.__class__.__name__))
+        super().__init__(file_handler, names, time_format)
+        self._dates = []
+        self._rows = []
+        self._chunks = []
+
+    def _minute_number(self, date):
+        return (date.toordinal() - self.EPOCH_DAY) * 24 * 60 + date.hour * 60 + date.minute
+
+    def _add_chunk(self, dates, rows):
+        self._chunks.append((np.asarray(dates, dtype=np.int64),
+                             np.asarray(rows, dtype=np.float64).reshape(len(dates), len(self.names))))
+
+    def _convert_buffer(self):
+        if len(self._dates) > 0:
+            self._add_chunk(self._dates, self._rows)
+            self._dates = []
+            self._rows = []
+
+    def write(self, date, values, group=None):
+        if group is not None:
+            raise OutputError("{0} does not support groups".format(self.__class__.__name__))
+        self._dates.append(self._minute_number(date))
+        self._rows.append(values)
+        if len(self._dates) >= self.BUFFER_LINES:
+            self._convert_buffer()
+
+    def write_series(self, first_date, rows):
+        self._convert_buffer()
+        rows = list(rows)
+        self._add_chunk(self._minute_number(first_date) + np.arange(len(rows)), rows)
+
+    def write_repeated(self, first_date, count, values):
+        self._convert_buffer()
+        self._add_chunk(self._minute_number(first_date) + np.arange(count), np.tile(values, (count, 1)))
+
+    def flush(self):
+        # nothing can be written before the length of the array is known
+        pass
+
+    def close(self):
+        self._convert_buffer()
+        dates = np.concatenate([dates for dates, _ in self._chunks]) if self._chunks else np.zeros(0, np.int64)
+        output = np.zeros(len(dates), dtype=[("date", "datetime64[m]")] + [(name, np.float64) for name in self.names])
+        output["date"] = dates.astype("datetime64[m]")
+        for i, name in enumerate(self.names):
+            output[name] = np.concatenate([rows[:, i] for _, rows in self._chunks]) if self._chunks else []
+        np.save(self.file_handler, output)
+        self.file_handler.flush()
+
+
+class RecordWriter(OutputWriter):
+    """
+    Keeps the output in memory as `(date, {name: value})` records instead of writing it, for processors run in the
+    same process as their consumer, see `pynopticon.api`. Minutes written by `write_repeated` are kept as one entry and
+    only expanded when they are read, so long gaps don't take memory
+    """
+    MINUTE = datetime.timedelta(minutes=1)
+
+    def __init__(self, names, group_by=None):
+        """
+        Record writer constructor
+        :param names: names of the aggregators, the keys of the records
+        :param group_by: names of the grouping fields, added to the records if lines are written per group
+        """
+        super().__init__(None, names, None, group_by=group_by)
+        # `(first date, count, values, group)` of the minutes that were not read yet
+        self._pending = deque()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def write(self, date, values, group=None):
+        self._pending.append((date, 1, values, group))
+
+    def write_series(self, first_date, rows):
+        for i, values in enumerate(rows):
+            self._pending.append((first_date + self.MINUTE * i, 1, values, None))
+
+    def write_repeated(self, first_date, count, values):
+        self._pending.append((first_date, count, values, None))
+
+    def flush(self):
+        pass
+
+    def records(self):
+        """
+        Reads the records written so far
+        :return: generator of `(date, {name: value})` of each minute, in the order they were written
+        """
+        while len(self._pending) > 0:
+            date, count, values, group = self._pending.popleft()
+            record = dict(zip(self.group_by, group)) if group else {}
+            record.update(zip(self.names, values))
+            yield date, record
+            for i in range(1, count):
+                yield date + self.MINUTE * i, dict(record)
+
+
+class RingBufferWriter(JsonLinesWriter):
+    """
+    Keeps the JSON lines of the last `history` minutes in memory, in a ring buffer, instead of writing them, so they can
+    be served again and again without formatting them again, see `pynopticon.server`
+    """
+    MINUTE = datetime.timedelta(minutes=1)
+
+    def __init__(self, names, time_format, history):
+        """
+        Ring buffer writer constructor
+        :param names: names of the aggregators
+        :param time_format: python time format string of the output dates
+        :param history: number of minutes kept
+        """
+        super().__init__(None, names, time_format)
+        self.lines = deque(maxlen=history)
+
+    def _append(self, line):
+        self.lines.append(line)
+
+    def _write_buffer(self):
+        pass
+
+    def write_repeated(self, first_date, count, values):
+        # minutes that would be pushed out of the ring buffer right away are not even formatted
+        skipped = max(count - self.lines.maxlen, 0)
+        super().write_repeated(first_date + self.MINUTE * skipped, count - skipped, values)
+
+    def flush(self):
+        pass
+
+    def last(self, minutes):
+        """
+        :param minutes: number of minutes
+        :return: list of the JSON lines of the last `minutes` minutes, oldest first
+        """
+        lines = list(islice(reversed(self.lines), max(minutes, 0)))
+        lines.reverse()
+        return lines
+
+
+OUTPUT_WRITERS = {
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+    'npy': NpyWriter,
+}
@@ -0,0 +1,166 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pynopticon.aggregator import ApproximatePercentileAggregator
+from pynopticon.compression import detect_compression
+from pynopticon.event_processor import Event, EventProcessor, EventProcessorError
+from pynopticon.sketch import QuantileSketch
+from pynopticon.util import epoch_microseconds, timestamp_floor
+from pynopticon.window import MinuteBucket, event_value
+
+
+def shard_ranges(path, shards):
+    """
+    Splits a file into byte ranges of about the same size that start and end at line boundaries
+    :param path: path of the file
+    :param shards: number of ranges to split the file into. Small files may get fewer ranges
+    :return: list of `(start, end)` byte offsets, in the order of the file
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        for i in range(1, shards + 1):
+            if start >= size:
+                break
+            end = size * i // shards
+            if end <= start:
+                continue
+            f.seek(end)
+            # the line that contains the split point belongs to this range
+            if end < size:
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def new_partial(minute, bucketed, sketch_accuracies):
+    """
+    :param minute: `datetime` of the minute of the partial
+    :param bucketed: whether the partial is meant for a bucketed store
+    :param sketch_accuracies: relative accuracies of the sketches the bucket keeps, see `aggregate_shard`
+    :return: empty `MinuteBucket` when `bucketed` is set, otherwise empty list of values
+    """
+    if not bucketed:
+        return []
+    bucket = MinuteBucket(epoch_microseconds(minute))
+    if sketch_accuracies:
+        bucket.sketches = {accuracy: QuantileSketch(accuracy) for accuracy in sketch_accuracies}
+    return bucket
+
+
+def aggregate_shard(path, start, end, time_format, store_keys):
+    """
+    Parses the events of a byte range of the input and pre-aggregates them by minute. Runs in the worker processes
+    :param path: path of the input file
+    :param start: offset of the first line of the range
+    :param end: offset past the last line of the range
+    :param time_format: time format of the event timestamps
+    :param store_keys: `(use_word_count, bucketed, word_counts, sketch_accuracies)` of each store the partials are
+    meant for, where `sketch_accuracies` are the relative accuracies of the `QuantileSketch` of the values that are
+    kept in the bucket of each minute, if any
+    :return: list of `(minute, partials)`, one for each minute with events in the range, where `partials` has the
+    partial for each store, see `EventStore.add_partial`
+    """
+    minutes = []
+    current_minute = None
+    partials = None
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            position += len(line)
+            event = Event.parse_from_json(line, time_format)
+            minute = timestamp_floor(event.timestamp)
+            if minute != current_minute:
+                current_minute = minute
+                partials = [new_partial(minute, bucketed, sketch_accuracies)
+                            for _, bucketed, _, sketch_accuracies in store_keys]
+                minutes.append((minute, partials))
+            for partial, (use_word_count, bucketed, word_counts, _) in zip(partials, store_keys):
+                value = event_value(event, use_word_count, word_counts)
+                if bucketed:
+                    partial.add(value)
+                    if partial.sketches is not None:
+                        for sketch in partial.sketches.values():
+                            sketch.add(value)
+                else:
+                    partial.append(value)
+    return minutes
+
+
+class ParallelEventProcessor(EventProcessor):
+    """
+    Event processor that splits the input file into byte ranges, parses and pre-aggregates them by minute in a pool of
+    worker processes, and merges the partials back in the order of the input. Windows live in the main process only,
+    so they cross the boundaries of the ranges as if the input was read sequentially.
+    Bucketed stores receive one `MinuteBucket` per minute and range, which gives the same output as the sequential run
+    as long as values sum up without rounding, e.g. integer durations, along with sketches of its values for
+    approximate percentiles. Other stores receive every value, in the order of the events, so their output is exactly
+    the sequential one, median and percentiles included
+    """
+
+    def __init__(self, ifile, aggregators, ofile=None, workers=2, **kwargs):
+        """
+        Parallel Event Processor constructor
+        :param ifile: input file path. Streams, e.g. stdin, several inputs and compressed files are not supported
+        :param aggregators: list of aggregators to use in the output, see `EventProcessor`
+        :param ofile: output file path, see `EventProcessor`
+        :param workers: number of worker processes
+        :param kwargs: arguments passed to the super constructor, except the ones of live streams
+        """
+        super().__init__(ifile, aggregators, ofile=ofile, **kwargs)
+        if len(self._input_filenames) > 1 or self._input_filenames == [self.STDIN]:
+            raise EventProcessorError("{0} requires a single input file".format(self.__class__.__name__))
+        if detect_compression(self._input_filenames[0]) is not None:
+            raise EventProcessorError("{0} can't split compressed files".format(self.__class__.__name__))
+        self.workers = workers
+
+    def execute(self):
+        """
+        executes the event processing
+        Raises `EventProcessorError` if the instance wasn't initialized as a context manager
+        :return: None
+        """
+        self._check_initialized()
+
+        input_filename, = self._input_filenames
+        ranges = shard_ranges(input_filename, self.workers)
+        store_keys = [(store.use_word_count, store.bucketed, store.word_counts, self._sketch_accuracies(store))
+                      for store in self.stores]
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            shards = [pool.submit(aggregate_shard, input_filename, start, end, self.INPUT_TIME_FORMAT,
+                                  store_keys) for start, end in ranges]
+            # shards are merged in the order of the input, as soon as each one is ready
+            with self._profiling():
+                for shard in shards:
+                    for minute, partials in shard.result():
+                        self._process_partials(minute, partials)
+                self._close_minute()
+
+    @staticmethod
+    def _sketch_accuracies(store):
+        """
+        :return: relative accuracies of the approximate percentiles of a bucketed store, whose buckets need a sketch of
+        their values
+        """
+        if not store.bucketed:
+            return []
+        return sorted({reducer.relative_accuracy for window in store.windows for reducer in window.reducers
+                       if isinstance(reducer, ApproximatePercentileAggregator)})
+
+    def _process_partials(self, minute, partials):
+        if self.stores[0].window_lower_bound is None:
+            for store in self.stores:
+                store.window_lower_bound = minute
+            self._write_minute()
+        else:
+            timespan_minutes = (minute - self.stores[0].window_lower_bound) // self.MINUTE
+            if timespan_minutes > 0:
+                self._advance(timespan_minutes)
+        for store, partial in zip(self.stores, partials):
+            store.add_partial(minute, partial)
+        self._minute_open = True
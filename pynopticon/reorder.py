@@ -0,0 +1,87 @@
+from heapq import heappop, heappush
+from itertools import count
+
+
+class ReorderBuffer:
+    """
+    Bounded reorder stage for events that are not quite in timestamp order, e.g. logs of several producers. Events are
+    held in a heap until the watermark, the latest timestamp seen minus the allowed lateness, passes them, and are then
+    released in timestamp order. An event older than the watermark when it arrives can't be put back in order anymore:
+    it's counted in `late_events` and dropped, instead of going into windows that have moved past it
+    """
+
+    def __init__(self, allowed_lateness):
+        """
+        Reorder Buffer constructor
+        :param allowed_lateness: seconds an event may arrive after a later one, the events of that many seconds are
+        held in the buffer
+        """
+        self.allowed_lateness = allowed_lateness
+        self._lateness_microseconds = round(allowed_lateness * 1000000)
+        # (timestamp, arrival, event), the arrival keeps the order of events with the same timestamp
+        self._heap = []
+        self._arrivals = count()
+        # in microseconds since the epoch, `None` until the first event
+        self.watermark = None
+        self.late_events = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _push(self, event):
+        """
+        :return: `False` if the event is late and was dropped
+        """
+        timestamp = event.timestamp_microseconds
+        watermark = self.watermark
+        if watermark is not None and timestamp < watermark:
+            self.late_events += 1
+            return False
+        heappush(self._heap, (timestamp, next(self._arrivals), event))
+        timestamp -= self._lateness_microseconds
+        if watermark is None or timestamp > watermark:
+            self.watermark = timestamp
+        return True
+
+    def reorder(self, events):
+        """
+        :param events: iterable of events. `None` items, the idle timeouts of `EventProcessor._read_events`, release
+        every event held, see `flush`, and are passed on
+        :return: generator of the events in timestamp order, the ones held are released at the end
+        """
+        heap = self._heap
+        for event in events:
+            if event is None:
+                yield from self.flush()
+                yield None
+            elif self._push(event):
+                watermark = self.watermark
+                while heap and heap[0][0] <= watermark:
+                    yield heappop(heap)[2]
+        yield from self.flush()
+
+    def release(self, events):
+        """
+        :param events: iterable of events
+        :return: list of the events, these ones or ones held before, that the watermark passed, in timestamp order
+        """
+        heap = self._heap
+        released = []
+        for event in events:
+            if self._push(event):
+                watermark = self.watermark
+                while heap and heap[0][0] <= watermark:
+                    released.append(heappop(heap)[2])
+        return released
+
+    def flush(self):
+        """
+        Releases every event held, e.g. at the end of the input. The watermark moves to the latest timestamp seen, so
+        later events are never released before them
+        :return: list of the events in timestamp order
+        """
+        heap = self._heap
+        released = [heappop(heap)[2] for _ in range(len(heap))]
+        if released:
+            self.watermark = max(self.watermark, released[-1].timestamp_microseconds)
+        return released
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import stat
+import sys
+
+import json
+
+from pynopticon.api import is_number, to_event
+from pynopticon.event_processor import Event, EventProcessor
+from pynopticon.output import RingBufferWriter
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+
+class LiveEventProcessor(EventProcessor):
+    """
+    Event processor of events that are handed over as they arrive, see `add_events`, whose minute lines are kept in a
+    `RingBufferWriter` instead of being written to a file. There are no files to open, but it's still used as a context
+    manager
+    """
+
+    def __init__(self, aggregators, history, allowed_lateness=None):
+        """
+        Live Event Processor constructor
+        :param aggregators: list of aggregators, see `EventProcessor`
+        :param history: number of minute lines kept in memory
+        :param allowed_lateness: seconds events may arrive after later ones, see `EventProcessor`
+        """
+        super().__init__([], aggregators, allowed_lateness=allowed_lateness)
+        self._history = history
+        # events dropped by `add_events` for a duration or a word count that isn't a number
+        self.invalid_events = 0
+
+    def __enter__(self):
+        self.input_file_handlers = []
+        self.writer = RingBufferWriter([x.name for x in self.aggregators], self.OUTPUT_TIME_FORMAT, self._history)
+        self._initialized = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def add_events(self, events):
+        """
+        Adds events in their arrival order, or in timestamp order with an allowed lateness, see `ReorderBuffer`.
+        Producers don't wait for each other, so an event may arrive after the minute of its timestamp was closed: it
+        then counts in the open minute, as with `idle_timeout`, which also keeps the windows ordered by minute.
+        Events whose duration or word count isn't a number are dropped, and counted in `invalid_events`, before any
+        event is added, so they can't leave the windows half updated
+        Raises `EventProcessorError` if the instance wasn't initialized as a context manager
+        :param events: list of `Event` objects
+        :return: None
+        """
+        self._check_initialized()
+        valid_events = [event for event in events if is_number(event.duration) and is_number(event.word_count)]
+        if len(valid_events) < len(events):
+            self.invalid_events += len(events) - len(valid_events)
+            events = valid_events
+        if self.reorder_buffer is not None:
+            events = self.reorder_buffer.release(events)
+        self._add_ordered(events)
+
+    def _add_ordered(self, events):
+        store = self.stores[0]
+        for event in events:
+            if store.window_lower_bound is not None and \
+                    event.timestamp_microseconds < store.lower_bound_microseconds:
+                event = Event(store.window_lower_bound, event.duration, event.word_count)
+            self._process_next(event)
+
+    def close_minute(self):
+        """
+        Closes the open minute, when no event arrived for a while, see `_close_minute`. The events held by the reorder
+        buffer are added first
+        :return: None
+        """
+        if self.reorder_buffer is not None:
+            self._add_ordered(self.reorder_buffer.flush())
+        self._close_minute()
+
+    def last(self, minutes):
+        """
+        :param minutes: number of minutes
+        :return: list of the JSON lines of the last `minutes` closed minutes, oldest first, see `RingBufferWriter`
+        """
+        return self.writer.last(minutes)
+
+
+def parse_address(address):
+    """
+    :param address: `HOST:PORT` of a TCP socket, or path of a Unix socket, which has a `/`, e.g. `./pynopticon.sock`
+    :return: `(host, port)` tuple, or path string
+    """
+    if '/' in address:
+        return address
+    host, separator, port = address.rpartition(':')
+    if not separator or not port.isdigit():
+        raise ValueError("{0} is neither HOST:PORT nor the path of a Unix socket".format(address))
+    return host.strip('[]') or None, int(port)
+
+
+class AggregationServer:
+    """
+    asyncio daemon that takes newline-delimited JSON events, the same as the input lines, from any number of concurrent
+    producer connections, and answers queries from the lines of the recent minutes, which are kept in memory, already
+    formatted. A line with a `query` field is a query, answered with one line:
+    - `{"query": "current"}`: JSON object of the last closed minute, `{}` if there is none yet
+    - `{"query": "last", "minutes": N}`: JSON array of the objects of the last N closed minutes, oldest first
+    - `{"query": "late_events"}`: `{"late_events": N}`, the number of events dropped for arriving later than the
+    allowed lateness
+    Lines that aren't valid events nor queries are answered with `{"error": "..."}`, valid events with nothing.
+    Connections only parse their lines; parsed events go through a bounded queue to a single task that applies them to
+    the windows in batches. When the queue is full, connections stop reading, so producers are slowed down by the
+    flow control of their socket instead of memory growing
+    """
+    HISTORY = 1440
+    QUEUE_SIZE = 8192
+    # events are applied, and lines read by each connection, this many at a time before the other tasks get to run,
+    # queries wait for one such step of each task at most
+    BATCH_SIZE = 128
+    READ_BATCH_SIZE = 64
+
+    def __init__(self, aggregators, history=HISTORY, idle_timeout=None, queue_size=QUEUE_SIZE,
+                 time_format=EventProcessor.INPUT_TIME_FORMAT, allowed_lateness=None):
+        """
+        Aggregation Server constructor
+        :param aggregators: list of aggregators, see `EventProcessor`
+        :param history: number of minute lines kept in memory, the most that can be queried
+        :param idle_timeout: if set, the open minute is closed when no event arrives for that many seconds, see
+        `EventProcessor`. Otherwise, a minute is only closed by an event of a later one
+        :param queue_size: number of parsed events waiting to be applied beyond which connections stop reading
+        :param time_format: python time format string of the timestamps of the events
+        :param allowed_lateness: if set, events of the producers are put back in timestamp order when they arrive up to
+        that many seconds after later ones, and dropped when they arrive later, see `ReorderBuffer`
+        """
+        self.processor = LiveEventProcessor(aggregators, history, allowed_lateness=allowed_lateness)
+        self.idle_timeout = idle_timeout
+        self.time_format = time_format
+        self._queue = asyncio.Queue(queue_size)
+        self._server = None
+        self._applier = None
+        self._unix_path = None
+        # task -> stream writer of the open connections
+        self._connections = {}
+
+    async def start(self, address):
+        """
+        Starts listening and applying events
+        :param address: `HOST:PORT` or path of a Unix socket, see `parse_address`. Port 0 picks a free port
+        :return: `asyncio.Server` object, whose `sockets` tell the address it listens on
+        """
+        address = parse_address(address)
+        self.processor.__enter__()
+        if isinstance(address, str):
+            self._unix_path = address
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                # left over by a daemon that was killed
+                os.unlink(address)
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=address)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host=address[0], port=address[1])
+        self._applier = asyncio.create_task(self._apply_events())
+        return self._server
+
+    async def close(self):
+        """
+        Stops listening and closes the open connections, the events that were queued are still applied
+        :return: None
+        """
+        self._server.close()
+        await self._server.wait_closed()
+        for writer in self._connections.values():
+            # the connection then reads the end of its stream, and returns
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self.join()
+        self._applier.cancel()
+        self._remove_unix_socket()
+
+    async def join(self):
+        """
+        Waits until the events that were queued are applied
+        :return: None
+        """
+        await self._queue.join()
+
+    async def serve_forever(self, address):
+        """
+        :param address: see `start`
+        :return: None
+        """
+        server = await self.start(address)
+        for socket in server.sockets:
+            print("listening on {0}".format(socket.getsockname()), file=sys.stderr, flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            self._remove_unix_socket()
+
+    def _remove_unix_socket(self):
+        if self._unix_path is not None and os.path.exists(self._unix_path):
+            os.unlink(self._unix_path)
+
+    def query(self, request):
+        """
+        :param request: decoded query line, see the class documentation
+        :return: answer line
+        """
+        kind = request.get('query')
+        if kind == 'current':
+            lines = self.processor.last(1)
+            return lines[0] if lines else "{}\n"
+        if kind == 'last':
+            minutes = request.get('minutes')
+            if not isinstance(minutes, int) or minutes < 0:
+                return self._error("minutes must be a non negative integer")
+            return "[" + ",".join(line[:-1] for line in self.processor.last(minutes)) + "]\n"
+        if kind == 'late_events':
+            return json.dumps({'late_events': self.processor.late_events}) + "\n"
+        return self._error("unknown query {0}".format(kind))
+
+    @staticmethod
+    def _error(message):
+        return json.dumps({'error': message}) + "\n"
+
+    async def _handle_connection(self, reader, writer):
+        queue = self._queue
+        time_format = self.time_format
+        connection = asyncio.current_task()
+        self._connections[connection] = writer
+        lines_read = 0
+        try:
+            while True:
+                lines_read += 1
+                if lines_read % self.READ_BATCH_SIZE == 0:
+                    # reading lines that are already buffered doesn't give the other tasks a chance to run
+                    await asyncio.sleep(0)
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # a line longer than the limit of the stream, the rest of the connection can't be split in lines
+                    writer.write(self._error("line too long").encode())
+                    break
+                if not line:
+                    break
+                if line.isspace():
+                    continue
+                try:
+                    record = json_loads(line)
+                    if isinstance(record, dict) and 'query' in record:
+                        writer.write(self.query(record).encode())
+                        await writer.drain()
+                        continue
+                    event = to_event(record, time_format)
+                except (ValueError, KeyError, TypeError) as e:
+                    writer.write(self._error("invalid event: {0}".format(e)).encode())
+                    await writer.drain()
+                    continue
+                # waits while the queue is full, nothing more is read from the connection meanwhile
+                await queue.put(event)
+        except ConnectionError:
+            pass
+        finally:
+            del self._connections[connection]
+            writer.close()
+
+    async def _apply_events(self):
+        """
+        Applies the queued events, in batches of the events that are already there, and closes the open minute when
+        the queue stays empty for `idle_timeout` seconds
+        :return: None
+        """
+        queue = self._queue
+        processor = self.processor
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                processor.close_minute()
+                continue
+            batch = [event]
+            while len(batch) < self.BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                processor.add_events(batch)
+            except Exception as e:
+                # the applier must outlive any batch, or the queue fills up and every producer waits for good
+                print("batch of {0} events failed: {1!r}".format(len(batch), e), file=sys.stderr, flush=True)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+            # getting events that are already queued doesn't give the connections a chance to run
+            await asyncio.sleep(0)
+
+
+def serve(aggregators, address, history=AggregationServer.HISTORY, idle_timeout=None, allowed_lateness=None):
+    """
+    Runs an `AggregationServer` until interrupted
+    :param aggregators: list of aggregators, see `EventProcessor`
+    :param address: see `AggregationServer.start`
+    :param history: see `AggregationServer`
+    :param idle_timeout: see `AggregationServer`
+    :param allowed_lateness: see `AggregationServer`
+    :return: None
+    """
+    async def run():
+        await AggregationServer(aggregators, history=history, idle_timeout=idle_timeout,
+                                allowed_lateness=allowed_lateness).serve_forever(address)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,129 @@
+import math
+
+
+class QuantileSketch:
+    """
+    DDSketch-style quantile sketch of non-negative values. Values are counted in logarithmic bins whose width is
+    relative to the values they hold, so any quantile is known within `relative_accuracy` of a value of that rank, and
+    the number of bins only depends on the range of the values, not on how many there are. Sketches with the same
+    accuracy are merged, or subtracted, by adding up, or taking away, the counts of their bins, which gives exactly the
+    sketch of all their values
+    """
+    # values below this one, negative values included, are counted as zero
+    MIN_INDEXABLE_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Quantile sketch constructor
+        :param relative_accuracy: bound of the relative error of the quantiles, between 0 and 1 exclusive
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative accuracy must be between 0 and 1, got {0}".format(relative_accuracy))
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        # index of the bin of zero, below the one of any indexable value
+        self.zero_index = self.index(self.MIN_INDEXABLE_VALUE) - 1
+        # bin index -> number of values
+        self.bins = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def index(self, value):
+        """
+        :param value: value to count
+        :return: index of the bin of `value`, indexes grow with the values
+        """
+        if value < self.MIN_INDEXABLE_VALUE:
+            return self.zero_index
+        return math.ceil(math.log(value) * self._multiplier)
+
+    def bin_value(self, index):
+        """
+        :param index: bin index
+        :return: value that represents the values of the bin, within `relative_accuracy` of any of them
+        """
+        if index == self.zero_index:
+            return 0.0
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value):
+        """
+        :param value: value to count
+        :return: None
+        """
+        self.add_index(self.index(value))
+
+    def add_index(self, index, count=1):
+        """
+        Counts values whose bin is already known, e.g. when the same value is counted by several sketches
+        :param index: bin index returned by `index`
+        :param count: number of values
+        :return: None
+        """
+        self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+
+    def merge(self, other):
+        """
+        Adds the values of another sketch to this one
+        :param other: `QuantileSketch` with the same relative accuracy
+        :return: None
+        """
+        self._check_compatible(other)
+        bins = self.bins
+        for index, count in other.bins.items():
+            bins[index] = bins.get(index, 0) + count
+        self.count += other.count
+
+    def subtract(self, other):
+        """
+        Takes away the values of another sketch that were merged into this one
+        :param other: `QuantileSketch` with the same relative accuracy, whose values are all counted by this one
+        :return: None
+        """
+        self._check_compatible(other)
+        bins = self.bins
+        for index, count in other.bins.items():
+            remaining = bins[index] - count
+            if remaining > 0:
+                bins[index] = remaining
+            else:
+                del bins[index]
+        self.count -= other.count
+
+    def quantile(self, q):
+        """
+        :param q: quantile, between 0 and 1
+        :return: approximate value of rank `q * (count - 1)`, 0.0 if the sketch is empty
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self.bin_value(index)
+        return self.bin_value(max(self.bins))
+
+    def get_state(self):
+        """
+        :return: JSON serializable bins of the sketch, see `set_state`
+        """
+        return [[index, count] for index, count in self.bins.items()]
+
+    def set_state(self, state):
+        """
+        :param state: bins returned by `get_state` of a sketch with the same relative accuracy
+        :return: None
+        """
+        self.bins = {index: count for index, count in state}
+        self.count = sum(self.bins.values())
+
+    def _check_compatible(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("sketches of relative accuracy {0} and {1} can't be combined".format(
+                self.relative_accuracy, other.relative_accuracy))
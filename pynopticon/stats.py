@@ -0,0 +1,189 @@
+import json
+import sys
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb():
+    """
+    :return: peak resident set size of the current process, in MiB, or `None` where it can't be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+class PipelineStats:
+    """
+    Opt-in instrumentation of an event processor. Instead of checks in the hot loop, the stage methods of the
+    processor, its stores, aggregators and writer are wrapped with timers and counters when the processor is entered,
+    so processors without stats run exactly the same code as before.
+    Stages are `parse` for the parsing of input lines, `window_update` for the addition of events to the windows,
+    `window_shift` for the shifts of the windows and the evictions, `aggregate` for the aggregation values and `output`
+    for the output writer
+    """
+    STAGES = ('parse', 'window_update', 'window_shift', 'aggregate', 'output')
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.events_parsed = 0
+        self.events_added = 0
+        self.entries_evicted = 0
+        self.lines_emitted = 0
+        # events dropped by the reorder buffer, see `EventProcessor.late_events`
+        self.late_events = 0
+        # deepest window of each aggregator, in events or minute buckets
+        self.max_window_depth = {}
+        self.wall_seconds = None
+        self.peak_rss_mb = None
+        self._start = None
+        self._active_stages = set()
+
+    def _timed(self, stage, method):
+        seconds = self.seconds
+        active_stages = self._active_stages
+
+        def timed(*args, **kwargs):
+            # wrapped methods may call each other, e.g. `close` calls `flush`, time is only counted once
+            if stage in active_stages:
+                return method(*args, **kwargs)
+            active_stages.add(stage)
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[stage] += perf_counter() - start
+                active_stages.discard(stage)
+        return timed
+
+    def instrument(self, processor):
+        """
+        Wraps the stage methods of an entered processor, and starts the wall clock
+        :param processor: `EventProcessor` object
+        :return: None
+        """
+        self._start = perf_counter()
+        parse_event = processor._parse_event
+
+        def counted_parse(line):
+            self.events_parsed += 1
+            return parse_event(line)
+        processor._parse_event = self._timed('parse', counted_parse)
+
+        writer = processor.writer
+        write, write_series, write_repeated = writer.write, writer.write_series, writer.write_repeated
+
+        def counted_write(date, values, group=None):
+            self.lines_emitted += 1
+            write(date, values, group=group)
+
+        def counted_write_series(first_date, rows):
+            rows = list(rows)
+            self.lines_emitted += len(rows)
+            write_series(first_date, rows)
+
+        def counted_write_repeated(first_date, count, values):
+            self.lines_emitted += count
+            write_repeated(first_date, count, values)
+        writer.write = self._timed('output', counted_write)
+        writer.write_series = self._timed('output', counted_write_series)
+        writer.write_repeated = self._timed('output', counted_write_repeated)
+        writer.flush = self._timed('output', writer.flush)
+        writer.close = self._timed('output', writer.close)
+
+        self.watch(processor.stores, processor.aggregators)
+
+    def watch(self, stores, aggregators):
+        """
+        Wraps the methods of stores and aggregators, e.g. of groups that are created along the way
+        :param stores: list of `EventStore` objects
+        :param aggregators: list of the aggregators attached to the stores
+        :return: None
+        """
+        for store in stores:
+            self._watch_store(store)
+        for aggregator in aggregators:
+            self.max_window_depth.setdefault(aggregator.name, 0)
+            aggregator.aggregate = self._timed('aggregate', aggregator.aggregate)
+
+    def _watch_store(self, store):
+        add_event, add_partial, shift_window = store.add_event, store.add_partial, store.shift_window
+
+        def counted_add_event(event):
+            self.events_added += 1
+            add_event(event)
+
+        def counted_add_partial(timestamp, partial):
+            self.events_added += partial.count if store.bucketed else len(partial)
+            add_partial(timestamp, partial)
+
+        def counted_shift_window():
+            # windows only grow between shifts, so they are at their deepest right before one
+            for window in store.windows:
+                depth = len(window)
+                for reducer in window.reducers:
+                    if depth > self.max_window_depth.get(reducer.name, 0):
+                        self.max_window_depth[reducer.name] = depth
+            entries = len(store)
+            shift_window()
+            self.entries_evicted += entries - len(store)
+        store.add_event = self._timed('window_update', counted_add_event)
+        store.add_partial = self._timed('window_update', counted_add_partial)
+        store.shift_window = self._timed('window_shift', counted_shift_window)
+
+    def finish(self):
+        """
+        Stops the wall clock and measures the peak memory
+        :return: None
+        """
+        if self._start is not None:
+            self.wall_seconds = perf_counter() - self._start
+        self.peak_rss_mb = peak_rss_mb()
+
+    def as_dict(self):
+        return {
+            'wall_seconds': self.wall_seconds,
+            'stage_seconds': dict(self.seconds),
+            'events_parsed': self.events_parsed,
+            'events_added': self.events_added,
+            'entries_evicted': self.entries_evicted,
+            'lines_emitted': self.lines_emitted,
+            'late_events': self.late_events,
+            'max_window_depth': dict(self.max_window_depth),
+            'peak_rss_mb': self.peak_rss_mb,
+        }
+
+    def summary(self):
+        """
+        :return: human readable report
+        """
+        lines = ["wall time: {0:.3f}s".format(self.wall_seconds or 0.0)]
+        for stage in self.STAGES:
+            lines.append("  {0:<14} {1:>10.3f}s".format(stage, self.seconds[stage]))
+        lines.append("events parsed: {0}, added: {1}".format(self.events_parsed, self.events_added))
+        lines.append("entries evicted: {0}".format(self.entries_evicted))
+        lines.append("lines emitted: {0}".format(self.lines_emitted))
+        lines.append("late events dropped: {0}".format(self.late_events))
+        for name, depth in self.max_window_depth.items():
+            lines.append("max window depth of {0}: {1}".format(name, depth))
+        if self.peak_rss_mb is not None:
+            lines.append("peak memory: {0:.1f} MiB".format(self.peak_rss_mb))
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path):
+        """
+        :param path: path of the JSON report, `-` to print a summary to stderr instead
+        :return: None
+        """
+        if path == '-':
+            sys.stderr.write(self.summary())
+        else:
+            with open(path, 'w') as f:
+                json.dump(self.as_dict(), f, indent=2)
+                f.write("\n")
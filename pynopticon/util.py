@@ -1,7 +1,35 @@
 import datetime
 
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+MINUTE_MICROSECONDS = 60 * 1000 * 1000
+
 
 def timestamp_floor(ts):
     return ts - datetime.timedelta(
         seconds=ts.second,
         microseconds=ts.microsecond)
+
+
+def epoch_microseconds(ts):
+    """
+    :param ts: naive `datetime`
+    :return: integer number of microseconds since the epoch, which is exact and cheap to compare and store
+    """
+    return (ts - EPOCH) // MICROSECOND
+
+
+FIXED_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def parse_fixed_timestamp(value):
+    """
+    Fast parser for timestamps in the fixed `YYYY-MM-DD HH:MM:SS.ffffff` layout of `FIXED_TIME_FORMAT`. Once the
+    separators are found in their positions, the fields are sliced by `datetime.fromisoformat`, which runs in C and is
+    much cheaper than `strptime`. Values that don't fit the layout are handed over to `strptime`
+    :param value: timestamp string
+    :return: parsed `datetime` object
+    """
+    if len(value) == 26 and value[4:20:3] == "-- ::.":
+        return datetime.datetime.fromisoformat(value)
+    return datetime.datetime.strptime(value, FIXED_TIME_FORMAT)
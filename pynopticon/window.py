@@ -0,0 +1,372 @@
+import datetime
+from array import array
+from bisect import bisect_left
+
+from pynopticon.util import MINUTE_MICROSECONDS, epoch_microseconds
+
+
+def event_value(event, use_word_count=False, word_counts=False):
+    """
+    Calculates and returns the value that represents the contribution of the `event` in aggregation calculation
+    if `use_word_count` is set to False this simply returns the `event.duration`, otherwise it returns an average
+    that represents how much time it took to translate one word of that event.
+    :param event: `Event` object
+    :param use_word_count: whether `word_count` attribute of the event should be considered
+    :param word_counts: if set to `True` the value is the `word_count` of the event itself, e.g. for words per minute
+    rates, and `use_word_count` is ignored
+    :return: `event`'s contribution to the aggregate value
+    """
+    if word_counts:
+        return event.word_count
+    elif use_word_count:
+        return event.duration if event.word_count == 0 else event.duration / event.word_count
+    else:
+        return event.duration
+
+
+class MinuteBucket:
+    """
+    Pre-aggregated record of all events of one minute, kept by bucketed windows instead of the events themselves
+    """
+    __slots__ = ('timestamp', 'count', 'total', 'minimum', 'maximum', 'sketches')
+
+    def __init__(self, timestamp):
+        """
+        Minute bucket constructor
+        :param timestamp: start of the minute, in microseconds since the epoch
+        """
+        self.timestamp = timestamp
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        # `QuantileSketch` of the values by relative accuracy, only kept by the partials of workers that need them,
+        # see `aggregate_shard`
+        self.sketches = None
+
+    def add(self, value):
+        """
+        Adds the value of an event of this minute to the record
+        :param value: event's contribution to the aggregate value
+        :return: None
+        """
+        self.count += 1
+        self.total += value
+        if self.count == 1 or value < self.minimum:
+            self.minimum = value
+        if self.count == 1 or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        """
+        Adds the events of another record of the same minute to this one
+        :param other: `MinuteBucket` object
+        :return: None
+        """
+        if other.count == 0:
+            return
+        if self.count == 0 or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.count == 0 or other.maximum > self.maximum:
+            self.maximum = other.maximum
+        self.count += other.count
+        self.total += other.total
+
+
+class EventStore:
+    """
+    Events shared by one or more nested `EventWindow` objects of different sizes. The store keeps the events of the
+    largest window once, while each window only keeps a cursor to its oldest event. Values are computed once per event,
+    no matter how many windows and reducers share the store.
+    Events are kept in two typed arrays instead of Python objects: their timestamps, as integer microseconds since the
+    epoch, and their values, as floats, which takes 16 bytes per event. Bucketed stores keep the timestamp of each
+    minute in the same way, next to its `MinuteBucket`. Windows and reducers compare timestamps as integers as well
+    """
+
+    MINUTE = datetime.timedelta(minutes=1)
+    COMPACT_THRESHOLD = 4096
+
+    def __init__(self, use_word_count=False, bucketed=False, word_counts=False):
+        """
+        Event store constructor
+        :param use_word_count: if set to `True` event values are calculated per word
+        :param bucketed: if set to `True` the store keeps one `MinuteBucket` per minute instead of every event, so
+        its memory depends on the window sizes and not on the number of events
+        :param word_counts: if set to `True` event values are their word counts, see `event_value`
+        """
+        self.use_word_count = use_word_count
+        self.word_counts = word_counts
+        self.bucketed = bucketed
+        self.window_lower_bound = None
+        self.windows = []
+        # `timestamps[i]` and `values[i]` are the ones of the event number `offset + i` ever added, cursors of the
+        # windows are in the same numbering. Values are `MinuteBucket` objects when the store is bucketed
+        self.timestamps = array('q')
+        self.values = [] if bucketed else array('d')
+        self.offset = 0
+
+    def __len__(self):
+        return self.offset + len(self.timestamps) - min(window.start for window in self.windows)
+
+    @property
+    def window_lower_bound(self):
+        """
+        :return: `datetime` of the minute of the next output line, also kept in microseconds since the epoch in
+        `lower_bound_microseconds` for integer comparisons
+        """
+        return self._window_lower_bound
+
+    @window_lower_bound.setter
+    def window_lower_bound(self, value):
+        self._window_lower_bound = value
+        self.lower_bound_microseconds = None if value is None else epoch_microseconds(value)
+
+    @property
+    def end(self):
+        """
+        :return: number of events ever added to the store
+        """
+        return self.offset + len(self.timestamps)
+
+    @property
+    def events(self):
+        """
+        :return: list of the `(timestamp, value)` of the events in the store, or of its minute buckets when bucketed
+        """
+        return list(self.values) if self.bucketed else list(zip(self.timestamps, self.values))
+
+    def add_window(self, window):
+        """
+        Adds a window to the store. Windows should be added before any event
+        :param window: `EventWindow` object
+        :return: None
+        """
+        window.start = self.end
+        self.windows.append(window)
+
+    def add_event(self, event):
+        """
+        Adds event to every window of the store
+        :param event: `Event` object
+        :return: None
+        """
+        value = event_value(event, self.use_word_count, self.word_counts)
+        timestamp = event.timestamp_microseconds
+        if self.bucketed:
+            timestamp -= timestamp % MINUTE_MICROSECONDS
+            if len(self.timestamps) == 0 or self.timestamps[-1] != timestamp:
+                self.timestamps.append(timestamp)
+                self.values.append(MinuteBucket(timestamp))
+            self.values[-1].add(value)
+        else:
+            self.timestamps.append(timestamp)
+            self.values.append(value)
+        for window in self.windows:
+            for reducer in window.reducers:
+                reducer.on_add(timestamp, value)
+
+    def add_partial(self, timestamp, partial):
+        """
+        Adds events of one minute that were pre-aggregated elsewhere, e.g. in another process, to every window of the
+        store. Events are only ever evicted by minute, so they can be added with the timestamp of their minute
+        :param timestamp: `datetime` of the start of the minute of the events
+        :param partial: `MinuteBucket` of the events when the store is bucketed, otherwise list of their values in the
+        order of the events
+        :return: None
+        """
+        timestamp = epoch_microseconds(timestamp)
+        if self.bucketed:
+            if len(self.timestamps) > 0 and self.timestamps[-1] == timestamp:
+                self.values[-1].merge(partial)
+            else:
+                bucket = MinuteBucket(timestamp)
+                bucket.merge(partial)
+                self.timestamps.append(timestamp)
+                self.values.append(bucket)
+            for window in self.windows:
+                for reducer in window.reducers:
+                    reducer.on_add_bucket(partial)
+        else:
+            for value in partial:
+                self.timestamps.append(timestamp)
+                self.values.append(value)
+                for window in self.windows:
+                    for reducer in window.reducers:
+                        reducer.on_add(timestamp, value)
+
+    def get_state(self):
+        """
+        :return: JSON serializable state of the store and its windows, see `set_state`
+        """
+        oldest_start = min(window.start for window in self.windows)
+        values = self.values[oldest_start - self.offset:]
+        if self.bucketed:
+            events = [[bucket.timestamp, bucket.count, bucket.total, bucket.minimum, bucket.maximum]
+                      for bucket in values]
+        else:
+            events = [list(event) for event in zip(self.timestamps[oldest_start - self.offset:], values)]
+        return {
+            'window_lower_bound': self.window_lower_bound.isoformat() if self.window_lower_bound else None,
+            'events': events,
+            'windows': {str(window.window_size): window.start - oldest_start for window in self.windows},
+        }
+
+    def set_state(self, state):
+        """
+        Restores the state of the store and its windows, without calling their reducers, which are restored on their own
+        :param state: state returned by `get_state` of a store with windows of the same sizes
+        :return: None
+        """
+        bound = state['window_lower_bound']
+        self.window_lower_bound = datetime.datetime.fromisoformat(bound) if bound else None
+        self.timestamps = array('q', (event[0] for event in state['events']))
+        if self.bucketed:
+            self.values = []
+            for timestamp, count, total, minimum, maximum in state['events']:
+                bucket = MinuteBucket(timestamp)
+                bucket.count, bucket.total, bucket.minimum, bucket.maximum = count, total, minimum, maximum
+                self.values.append(bucket)
+        else:
+            self.values = array('d', (event[1] for event in state['events']))
+        self.offset = 0
+        for window in self.windows:
+            window.start = state['windows'][str(window.window_size)]
+
+    def shift_window(self):
+        """
+        shifts the time windows by 1 unit, evicting the events that fall out of each one of them.
+        :return: None
+        """
+        self.window_lower_bound += self.MINUTE
+        for window in self.windows:
+            window.evict_older_than(self.lower_bound_microseconds - window.span_microseconds)
+        oldest_start = min(window.start for window in self.windows)
+        evicted = oldest_start - self.offset
+        if evicted > max(self.COMPACT_THRESHOLD, len(self.timestamps) // 2) or oldest_start == self.end:
+            del self.timestamps[:evicted]
+            del self.values[:evicted]
+            self.offset = oldest_start
+
+
+class EventWindow:
+    """
+    Moving time window over the events of an `EventStore`. Reducers, i.e. moving aggregators, plug into the window and
+    keep their aggregation state up to date from its callbacks: `on_add(timestamp, value)` for every added event and
+    `on_evict(timestamp, count, total)` for every evicted event or bucket, with timestamps in microseconds since the
+    epoch
+    """
+
+    def __init__(self, window_size, use_word_count=False, bucketed=False, store=None, word_counts=False):
+        """
+        Event window constructor
+        :param window_size: size of the window, in minutes
+        :param use_word_count: if set to `True` event values are calculated per word. Ignored if `store` is set
+        :param bucketed: if set to `True` the window keeps one record per minute instead of every event, see
+        `EventStore`. Ignored if `store` is set
+        :param store: `EventStore` to share with other windows. If not set the window gets a store of its own
+        :param word_counts: if set to `True` event values are their word counts. Ignored if `store` is set
+        """
+        self.window_size = window_size
+        self.span_microseconds = window_size * MINUTE_MICROSECONDS
+        self.reducers = []
+        self.start = 0
+        self.store = store if store is not None else EventStore(use_word_count=use_word_count, bucketed=bucketed,
+                                                                word_counts=word_counts)
+        self.store.add_window(self)
+
+    def __len__(self):
+        return self.store.end - self.start
+
+    @property
+    def use_word_count(self):
+        return self.store.use_word_count
+
+    @property
+    def bucketed(self):
+        return self.store.bucketed
+
+    @property
+    def window_lower_bound(self):
+        return self.store.window_lower_bound
+
+    @window_lower_bound.setter
+    def window_lower_bound(self, value):
+        self.store.window_lower_bound = value
+
+    @property
+    def events(self):
+        """
+        :return: `(timestamp, value)` of the events in the window, or its minute buckets, see `EventStore.events`
+        """
+        return self.store.events[self.start - self.store.offset:]
+
+    def add_reducer(self, reducer):
+        """
+        Plugs a reducer into the window. Reducers should be added before any event
+        :param reducer: object with `on_add` and `on_evict` callbacks
+        :return: None
+        """
+        self.reducers.append(reducer)
+
+    def add_event(self, event):
+        """
+        Adds event to the window, and every other window of its store
+        :param event: `Event` object
+        :return: None
+        """
+        self.store.add_event(event)
+
+    def shift_window(self):
+        """
+        shifts the time window, and every other window of its store, by 1 unit.
+        :return: None
+        """
+        self.store.shift_window()
+
+    def evict_older_than(self, oldest_kept):
+        """
+        Evicts the events of the window that are older than `oldest_kept`
+        :param oldest_kept: timestamp of the oldest event that stays in the window, in microseconds since the epoch
+        :return: None
+        """
+        timestamps = self.store.timestamps
+        values = self.store.values
+        offset = self.store.offset
+        end = self.store.end
+        start = self.start
+        if self.store.bucketed:
+            while start < end and timestamps[start - offset] < oldest_kept:
+                bucket = values[start - offset]
+                for reducer in self.reducers:
+                    reducer.on_evict(bucket.timestamp, bucket.count, bucket.total)
+                start += 1
+        else:
+            # the boundary is found by binary search in the array, only the evicted events are read
+            stop = bisect_left(timestamps, oldest_kept, start - offset, end - offset)
+            for reducer in self.reducers:
+                for timestamp, value in zip(timestamps[start - offset:stop], values[start - offset:stop]):
+                    reducer.on_evict(timestamp, 1, value)
+            start = stop + offset
+        self.start = start
+
+
+def share_windows(aggregators):
+    """
+    Plugs aggregators that were configured with the same window into a single `EventWindow`, and windows with the same
+    event values but different sizes into a single `EventStore`, so each event is stored, valued and evicted once
+    instead of once per aggregator. Aggregators must not have any event yet
+    :param aggregators: list of moving aggregators
+    :return: list of the shared stores
+    """
+    stores = {}
+    windows = {}
+    for agg in aggregators:
+        store_key = (agg.use_word_count, agg.bucketed, agg.word_counts)
+        if store_key not in stores:
+            stores[store_key] = EventStore(use_word_count=agg.use_word_count, bucketed=agg.bucketed,
+                                           word_counts=agg.word_counts)
+        window_key = (agg.window_size,) + store_key
+        if window_key not in windows:
+            windows[window_key] = EventWindow(agg.window_size, store=stores[store_key])
+        agg.attach(windows[window_key])
+    return list(stores.values())
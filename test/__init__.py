@@ -1,7 +1,47 @@
+from test.api_tests import ApiTestCase
+from test.batch_tests import BatchEventProcessorTestCase
+from test.benchmark_tests import BenchmarkTestCase
+from test.compression_tests import CompressedInputTestCase
 from test.event_processor_tests import (EventProcessorAverageTestCase, EventProcessorMedianTestCase,
-                                        EventProcessorMinTestCase, EventProcessorMaxTestCase)
+                                        EventProcessorMinTestCase, EventProcessorMaxTestCase,
+                                        EventProcessorPercentileTestCase, EventProcessorBucketedTestCase,
+                                        EventProcessorLongGapTestCase, EventProcessorLiveInputTestCase,
+                                        EventProcessorMergedInputsTestCase, EventProcessorCheckpointTestCase)
+from test.grouping_tests import GroupedEventProcessorTestCase
+from test.index_tests import MinuteIndexTestCase
+from test.output_tests import OutputWriterTestCase
+from test.parallel_tests import ParallelEventProcessorTestCase
+from test.parsing_tests import EventParsingTestCase
+from test.reorder_tests import ReorderBufferTestCase
+from test.server_tests import AggregationServerTestCase
+from test.sketch_tests import QuantileSketchTestCase, ApproximatePercentileAggregatorTestCase
+from test.statistics_tests import MovingStatisticsTestCase
+from test.stats_tests import PipelineStatsTestCase
+from test.window_tests import EventWindowTestCase
 
 __all__ = [EventProcessorAverageTestCase,
            EventProcessorMedianTestCase,
            EventProcessorMinTestCase,
-           EventProcessorMaxTestCase]
+           EventProcessorMaxTestCase,
+           EventProcessorPercentileTestCase,
+           EventProcessorBucketedTestCase,
+           EventProcessorLongGapTestCase,
+           EventProcessorLiveInputTestCase,
+           EventProcessorMergedInputsTestCase,
+           EventProcessorCheckpointTestCase,
+           ApiTestCase,
+           BatchEventProcessorTestCase,
+           BenchmarkTestCase,
+           CompressedInputTestCase,
+           GroupedEventProcessorTestCase,
+           MinuteIndexTestCase,
+           ParallelEventProcessorTestCase,
+           EventParsingTestCase,
+           OutputWriterTestCase,
+           PipelineStatsTestCase,
+           QuantileSketchTestCase,
+           ApproximatePercentileAggregatorTestCase,
+           AggregationServerTestCase,
+           ReorderBufferTestCase,
+           MovingStatisticsTestCase,
+           EventWindowTestCase]
@@ -0,0 +1,138 @@
+import datetime
+import json
+import os
+import shutil
+import unittest
+
+from parameterized import parameterized
+
+from pynopticon.aggregator import AggregatorRegistry, MovingAggregator
+from pynopticon.api import aggregate, aggregate_columns, create_aggregators
+from pynopticon.batch import np
+from pynopticon.event_processor import EventProcessor
+from pynopticon.util import epoch_microseconds, parse_fixed_timestamp
+
+
+class CountAggregator(MovingAggregator):
+    """
+    Number of events in the window, as a custom aggregator
+    """
+    name = "count"
+
+    def __init__(self, window_size, scale=1, **kwargs):
+        super().__init__(window_size, **kwargs)
+        self.count = 0
+        self.scale = scale
+
+    def aggregate(self):
+        return float(self.count * self.scale)
+
+    def on_add(self, timestamp, value):
+        self.count += 1
+
+    def on_evict(self, timestamp, count, total):
+        self.count -= count
+
+
+class ApiTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    AGGREGATORS = ['average', 'median', 'max', 'p90', 'approx_p50']
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _input(self, input_file):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        with open(input_file_path, 'r') as f:
+            return input_file_path, [json.loads(line) for line in f]
+
+    def _file_output(self, input_file_path, aggregators):
+        output_file_path = os.path.join(self.RESULT_DIR, "output.json")
+        with EventProcessor(input_file_path, aggregators, output_file_path) as e:
+            e.execute()
+        with open(output_file_path, 'r') as f:
+            lines = [json.loads(line) for line in f]
+        return [(datetime.datetime.strptime(line.pop('date'), EventProcessor.OUTPUT_TIME_FORMAT), line)
+                for line in lines]
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', [10], False),
+        ('empty_input', 'empty.json', [3], False),
+        ('dense_events_word_count', 'dense_events.json', [1, 3], True),
+        ('long_gap', 'long_gap.json', [2], False)
+    ])
+    def test_matches_file_output(self, name, input_file, window_sizes, use_word_count):
+        input_file_path, events = self._input(input_file)
+        expected = self._file_output(input_file_path, create_aggregators(self.AGGREGATORS, window_sizes,
+                                                                         use_word_count=use_word_count))
+
+        records = list(aggregate(events, self.AGGREGATORS, window_size=window_sizes, use_word_count=use_word_count))
+        self.assertEqual(expected, records)
+
+    def test_tuples_and_columns(self):
+        _, events = self._input('input1.json')
+        timestamps = [parse_fixed_timestamp(e['timestamp']) for e in events]
+        durations = [e['duration'] for e in events]
+        word_counts = [e['nr_words'] for e in events]
+        expected = list(aggregate(events, ['average', 'min'], window_size=5, use_word_count=True))
+
+        tuples = [(epoch_microseconds(t), d, w) for t, d, w in zip(timestamps, durations, word_counts)]
+        self.assertEqual(expected, list(aggregate(tuples, ['average', 'min'], window_size=5, use_word_count=True)))
+        self.assertEqual(expected, list(aggregate_columns(timestamps, durations, word_counts,
+                                                          aggregators=['average', 'min'], window_size=5,
+                                                          use_word_count=True)))
+        if np is not None:
+            self.assertEqual(expected, list(aggregate_columns(np.array(timestamps, dtype='datetime64[us]'),
+                                                              np.array(durations), np.array(word_counts),
+                                                              aggregators=['average', 'min'], window_size=5,
+                                                              use_word_count=True)))
+
+    def test_records_are_lazy(self):
+        _, events = self._input('input1.json')
+        consumed = []
+
+        def event_source():
+            for event in events:
+                consumed.append(event)
+                yield event
+
+        records = aggregate(event_source(), ['average'])
+        minute, values = next(records)
+        self.assertEqual(datetime.datetime(2018, 12, 26, 18, 11), minute)
+        self.assertEqual({'average_delivery_time': 0.0}, values)
+        self.assertEqual(1, len(consumed))
+        # the second minute is only closed by the event of a later minute
+        next(records)
+        self.assertEqual(2, len(consumed))
+
+    def test_custom_aggregators(self):
+        registry = AggregatorRegistry()
+        registry.register('count', CountAggregator, options=('scale',))
+        registry.register('count_x<scale>', lambda scale, window_size, **kwargs: CountAggregator(window_size, scale,
+                                                                                                  **kwargs),
+                          pattern=r"count_x(\d+)", parameters=lambda scale: (int(scale),))
+
+        @registry.register('double_count')
+        class DoubleCountAggregator(CountAggregator):
+            name = "double_count"
+
+            def aggregate(self):
+                return 2.0 * self.count
+
+        counter = registry.create('count', 2, scale=3, relative_accuracy=0.1)
+        self.assertEqual(3, counter.scale)
+        self.assertEqual(5, registry.create('count_x5', 2).scale)
+        self.assertIsInstance(registry.create('double_count', 2), DoubleCountAggregator)
+        with self.assertRaises(ValueError):
+            registry.create('sum', 2)
+
+        _, events = self._input('dense_events.json')
+        records = list(aggregate(events, [counter, registry.create('double_count', 2)]))
+        self.assertEqual({'count': 3.0 * len(events), 'double_count': 2.0 * len(events)}, records[-1][1])
@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import unittest
+
+from parameterized import parameterized
+
+from pynopticon.aggregator import AverageAggregator, MedianAggregator, MinAggregator, MaxAggregator
+from pynopticon.batch import BatchEventProcessor, np
+from pynopticon.event_processor import EventProcessor
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class BatchEventProcessorTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    @staticmethod
+    def _aggregators(window_size, use_word_count):
+        return [AverageAggregator(window_size, use_word_count=use_word_count),
+                MedianAggregator(window_size, use_word_count=use_word_count),
+                MinAggregator(window_size, use_word_count=use_word_count),
+                MaxAggregator(window_size, use_word_count=use_word_count)]
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', 10, False),
+        ('empty_input', 'empty.json', 11, False),
+        ('sparse_events', 'input1.json', 1, False),
+        ('dense_events', 'dense_events.json', 3, False),
+        ('dense_events_word_count', 'dense_events.json', 3, True),
+        ('long_gap', 'long_gap.json', 2, False)
+    ])
+    def test_matches_stream_engine(self, name, input_file, window_size, use_word_count):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        stream_output_path = os.path.join(self.RESULT_DIR, "stream.json")
+        batch_output_path = os.path.join(self.RESULT_DIR, "batch.json")
+        with EventProcessor(input_file_path, self._aggregators(window_size, use_word_count), stream_output_path) as e:
+            e.execute()
+        with BatchEventProcessor(input_file_path, self._aggregators(window_size, use_word_count),
+                                 batch_output_path) as e:
+            e.execute()
+
+        with open(stream_output_path, 'r') as stream_file, open(batch_output_path, 'r') as batch_file:
+            self.assertListEqual([json.loads(line) for line in stream_file], [json.loads(line) for line in batch_file])
@@ -0,0 +1,61 @@
+import json
+import os
+import queue
+import tempfile
+import unittest
+
+from benchmarks.generator import EventGenerator
+from benchmarks.run import DEFAULT_AGGREGATORS, compare, measure, run_scenario
+from pynopticon.event_processor import Event, EventProcessor
+
+
+class BenchmarkTestCase(unittest.TestCase):
+
+    def test_generator_is_reproducible(self):
+        self.assertListEqual(list(EventGenerator(seed=3).events(100)), list(EventGenerator(seed=3).events(100)))
+        self.assertNotEqual(list(EventGenerator(seed=3).events(100)), list(EventGenerator(seed=4).events(100)))
+
+    def test_generated_events_are_valid_input(self):
+        generator = EventGenerator(seed=1, idle_probability=0.1, max_idle_minutes=30, clients=3)
+        events = [Event.parse_from_json(json.dumps(e), EventProcessor.INPUT_TIME_FORMAT, group_by=['client_name'])
+                  for e in generator.events(1000)]
+
+        self.assertTrue(all(a.timestamp <= b.timestamp for a, b in zip(events, events[1:])))
+        self.assertTrue(all(e.duration >= 1 and e.word_count >= 0 for e in events))
+        self.assertLessEqual(len({e.group for e in events}), 3)
+        # idle gaps leave minutes without any event
+        gaps = [(b.timestamp - a.timestamp).total_seconds() for a, b in zip(events, events[1:])]
+        self.assertGreater(max(gaps), 60)
+
+    def test_compare_reports_regressions(self):
+        baselines = {"average-w1": {"events_per_second": 1000, "minutes_per_second": 10, "peak_rss_mb": 30.0},
+                     "median-w1": {"events_per_second": 1000, "minutes_per_second": 10, "peak_rss_mb": 30.0}}
+        results = {"average-w1": {"events_per_second": 900, "minutes_per_second": 9, "peak_rss_mb": 31.0},
+                   "median-w1": {"events_per_second": 700, "minutes_per_second": 7, "peak_rss_mb": 40.0},
+                   "max-w1": {"events_per_second": 1, "minutes_per_second": 1, "peak_rss_mb": 1000.0}}
+
+        regressions = compare(results, baselines, 0.25)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(all(regression.startswith("median-w1") for regression in regressions))
+
+    def test_run_scenario(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "events.json")
+            with open(input_file, 'w') as f:
+                EventGenerator(seed=0).write(f, 200)
+            results = queue.Queue()
+            for aggregator in DEFAULT_AGGREGATORS:
+                run_scenario(input_file, aggregator, 10, True, results)
+                seconds, rss = results.get_nowait()
+                self.assertGreater(seconds, 0)
+                self.assertGreater(rss, 0)
+
+    def test_default_aggregators_are_registered(self):
+        self.assertIn('variance', DEFAULT_AGGREGATORS)
+        self.assertIn('words_per_minute', DEFAULT_AGGREGATORS)
+        self.assertIn('approx_p99', DEFAULT_AGGREGATORS)
+
+    def test_failed_scenario_is_reported(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaisesRegex(RuntimeError, "FileNotFoundError"):
+                measure(os.path.join(tmp_dir, "missing.json"), 'average', 1, False, 1)
@@ -0,0 +1,91 @@
+import gzip
+import io
+import os
+import shutil
+import sys
+import unittest
+from unittest import mock
+
+from parameterized import parameterized
+
+from pynopticon.aggregator import AverageAggregator, MaxAggregator
+from pynopticon.arguments import parse_args
+from pynopticon.compression import GZIP, ZSTD, PipelinedReader, detect_compression, open_input, zstandard
+from pynopticon.event_processor import EventProcessor
+
+
+class CompressedInputTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    INPUT_FILE = os.path.join(os.getcwd(), "test", "test_inputs", "input1.json")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+        with open(self.INPUT_FILE, 'rb') as f:
+            self.content = f.read()
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _process(self, input_file_path):
+        output_file_path = os.path.join(self.RESULT_DIR, "output.json")
+        with EventProcessor(input_file_path, [AverageAggregator(10), MaxAggregator(10)], output_file_path) as e:
+            e.execute()
+        with open(output_file_path, 'r') as f:
+            return f.read()
+
+    def test_gzip_matches_uncompressed(self):
+        compressed_path = os.path.join(self.RESULT_DIR, "input1.log")
+        with open(compressed_path, 'wb') as f:
+            # two members, like files appended to by several runs of gzip
+            f.write(gzip.compress(self.content[:100]) + gzip.compress(self.content[100:]))
+
+        self.assertEqual(GZIP, detect_compression(compressed_path))
+        self.assertIsNone(detect_compression(self.INPUT_FILE))
+        self.assertEqual(self._process(self.INPUT_FILE), self._process(compressed_path))
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_matches_uncompressed(self):
+        compressed_path = os.path.join(self.RESULT_DIR, "input1.json.zst")
+        compressor = zstandard.ZstdCompressor()
+        with open(compressed_path, 'wb') as f:
+            f.write(compressor.compress(self.content[:100]) + compressor.compress(self.content[100:]))
+
+        self.assertEqual(ZSTD, detect_compression(compressed_path))
+        self.assertEqual(self._process(self.INPUT_FILE), self._process(compressed_path))
+
+    def test_pipelined_reader_keeps_lines_whole(self):
+        lines = ["line {0}\n".format(i) for i in range(1000)]
+        reader = PipelinedReader(io.StringIO("".join(lines)))
+        reader.BATCH_SIZE = 64
+
+        self.assertListEqual(lines, list(reader))
+
+    def test_pipelined_reader_raises_read_errors(self):
+        corrupt_path = os.path.join(self.RESULT_DIR, "corrupt.json.gz")
+        with open(corrupt_path, 'wb') as f:
+            f.write(gzip.compress(self.content)[:-10])
+
+        reader = open_input(corrupt_path)
+        with self.assertRaises(EOFError):
+            list(reader)
+        reader.close()
+
+    @parameterized.expand([
+        ('workers', ['--workers', '2'], "--workers can't split"),
+        ('start', ['--start', '2018-12-26 18:12'], "--start can't be read"),
+        ('checkpoint', ['--checkpoint', 'checkpoint.json', '--output_file', 'output.json'], "--checkpoint can't resume")
+    ])
+    def test_unsupported_options_are_rejected(self, name, options, message):
+        compressed_path = os.path.join(self.RESULT_DIR, "input1.json.gz")
+        with open(compressed_path, 'wb') as f:
+            f.write(gzip.compress(self.content))
+
+        stderr = io.StringIO()
+        with mock.patch.object(sys, 'argv', ['pynopticon', '--input_file', compressed_path] + options), \
+                mock.patch.object(sys, 'stderr', stderr), self.assertRaises(SystemExit):
+            parse_args()
+        self.assertIn(message, stderr.getvalue())
@@ -1,12 +1,19 @@
 import json
 import os
 import shutil
+import sys
+import threading
+import time
 import unittest
+from unittest import mock
 
 from parameterized import parameterized
 
-from pynopticon.aggregator import AverageAggregator, MedianAggregator, MinAggregator, MaxAggregator
+from pynopticon.aggregator import (AverageAggregator, MedianAggregator, MinAggregator, MaxAggregator,
+                                   PercentileAggregator, VarianceAggregator, ExponentialAverageAggregator,
+                                   WordRateAggregator, ApproximateMedianAggregator, MovingAggregator)
 from pynopticon.entry_point import EventProcessor
+from pynopticon.event_processor import EventProcessorError
 
 
 class EventProcessorAverageTestCase(unittest.TestCase):
@@ -263,3 +270,369 @@ class EventProcessorMaxTestCase(unittest.TestCase):
             for index, line in enumerate(result_file):
                 parsed_actual = json.loads(line)
                 self.assertDictEqual(parsed_expected[index], parsed_actual)
+
+
+class EventProcessorPercentileTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    EXPECTED_CHALLENGE_EXAMPLE = """{"date": "2018-12-26 18:11:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:12:00", "p90_delivery_time": 20.0}
+{"date": "2018-12-26 18:13:00", "p90_delivery_time": 20.0}
+{"date": "2018-12-26 18:14:00", "p90_delivery_time": 20.0}
+{"date": "2018-12-26 18:15:00", "p90_delivery_time": 20.0}
+{"date": "2018-12-26 18:16:00", "p90_delivery_time": 29.9}
+{"date": "2018-12-26 18:17:00", "p90_delivery_time": 29.9}
+{"date": "2018-12-26 18:18:00", "p90_delivery_time": 29.9}
+{"date": "2018-12-26 18:19:00", "p90_delivery_time": 29.9}
+{"date": "2018-12-26 18:20:00", "p90_delivery_time": 29.9}
+{"date": "2018-12-26 18:21:00", "p90_delivery_time": 29.9}
+{"date": "2018-12-26 18:22:00", "p90_delivery_time": 31.0}
+{"date": "2018-12-26 18:23:00", "p90_delivery_time": 31.0}
+{"date": "2018-12-26 18:24:00", "p90_delivery_time": 51.7}"""
+    EXPECTED_EMPTY_INPUT = ""
+    EXPECTED_SPARSE_EVENTS = """{"date": "2018-12-26 18:11:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:12:00", "p90_delivery_time": 20.0}
+{"date": "2018-12-26 18:13:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:14:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:15:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:16:00", "p90_delivery_time": 31.0}
+{"date": "2018-12-26 18:17:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:18:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:19:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:20:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:21:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:22:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:23:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:24:00", "p90_delivery_time": 54.0}"""
+    EXPECTED_DENSE_EVENTS = """{"date": "2018-12-26 18:11:00", "p90_delivery_time": 0.0}
+{"date": "2018-12-26 18:12:00", "p90_delivery_time": 76.8}"""
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', 'output1.json', 10, EXPECTED_CHALLENGE_EXAMPLE),
+        ('empty_input', 'empty.json', 'empty_output.json', 11, EXPECTED_EMPTY_INPUT),
+        ('sparse_events', 'input1.json', 'sparse.json', 1, EXPECTED_SPARSE_EVENTS),
+        ('dense_events', 'dense_events.json', 'dense.json', 3, EXPECTED_DENSE_EVENTS)
+    ])
+    def test_parameterized(self, name, input_file, output_file, window_size, expected_output):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        output_file_path = os.path.join(os.getcwd(), self.RESULT_DIR, output_file)
+        aggregators = [PercentileAggregator(90, window_size)]
+        with EventProcessor(input_file_path, aggregators, output_file_path) as e:
+            e.execute()
+
+        parsed_expected = [json.loads(line) for line in expected_output.split("\n") if expected_output != ""]
+        with open(output_file_path, 'r') as result_file:
+            for index, line in enumerate(result_file):
+                parsed_actual = json.loads(line)
+                self.assertDictEqual(parsed_expected[index], parsed_actual)
+
+
+class EventProcessorBucketedTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    @staticmethod
+    def _aggregators(window_size, bucketed):
+        return [AverageAggregator(window_size, bucketed=bucketed),
+                MinAggregator(window_size, bucketed=bucketed),
+                MaxAggregator(window_size, bucketed=bucketed)]
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', 10),
+        ('empty_input', 'empty.json', 11),
+        ('sparse_events', 'input1.json', 1),
+        ('dense_events', 'dense_events.json', 3)
+    ])
+    def test_matches_event_window(self, name, input_file, window_size):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        events_output_path = os.path.join(self.RESULT_DIR, "events.json")
+        buckets_output_path = os.path.join(self.RESULT_DIR, "buckets.json")
+        with EventProcessor(input_file_path, self._aggregators(window_size, False), events_output_path) as e:
+            e.execute()
+        with EventProcessor(input_file_path, self._aggregators(window_size, True), buckets_output_path) as e:
+            e.execute()
+
+        with open(events_output_path, 'r') as events_file, open(buckets_output_path, 'r') as buckets_file:
+            self.assertListEqual([json.loads(line) for line in events_file],
+                                 [json.loads(line) for line in buckets_file])
+
+    def test_median_is_not_bucketed(self):
+        with self.assertRaises(ValueError):
+            MedianAggregator(10, bucketed=True)
+
+
+class EventProcessorLongGapTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def test_gap_longer_than_a_day(self):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", "long_gap.json")
+        output_file_path = os.path.join(self.RESULT_DIR, "long_gap.json")
+        with EventProcessor(input_file_path, [AverageAggregator(2), MaxAggregator(2)], output_file_path) as e:
+            e.execute()
+
+        with open(output_file_path, 'r') as result_file:
+            parsed_actual = [json.loads(line) for line in result_file]
+        self.assertEqual(2 * 24 * 60 + 3, len(parsed_actual))
+        self.assertDictEqual({"date": "2018-12-26 18:13:00", "average_delivery_time": 20.0,
+                              "maximum_delivery_time": 20.0}, parsed_actual[2])
+        self.assertDictEqual({"date": "2018-12-26 18:14:00", "average_delivery_time": 0.0,
+                              "maximum_delivery_time": 0.0}, parsed_actual[3])
+        self.assertDictEqual({"date": "2018-12-28 18:12:00", "average_delivery_time": 0.0,
+                              "maximum_delivery_time": 0.0}, parsed_actual[-2])
+        self.assertDictEqual({"date": "2018-12-28 18:13:00", "average_delivery_time": 31.0,
+                              "maximum_delivery_time": 31.0}, parsed_actual[-1])
+
+
+class EventProcessorLiveInputTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    INPUT_LINES = [
+        '{"timestamp": "2018-12-26 18:11:08.509654", "nr_words": 30, "duration": 20}\n',
+        '{"timestamp": "2018-12-26 18:13:19.903159", "nr_words": 30, "duration": 31}\n',
+    ]
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _read_output(self, output_file_path):
+        with open(output_file_path, 'r') as result_file:
+            return [json.loads(line) for line in result_file]
+
+    @unittest.skipUnless(os.path.isdir("/dev/fd"), "pipes can't be opened by path")
+    def test_idle_timeout_closes_minute(self):
+        output_file_path = os.path.join(self.RESULT_DIR, "live.json")
+        read_fd, write_fd = os.pipe()
+        processor = EventProcessor("/dev/fd/{0}".format(read_fd), [AverageAggregator(2)], output_file_path,
+                                   idle_timeout=0.05)
+        worker = threading.Thread(target=lambda: processor.__enter__().execute())
+        with os.fdopen(write_fd, 'w') as writer:
+            writer.write(self.INPUT_LINES[0])
+            writer.flush()
+            worker.start()
+            time.sleep(0.5)
+            self.assertListEqual([{"date": "2018-12-26 18:11:00", "average_delivery_time": 0.0},
+                                  {"date": "2018-12-26 18:12:00", "average_delivery_time": 20.0}],
+                                 self._read_output(output_file_path))
+            writer.write(self.INPUT_LINES[1])
+        worker.join(5)
+        processor.__exit__(None, None, None)
+        os.close(read_fd)
+
+        self.assertListEqual([{"date": "2018-12-26 18:11:00", "average_delivery_time": 0.0},
+                              {"date": "2018-12-26 18:12:00", "average_delivery_time": 20.0},
+                              {"date": "2018-12-26 18:13:00", "average_delivery_time": 20.0},
+                              {"date": "2018-12-26 18:14:00", "average_delivery_time": 31.0}],
+                             self._read_output(output_file_path))
+
+    @staticmethod
+    def _execute_until_closed(processor):
+        # a followed input never ends, the processor is stopped by closing it
+        try:
+            processor.execute()
+        except ValueError:
+            pass
+
+    def test_follow_rebuilds_partial_lines(self):
+        input_file_path = os.path.join(self.RESULT_DIR, "followed.json")
+        output_file_path = os.path.join(self.RESULT_DIR, "live.json")
+        # the second line is appended in two writes, and may be read in between
+        split = len(self.INPUT_LINES[1]) // 2
+        with open(input_file_path, 'w') as writer:
+            writer.write(self.INPUT_LINES[0] + self.INPUT_LINES[1][:split])
+        processor = EventProcessor(input_file_path, [AverageAggregator(2)], output_file_path, follow=True,
+                                   idle_timeout=0.05)
+        processor.FOLLOW_POLL_INTERVAL = 0.01
+        processor.__enter__()
+        worker = threading.Thread(target=self._execute_until_closed, args=(processor,))
+        worker.start()
+        time.sleep(0.5)
+        self.assertListEqual([{"date": "2018-12-26 18:11:00", "average_delivery_time": 0.0},
+                              {"date": "2018-12-26 18:12:00", "average_delivery_time": 20.0}],
+                             self._read_output(output_file_path))
+
+        with open(input_file_path, 'a') as writer:
+            writer.write(self.INPUT_LINES[1][split:])
+        time.sleep(0.5)
+        processor.input_file_handlers[0].close()
+        worker.join(5)
+        processor.__exit__(None, None, None)
+
+        self.assertListEqual([{"date": "2018-12-26 18:11:00", "average_delivery_time": 0.0},
+                              {"date": "2018-12-26 18:12:00", "average_delivery_time": 20.0},
+                              {"date": "2018-12-26 18:13:00", "average_delivery_time": 20.0},
+                              {"date": "2018-12-26 18:14:00", "average_delivery_time": 31.0}],
+                             self._read_output(output_file_path))
+
+    def test_stdin_matches_input_file(self):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", "dense_events.json")
+        file_output_path = os.path.join(self.RESULT_DIR, "file.json")
+        stdin_output_path = os.path.join(self.RESULT_DIR, "stdin.json")
+        with EventProcessor(input_file_path, [AverageAggregator(3), MaxAggregator(3)], file_output_path) as e:
+            e.execute()
+        with open(input_file_path, 'r') as stdin, mock.patch.object(sys, 'stdin', stdin):
+            with EventProcessor(EventProcessor.STDIN, [AverageAggregator(3), MaxAggregator(3)],
+                                stdin_output_path) as e:
+                e.execute()
+
+        with open(file_output_path, 'r') as file_output, open(stdin_output_path, 'r') as stdin_output:
+            self.assertEqual(file_output.read(), stdin_output.read())
+
+
+class EventProcessorMergedInputsTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    @staticmethod
+    def _aggregators():
+        return [AverageAggregator(3), MedianAggregator(3), MaxAggregator(3)]
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', 2),
+        ('dense_events', 'dense_events.json', 3),
+        ('more_inputs_than_events', 'input1.json', 5)
+    ])
+    def test_matches_single_input(self, name, input_file, inputs):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        with open(input_file_path, 'r') as f:
+            lines = [line.rstrip("\n") + "\n" for line in f]
+        # events are dealt round robin, so every input stays sorted
+        shard_paths = [os.path.join(self.RESULT_DIR, "shard_{0}.json".format(i)) for i in range(inputs)]
+        for i, shard_path in enumerate(shard_paths):
+            with open(shard_path, 'w') as f:
+                f.writelines(lines[i::inputs])
+        single_output_path = os.path.join(self.RESULT_DIR, "single.json")
+        merged_output_path = os.path.join(self.RESULT_DIR, "merged.json")
+        with EventProcessor(input_file_path, self._aggregators(), single_output_path) as e:
+            e.execute()
+        with EventProcessor(shard_paths, self._aggregators(), merged_output_path) as e:
+            e.execute()
+
+        with open(single_output_path, 'r') as single_file, open(merged_output_path, 'r') as merged_file:
+            self.assertEqual(single_file.read(), merged_file.read())
+
+
+class EventProcessorCheckpointTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    @staticmethod
+    def _aggregators():
+        return [AverageAggregator(3), MedianAggregator(3), MaxAggregator(2), MinAggregator(3, use_word_count=True),
+                AverageAggregator(2, bucketed=True), VarianceAggregator(3, bucketed=True),
+                ExponentialAverageAggregator(3), WordRateAggregator(2)]
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', 'jsonl', [2, 3, 5]),
+        ('same_minute_split', 'dense_events.json', 'jsonl', [1, 2]),
+        ('long_gap', 'long_gap.json', 'csv', [1, 2]),
+        ('no_new_lines', 'input1.json', 'csv', [3, 3])
+    ])
+    def test_resume_matches_full_run(self, name, input_file, output_format, splits):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        with open(input_file_path, 'r') as f:
+            lines = [line.rstrip("\n") + "\n" for line in f]
+        full_output_path = os.path.join(self.RESULT_DIR, "full.out")
+        with EventProcessor(input_file_path, self._aggregators(), full_output_path,
+                            output_format=output_format) as e:
+            e.execute()
+
+        log_path = os.path.join(self.RESULT_DIR, "log.json")
+        output_path = os.path.join(self.RESULT_DIR, "incremental.out")
+        checkpoint_path = os.path.join(self.RESULT_DIR, "checkpoint.json")
+        for split in splits + [len(lines)]:
+            with open(log_path, 'w') as f:
+                f.writelines(lines[:split])
+                # a line that is still being written is left for the next run
+                f.write(lines[split][:10] if split < len(lines) else "")
+            with EventProcessor(log_path, self._aggregators(), output_path, output_format=output_format,
+                                checkpoint=checkpoint_path) as e:
+                e.execute()
+
+        with open(full_output_path, 'r') as full_file, open(output_path, 'r') as incremental_file:
+            self.assertEqual(full_file.read(), incremental_file.read())
+
+    def test_rejects_other_aggregators(self):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", "input1.json")
+        output_path = os.path.join(self.RESULT_DIR, "output.json")
+        checkpoint_path = os.path.join(self.RESULT_DIR, "checkpoint.json")
+        with EventProcessor(input_file_path, [AverageAggregator(3)], output_path, checkpoint=checkpoint_path) as e:
+            e.execute()
+        with self.assertRaises(EventProcessorError):
+            with EventProcessor(input_file_path, [AverageAggregator(5)], output_path, checkpoint=checkpoint_path):
+                pass
+
+    def test_rejects_other_parameters(self):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", "input1.json")
+        output_path = os.path.join(self.RESULT_DIR, "output.json")
+        checkpoint_path = os.path.join(self.RESULT_DIR, "checkpoint.json")
+        with EventProcessor(input_file_path, [ApproximateMedianAggregator(3), ExponentialAverageAggregator(3)],
+                            output_path, checkpoint=checkpoint_path) as e:
+            e.execute()
+        # the sketch bins and the weights depend on them
+        for aggregators in [[ApproximateMedianAggregator(3, relative_accuracy=0.05), ExponentialAverageAggregator(3)],
+                            [ApproximateMedianAggregator(3), ExponentialAverageAggregator(3, half_life=1)]]:
+            with self.assertRaises(EventProcessorError):
+                with EventProcessor(input_file_path, aggregators, output_path, checkpoint=checkpoint_path):
+                    pass
+
+    def test_rejects_aggregators_without_state(self):
+        class CountAggregator(MovingAggregator):
+            name = "count"
+
+        with self.assertRaises(NotImplementedError):
+            CountAggregator(3).get_state()
+        with self.assertRaises(EventProcessorError):
+            EventProcessor("input.json", [CountAggregator(3)], "output.json",
+                           checkpoint=os.path.join(self.RESULT_DIR, "checkpoint.json"))
@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import unittest
+
+from pynopticon.aggregator import AverageAggregator, MaxAggregator
+from pynopticon.grouping import GroupedEventProcessor
+
+
+class GroupedEventProcessorTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    INPUT_DIR = os.path.join(os.getcwd(), "test", "test_inputs")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _run(self, input_file, group_by, window_size):
+        output_file = os.path.join(self.RESULT_DIR, "grouped.json")
+        processor = GroupedEventProcessor(os.path.join(self.INPUT_DIR, input_file),
+                                          lambda: [AverageAggregator(window_size), MaxAggregator(window_size)],
+                                          group_by, ofile=output_file)
+        with processor:
+            processor.execute()
+        with open(output_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_lines_per_group(self):
+        output = self._run('input1.json', ['client_name'], 5)
+
+        easyjet = [x for x in output if x['client_name'] == 'easyjet']
+        self.assertListEqual(["2018-12-26 18:{0}:00".format(minute) for minute in range(12, 21)],
+                             [x['date'] for x in easyjet])
+        self.assertListEqual([20.0] * 4 + [25.5] + [31.0] * 4, [x['average_delivery_time'] for x in easyjet])
+        self.assertListEqual([20.0] * 4 + [31.0] * 5, [x['maximum_delivery_time'] for x in easyjet])
+
+        # groups with empty windows have no lines, the booking event comes after every easyjet event left the window
+        booking = [x for x in output if x['client_name'] == 'booking']
+        self.assertListEqual([{"date": "2018-12-26 18:24:00", "client_name": "booking",
+                               "average_delivery_time": 54.0, "maximum_delivery_time": 54.0}], booking)
+        self.assertEqual(10, len(output))
+
+    def test_several_fields(self):
+        output = self._run('input1.json', ['client_name', 'target_language'], 10)
+
+        self.assertSetEqual({('easyjet', 'fr'), ('booking', 'fr')},
+                            {(x['client_name'], x['target_language']) for x in output})
+        self.assertListEqual([{"date": "2018-12-26 18:22:00", "client_name": "easyjet", "target_language": "fr",
+                               "average_delivery_time": 31.0, "maximum_delivery_time": 31.0}],
+                             [x for x in output if x['date'] == "2018-12-26 18:22:00"])
+
+    def test_empty_input(self):
+        self.assertListEqual([], self._run('empty.json', ['client_name'], 10))
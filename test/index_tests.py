@@ -0,0 +1,132 @@
+import datetime
+import gzip
+import json
+import os
+import shutil
+import unittest
+
+from parameterized import parameterized
+
+from pynopticon.api import create_aggregators
+from pynopticon.event_processor import EventProcessor, EventProcessorError
+from pynopticon.index import MinuteIndex, MinuteIndexError, build_index, find_offset, index_path, line_timestamp
+from pynopticon.util import MINUTE_MICROSECONDS
+
+
+class MinuteIndexTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    AGGREGATORS = ['average', 'p90', 'approx_p50']
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _copy_input(self, input_file):
+        """
+        :return: path of a copy of a test input, whose sidecar index is written next to it
+        """
+        input_file_path = os.path.join(self.RESULT_DIR, input_file)
+        shutil.copy(os.path.join(os.getcwd(), "test", "test_inputs", input_file), input_file_path)
+        return input_file_path
+
+    def _output(self, input_file_path, window_sizes, bucketed=False, **kwargs):
+        output_file_path = os.path.join(self.RESULT_DIR, "output.json")
+        aggregators = create_aggregators(self.AGGREGATORS if not bucketed else ['average', 'approx_p50'], window_sizes,
+                                         bucketed=bucketed)
+        with EventProcessor(input_file_path, aggregators, output_file_path, **kwargs) as e:
+            e.execute()
+        with open(output_file_path, 'r') as f:
+            return [json.loads(line) for line in f]
+
+    @staticmethod
+    def _expected_offsets(input_file_path):
+        """
+        :return: function of a minute that returns the offset of its first line or later, found by reading every line
+        """
+        lines = []
+        position = 0
+        with open(input_file_path, 'rb') as f:
+            for line in f:
+                lines.append((position, line_timestamp(line)))
+                position += len(line)
+
+        def expected(minute):
+            return next((offset for offset, timestamp in lines if timestamp >= minute), position)
+        return expected, [timestamp - timestamp % MINUTE_MICROSECONDS for _, timestamp in lines]
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json'),
+        ('dense_events', 'dense_events.json'),
+        ('long_gap', 'long_gap.json')
+    ])
+    def test_find_offset(self, name, input_file):
+        input_file_path = self._copy_input(input_file)
+        expected, minutes = self._expected_offsets(input_file_path)
+        candidates = sorted(set(minutes + [minute + MINUTE_MICROSECONDS * shift for minute in minutes[::5]
+                                           for shift in (-3, -1, 1, 7)]))
+
+        searched = [find_offset(input_file_path, minute) for minute in candidates]
+        build_index(input_file_path)
+        indexed = [find_offset(input_file_path, minute) for minute in candidates]
+        self.assertEqual([expected(minute) for minute in candidates], searched)
+        self.assertEqual(searched, indexed)
+
+    def test_index_of_appended_file(self):
+        input_file_path = self._copy_input('long_gap.json')
+        expected, minutes = self._expected_offsets(input_file_path)
+        with open(input_file_path, 'rb') as f:
+            lines = f.readlines()
+        with open(input_file_path, 'wb') as f:
+            f.writelines(lines[:len(lines) // 2])
+        indexed_size = os.path.getsize(input_file_path)
+        build_index(input_file_path)
+        sidecar = index_path(input_file_path)
+        self.assertEqual((0, indexed_size), MinuteIndex.read_offset(sidecar, minutes[0] - MINUTE_MICROSECONDS))
+        self.assertEqual([(expected(minute), indexed_size) for minute in minutes[:len(lines) // 2]],
+                         [MinuteIndex.read_offset(sidecar, minute) for minute in minutes[:len(lines) // 2]])
+        self.assertEqual((None, indexed_size), MinuteIndex.read_offset(sidecar, minutes[-1]))
+
+        # the lines appended after the index was built are searched
+        with open(input_file_path, 'wb') as f:
+            f.writelines(lines)
+        self.assertEqual([expected(minute) for minute in minutes], [find_offset(input_file_path, minute)
+                                                                    for minute in minutes])
+
+    @parameterized.expand([
+        ('inside', 'long_gap.json', '2018-12-27 10:00', '2018-12-27 10:45', [2, 30], False),
+        ('start_only', 'long_gap.json', '2018-12-28 12:30:45', None, [5], False),
+        ('end_only', 'long_gap.json', None, '2018-12-26 18:40', [5], False),
+        ('in_a_gap', 'long_gap.json', '2018-12-27 03:00', '2018-12-27 03:05', [10], False),
+        ('bucketed', 'long_gap.json', '2018-12-27 10:00', '2018-12-27 12:00', [3, 60], True),
+        ('before_the_input', 'input1.json', '2018-12-26 17:00', '2018-12-26 18:13', [10], False),
+        ('past_the_input', 'input1.json', '2018-12-26 18:20', '2018-12-26 19:00', [10], False),
+        ('ends_at_first_event', 'input1.json', '2018-12-26 18:00', '2018-12-26 18:11', [10], False)
+    ])
+    def test_range_matches_full_output(self, name, input_file, start, end, window_sizes, bucketed):
+        input_file_path = self._copy_input(input_file)
+        start = start and datetime.datetime.fromisoformat(start)
+        end = end and datetime.datetime.fromisoformat(end)
+        first = start.replace(second=0).strftime(EventProcessor.OUTPUT_TIME_FORMAT) if start else ""
+        last = end.replace(second=0).strftime(EventProcessor.OUTPUT_TIME_FORMAT) if end else "9"
+        expected = [line for line in self._output(input_file_path, window_sizes, bucketed=bucketed)
+                    if first <= line['date'] <= last]
+
+        self.assertEqual(expected, self._output(input_file_path, window_sizes, bucketed=bucketed, start=start, end=end))
+        build_index(input_file_path)
+        self.assertEqual(expected, self._output(input_file_path, window_sizes, bucketed=bucketed, start=start, end=end))
+
+    def test_compressed_input(self):
+        input_file_path = self._copy_input('input1.json')
+        compressed_file_path = input_file_path + ".gz"
+        with open(input_file_path, 'rb') as f, gzip.open(compressed_file_path, 'wb') as g:
+            g.write(f.read())
+        with self.assertRaises(MinuteIndexError):
+            build_index(compressed_file_path)
+        with self.assertRaises(EventProcessorError):
+            self._output(compressed_file_path, [10], start=datetime.datetime(2018, 12, 26, 18, 15))
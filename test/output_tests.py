@@ -0,0 +1,108 @@
+import datetime
+import io
+import json
+import unittest
+
+from pynopticon.output import MinuteFormatter, JsonLinesWriter, CsvWriter, NpyWriter, np
+
+
+class OutputWriterTestCase(unittest.TestCase):
+    START = datetime.datetime(2018, 12, 31, 23, 58)
+    MINUTE = datetime.timedelta(minutes=1)
+
+    def test_formatter_counts_minutes_across_days(self):
+        expected = [(self.START + i * self.MINUTE).strftime(MinuteFormatter.FAST_FORMAT) for i in range(5)]
+        formatter = MinuteFormatter(MinuteFormatter.FAST_FORMAT)
+
+        self.assertListEqual(expected, [formatter.format(self.START + i * self.MINUTE) for i in range(5)])
+        self.assertListEqual(expected, [date for date, _ in zip(formatter.series(self.START), range(5))])
+
+    def test_formatter_other_formats(self):
+        formatter = MinuteFormatter("%d/%m/%Y %H:%M")
+
+        self.assertEqual("31/12/2018 23:58", formatter.format(self.START))
+        self.assertListEqual(["31/12/2018 23:59", "01/01/2019 00:00"],
+                             [date for date, _ in zip(formatter.series(self.START + self.MINUTE), range(2))])
+
+    def test_json_lines_match_json_dumps(self):
+        output = io.StringIO()
+        writer = JsonLinesWriter(output, ["average_delivery_time", "p99.9_delivery_time"], MinuteFormatter.FAST_FORMAT,
+                                 group_by=["client_name"])
+        writer.write(self.START, [20.0, 1 / 3], group=('{"quoted"}',))
+        writer.close()
+
+        self.assertEqual(json.dumps({"date": "2018-12-31 23:58:00", "client_name": '{"quoted"}',
+                                     "average_delivery_time": 20.0, "p99.9_delivery_time": 1 / 3}) + "\n",
+                         output.getvalue())
+
+    def test_values_that_are_not_finite(self):
+        output = io.StringIO()
+        writer = JsonLinesWriter(output, ["average_delivery_time", "maximum_delivery_time"],
+                                 MinuteFormatter.FAST_FORMAT)
+        writer.write(self.START, [float("nan"), float("inf")])
+        writer.write_repeated(self.START + self.MINUTE, 1, [float("-inf"), 2])
+        writer.close()
+
+        # strict JSON doesn't have NaN or Infinity
+        lines = [json.loads(line, parse_constant=self.fail) for line in output.getvalue().splitlines()]
+        self.assertEqual([None, None], [lines[0]["average_delivery_time"], lines[0]["maximum_delivery_time"]])
+        self.assertEqual([None, 2.0], [lines[1]["average_delivery_time"], lines[1]["maximum_delivery_time"]])
+
+        output = io.StringIO()
+        writer = CsvWriter(output, ["average_delivery_time", "maximum_delivery_time"], MinuteFormatter.FAST_FORMAT)
+        writer.write_series(self.START, [[float("nan"), float("-inf")]])
+        writer.close()
+        self.assertEqual("2018-12-31 23:58:00,NaN,-Infinity\n", output.getvalue().splitlines(True)[1])
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy_values(self):
+        output = io.StringIO()
+        writer = JsonLinesWriter(output, ["average_delivery_time", "maximum_delivery_time"],
+                                 MinuteFormatter.FAST_FORMAT)
+        writer.write(self.START, [np.float64(1.5), np.float64("nan")])
+        writer.close()
+        self.assertEqual(json.dumps({"date": "2018-12-31 23:58:00", "average_delivery_time": 1.5,
+                                     "maximum_delivery_time": None}) + "\n", output.getvalue())
+
+        output = io.StringIO()
+        writer = CsvWriter(output, ["average_delivery_time"], MinuteFormatter.FAST_FORMAT)
+        writer.write(self.START, [np.float32(0.5)])
+        writer.close()
+        self.assertEqual("2018-12-31 23:58:00,0.5\n", output.getvalue().splitlines(True)[1])
+
+    def test_lines_are_buffered(self):
+        output = io.StringIO()
+        writer = JsonLinesWriter(output, ["average_delivery_time"], MinuteFormatter.FAST_FORMAT)
+        writer.write_repeated(self.START, JsonLinesWriter.BUFFER_LINES - 1, [0.0])
+        self.assertEqual("", output.getvalue())
+
+        writer.write_series(self.START, [[1.0], [2.0]])
+        self.assertEqual(JsonLinesWriter.BUFFER_LINES, len(output.getvalue().splitlines()))
+        writer.flush()
+        self.assertEqual(JsonLinesWriter.BUFFER_LINES + 1, len(output.getvalue().splitlines()))
+
+    def test_csv(self):
+        output = io.StringIO()
+        writer = CsvWriter(output, ["average_delivery_time", "maximum_delivery_time"], MinuteFormatter.FAST_FORMAT,
+                           group_by=["client_name"])
+        writer.write(self.START, [25.5, 31.0], group=("easy,jet",))
+        writer.close()
+
+        self.assertEqual("date,client_name,average_delivery_time,maximum_delivery_time\n"
+                         "2018-12-31 23:58:00,\"easy,jet\",25.5,31.0\n", output.getvalue())
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_npy(self):
+        output = io.BytesIO()
+        writer = NpyWriter(output, ["average_delivery_time", "maximum_delivery_time"], MinuteFormatter.FAST_FORMAT)
+        writer.write(self.START, [25.5, 31.0])
+        writer.write_repeated(self.START + self.MINUTE, 2, [0.0, 0.0])
+        writer.write_series(self.START + 3 * self.MINUTE, [[1.0, 2.0]])
+        writer.close()
+
+        output.seek(0)
+        array = np.load(output)
+        self.assertListEqual(["2018-12-31T23:58", "2018-12-31T23:59", "2019-01-01T00:00", "2019-01-01T00:01"],
+                             [str(date) for date in array["date"]])
+        self.assertListEqual([25.5, 0.0, 0.0, 1.0], array["average_delivery_time"].tolist())
+        self.assertListEqual([31.0, 0.0, 0.0, 2.0], array["maximum_delivery_time"].tolist())
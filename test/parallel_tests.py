@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import sys
+import unittest
+from unittest import mock
+
+from parameterized import parameterized
+
+from benchmarks.generator import EventGenerator
+from pynopticon.aggregator import (AverageAggregator, MedianAggregator, MinAggregator, MaxAggregator,
+                                   PercentileAggregator, VarianceAggregator, EventRateAggregator, WordRateAggregator,
+                                   ApproximateMedianAggregator, ApproximatePercentileAggregator)
+from pynopticon.api import create_aggregators
+from pynopticon.arguments import parse_args
+from pynopticon.entry_point import run
+from pynopticon.event_processor import EventProcessor
+from pynopticon.parallel import ParallelEventProcessor, shard_ranges
+
+
+class ParallelEventProcessorTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    INPUT_DIR = os.path.join(os.getcwd(), "test", "test_inputs")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    @staticmethod
+    def _aggregators(window_size, use_word_count, bucketed):
+        aggregators = [AverageAggregator(window_size, use_word_count=use_word_count, bucketed=bucketed),
+                       MinAggregator(window_size, use_word_count=use_word_count, bucketed=bucketed),
+                       MaxAggregator(window_size, use_word_count=use_word_count, bucketed=bucketed),
+                       EventRateAggregator(window_size, use_word_count=use_word_count, bucketed=bucketed),
+                       WordRateAggregator(window_size, bucketed=bucketed)]
+        if not bucketed:
+            aggregators += [MedianAggregator(window_size, use_word_count=use_word_count),
+                            PercentileAggregator(90, window_size, use_word_count=use_word_count),
+                            VarianceAggregator(window_size, use_word_count=use_word_count)]
+        return aggregators
+
+    def test_shard_ranges_split_at_lines(self):
+        input_file_path = os.path.join(self.INPUT_DIR, "dense_events.json")
+        with open(input_file_path, 'rb') as f:
+            content = f.read()
+
+        for shards in [1, 2, 3, 7, 1000]:
+            ranges = shard_ranges(input_file_path, shards)
+            self.assertLessEqual(len(ranges), shards)
+            self.assertEqual(0, ranges[0][0])
+            self.assertEqual(len(content), ranges[-1][1])
+            for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, start)
+                self.assertEqual(b"\n", content[end - 1:end])
+
+    def test_shard_ranges_empty_file(self):
+        self.assertListEqual([], shard_ranges(os.path.join(self.INPUT_DIR, "empty.json"), 4))
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', 10, False, False),
+        ('empty_input', 'empty.json', 11, False, False),
+        ('dense_events', 'dense_events.json', 3, False, False),
+        ('dense_events_bucketed', 'dense_events.json', 3, False, True),
+        ('dense_events_word_count', 'dense_events.json', 3, True, False),
+        ('long_gap', 'long_gap.json', 2, False, True)
+    ])
+    def test_matches_sequential_run(self, name, input_file, window_size, use_word_count, bucketed):
+        input_file_path = os.path.join(self.INPUT_DIR, input_file)
+        sequential_output_path = os.path.join(self.RESULT_DIR, "sequential.json")
+        parallel_output_path = os.path.join(self.RESULT_DIR, "parallel.json")
+        with EventProcessor(input_file_path, self._aggregators(window_size, use_word_count, False),
+                            sequential_output_path) as e:
+            e.execute()
+        with ParallelEventProcessor(input_file_path, self._aggregators(window_size, use_word_count, bucketed),
+                                    parallel_output_path, workers=3) as e:
+            e.execute()
+
+        with open(sequential_output_path, 'r') as sequential_file, open(parallel_output_path, 'r') as parallel_file:
+            sequential = [json.loads(line) for line in sequential_file]
+            parallel = [json.loads(line) for line in parallel_file]
+        if bucketed:
+            exact = ('median', 'p90', 'variance')
+            sequential = [{k: v for k, v in line.items() if not k.startswith(exact)} for line in sequential]
+        self.assertListEqual(sequential, parallel)
+
+    @parameterized.expand([
+        ('dense_events', 'dense_events.json', 3, 0.01),
+        ('long_gap', 'long_gap.json', 2, 0.05)
+    ])
+    def test_sketches_are_merged(self, name, input_file, window_size, relative_accuracy):
+        input_file_path = os.path.join(self.INPUT_DIR, input_file)
+        sequential_output_path = os.path.join(self.RESULT_DIR, "sequential.json")
+        parallel_output_path = os.path.join(self.RESULT_DIR, "parallel.json")
+        with EventProcessor(input_file_path, [ApproximateMedianAggregator(window_size),
+                                              ApproximatePercentileAggregator(90, window_size,
+                                                                              relative_accuracy=relative_accuracy)],
+                            sequential_output_path) as e:
+            e.execute()
+        # workers send a sketch of each minute for each relative accuracy
+        with ParallelEventProcessor(input_file_path, [ApproximateMedianAggregator(window_size, bucketed=True),
+                                                      ApproximatePercentileAggregator(
+                                                          90, window_size, relative_accuracy=relative_accuracy,
+                                                          bucketed=True)],
+                                    parallel_output_path, workers=3) as e:
+            e.execute()
+
+        with open(sequential_output_path, 'r') as sequential_file, open(parallel_output_path, 'r') as parallel_file:
+            sequential = [json.loads(line) for line in sequential_file]
+            parallel = [json.loads(line) for line in parallel_file]
+        self.assertEqual(len(sequential), len(parallel))
+        for sequential_line, parallel_line in zip(sequential, parallel):
+            self.assertEqual(sequential_line['date'], parallel_line['date'])
+            self.assertAlmostEqual(sequential_line['approx_median_delivery_time'],
+                                   parallel_line['approx_median_delivery_time'],
+                                   delta=sequential_line['approx_median_delivery_time'] * 0.01)
+            self.assertAlmostEqual(sequential_line['approx_p90_delivery_time'],
+                                   parallel_line['approx_p90_delivery_time'],
+                                   delta=sequential_line['approx_p90_delivery_time'] * relative_accuracy)
+
+    @parameterized.expand([
+        ('default', [], True),
+        ('bucketed', ['--bucketed'], False)
+    ])
+    def test_word_count_command_line(self, name, arguments, exact):
+        input_file_path = os.path.join(self.RESULT_DIR, "input.json")
+        with open(input_file_path, 'w') as f:
+            EventGenerator(seed=0).write(f, 5000)
+        sequential_output_path = os.path.join(self.RESULT_DIR, "sequential.json")
+        parallel_output_path = os.path.join(self.RESULT_DIR, "parallel.json")
+        with EventProcessor(input_file_path, create_aggregators(['average', 'min', 'max'], 3, use_word_count=True),
+                            sequential_output_path) as e:
+            e.execute()
+        argv = ['main.py', '--input_file', input_file_path, '--window_size', '3', '--aggregator', 'average', 'min',
+                'max', '--use_word_count', '--workers', '3', '--output_file', parallel_output_path]
+        with mock.patch.object(sys, 'argv', argv + arguments):
+            run(parse_args())
+
+        with open(sequential_output_path, 'r') as sequential_file, open(parallel_output_path, 'r') as parallel_file:
+            sequential = sequential_file.read()
+            parallel = parallel_file.read()
+        # values per word aren't integers, per-minute records sum them up in another order
+        if exact:
+            self.assertEqual(sequential, parallel)
+        else:
+            for sequential_line, parallel_line in zip(sequential.splitlines(), parallel.splitlines()):
+                sequential_values, parallel_values = json.loads(sequential_line), json.loads(parallel_line)
+                self.assertEqual(sequential_values.pop('date'), parallel_values.pop('date'))
+                for key, value in sequential_values.items():
+                    self.assertAlmostEqual(value, parallel_values[key], delta=abs(value) * 1e-9)
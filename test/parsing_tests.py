@@ -0,0 +1,76 @@
+import datetime
+import json
+import random
+import unittest
+from unittest import mock
+
+from parameterized import parameterized
+
+from benchmarks.generator import EventGenerator
+from pynopticon import event_processor
+from pynopticon.event_processor import Event, EventProcessor
+from pynopticon.util import FIXED_TIME_FORMAT, parse_fixed_timestamp
+
+
+class EventParsingTestCase(unittest.TestCase):
+
+    @staticmethod
+    def _fields(event):
+        return event.timestamp, event.timestamp_microseconds, event.duration, event.word_count, event.group
+
+    def _strptime_event(self, line, group_by=None):
+        """
+        :return: fields of the event of `line` parsed by `json.loads` and `strptime`, like before the fast path
+        """
+        e = json.loads(line)
+        timestamp = datetime.datetime.strptime(e['timestamp'], FIXED_TIME_FORMAT)
+        group = tuple(e.get(field) for field in group_by) if group_by else None
+        return self._fields(Event(timestamp, e['duration'], e['nr_words'], group=group))
+
+    def test_fixed_timestamps_match_strptime(self):
+        rng = random.Random(0)
+        start = datetime.datetime(1999, 12, 31, 23, 59, 59, 999999)
+        dates = [start, start + datetime.timedelta(microseconds=1), datetime.datetime(2024, 2, 29, 0, 0, 0, 10)]
+        dates += [start + datetime.timedelta(microseconds=rng.randrange(10 ** 15)) for _ in range(1000)]
+        for date in dates:
+            value = date.strftime(FIXED_TIME_FORMAT)
+            self.assertEqual(datetime.datetime.strptime(value, FIXED_TIME_FORMAT), parse_fixed_timestamp(value))
+
+    @parameterized.expand([
+        ('unpadded', "2018-1-6 8:1:8.5", datetime.datetime(2018, 1, 6, 8, 1, 8, 500000)),
+        ('short_fraction', "2018-12-26 18:11:08.5096", datetime.datetime(2018, 12, 26, 18, 11, 8, 509600)),
+    ])
+    def test_other_layouts_fall_back_to_strptime(self, name, value, expected):
+        self.assertEqual(expected, parse_fixed_timestamp(value))
+
+    @parameterized.expand([
+        ('iso_separator', "2018-12-26T18:11:08.509654"),
+        ('no_fraction', "2018-12-26 18:11:08"),
+        ('time_zone', "2018-12-26 18:11:08.509654+01:00"),
+        ('not_a_digit', "2018-12-26 18:11:08.50965a"),
+    ])
+    def test_invalid_timestamps_are_rejected_like_strptime(self, name, value):
+        with self.assertRaises(ValueError):
+            datetime.datetime.strptime(value, FIXED_TIME_FORMAT)
+        with self.assertRaises(ValueError):
+            parse_fixed_timestamp(value)
+
+    @parameterized.expand([
+        ('default_backend', None),
+        ('json_module', json.loads),
+    ])
+    def test_events_match_strptime_parser(self, name, json_loads):
+        lines = [json.dumps(e) for e in EventGenerator(seed=2, clients=3).events(500)]
+        with mock.patch.object(event_processor, 'json_loads', json_loads or event_processor.json_loads):
+            for line in lines:
+                self.assertEqual(self._strptime_event(line),
+                                 self._fields(Event.parse_from_json(line, EventProcessor.INPUT_TIME_FORMAT)))
+                self.assertEqual(self._strptime_event(line, group_by=['client_name']),
+                                 self._fields(Event.parse_from_json(line, EventProcessor.INPUT_TIME_FORMAT,
+                                                                    group_by=['client_name'])))
+
+    def test_other_time_formats_use_strptime(self):
+        event = Event.parse_from_json('{"timestamp": "26/12/2018 18:11", "duration": 20, "nr_words": 30}',
+                                      "%d/%m/%Y %H:%M")
+        self.assertEqual((datetime.datetime(2018, 12, 26, 18, 11), 20, 30),
+                         (event.timestamp, event.duration, event.word_count))
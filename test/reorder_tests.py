@@ -0,0 +1,117 @@
+import datetime
+import json
+import os
+import random
+import shutil
+import unittest
+
+from pynopticon.api import aggregate, create_aggregators
+from pynopticon.event_processor import Event, EventProcessor, EventProcessorError
+from pynopticon.reorder import ReorderBuffer
+from pynopticon.stats import PipelineStats
+
+
+class ReorderBufferTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    START = datetime.datetime(2024, 5, 1, 10, 0)
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _event(self, seconds, duration=1):
+        return Event(self.START + datetime.timedelta(seconds=seconds), duration, 1)
+
+    def _arrivals(self, count, lateness, seed=0):
+        """
+        :return: events in timestamp order, and the same events in an order where none arrives more than `lateness`
+        seconds after a later one
+        """
+        rng = random.Random(seed)
+        events = [self._event(i * 0.7, duration=i) for i in range(count)]
+        arrivals = sorted(events, key=lambda e: e.timestamp + datetime.timedelta(seconds=rng.uniform(0, lateness)))
+        return events, arrivals
+
+    def test_reorder_within_lateness(self):
+        events, arrivals = self._arrivals(500, 5)
+        self.assertNotEqual(events, arrivals)
+        buffer = ReorderBuffer(5)
+        self.assertEqual(events, list(buffer.reorder(arrivals)))
+        self.assertEqual(0, buffer.late_events)
+        self.assertEqual(0, len(buffer))
+
+    def test_buffer_is_bounded(self):
+        _, arrivals = self._arrivals(500, 5)
+        buffer = ReorderBuffer(5)
+        held = 0
+        for _ in buffer.reorder(arrivals):
+            held = max(held, len(buffer))
+        # about 5 seconds of events, one every 0.7 second
+        self.assertLessEqual(held, 5 / 0.7 + 2)
+
+    def test_late_events_are_dropped(self):
+        late = self._event(10, duration=-1)
+        arrivals = [self._event(0), self._event(30), late, self._event(31), self._event(10)]
+        buffer = ReorderBuffer(5)
+        released = list(buffer.reorder(arrivals))
+        self.assertEqual(2, buffer.late_events)
+        self.assertNotIn(late, released)
+        self.assertEqual([0, 30, 31], [(e.timestamp - self.START).seconds for e in released])
+
+    def test_ties_keep_arrival_order(self):
+        arrivals = [self._event(1, duration=d) for d in range(5)] + [self._event(0)]
+        self.assertEqual([1, 0, 1, 2, 3, 4], [e.duration for e in ReorderBuffer(2).reorder(arrivals)])
+
+    def test_idle_timeouts_flush(self):
+        buffer = ReorderBuffer(60)
+        released = list(buffer.reorder([self._event(0), self._event(10), None, self._event(5), self._event(20)]))
+        self.assertEqual([0, 10, None, 20], [None if e is None else (e.timestamp - self.START).seconds
+                                             for e in released])
+        # events before the last one released would be out of order
+        self.assertEqual(1, buffer.late_events)
+
+    def test_release(self):
+        events, arrivals = self._arrivals(300, 3, seed=1)
+        buffer = ReorderBuffer(3)
+        released = []
+        for i in range(0, len(arrivals), 7):
+            released += buffer.release(arrivals[i:i + 7])
+        self.assertLess(len(released), len(events))
+        self.assertEqual(events, released + buffer.flush())
+
+    def test_processor_output(self):
+        events, arrivals = self._arrivals(1000, 8, seed=2)
+        very_late = self._event(200, duration=1000)
+        arrivals.insert(800, very_late)
+        input_file_path = os.path.join(self.RESULT_DIR, "input.json")
+        with open(input_file_path, 'w') as f:
+            for event in arrivals:
+                f.write(json.dumps({'timestamp': event.timestamp.strftime(EventProcessor.INPUT_TIME_FORMAT),
+                                    'duration': event.duration, 'nr_words': event.word_count}) + "\n")
+        aggregators = ['average', 'median', 'max']
+        expected = list(aggregate(events, create_aggregators(aggregators, 3)))
+
+        output_file_path = os.path.join(self.RESULT_DIR, "output.json")
+        stats = PipelineStats()
+        with EventProcessor(input_file_path, create_aggregators(aggregators, 3), output_file_path, stats=stats,
+                            allowed_lateness=8) as e:
+            e.execute()
+        with open(output_file_path, 'r') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([dict(values, date=minute.strftime(EventProcessor.OUTPUT_TIME_FORMAT))
+                          for minute, values in expected], lines)
+        self.assertEqual(1, e.late_events)
+        self.assertEqual(1, stats.late_events)
+
+        records = list(aggregate(arrivals, create_aggregators(aggregators, 3), allowed_lateness=8))
+        self.assertEqual(expected, records)
+
+    def test_rejected_with_checkpoint(self):
+        with self.assertRaises(EventProcessorError):
+            EventProcessor("input.json", [], "output.json", checkpoint="checkpoint.json", allowed_lateness=1)
@@ -0,0 +1,215 @@
+import asyncio
+import datetime
+import json
+import os
+import shutil
+import unittest
+
+from parameterized import parameterized
+
+from pynopticon.api import aggregate, create_aggregators
+from pynopticon.event_processor import Event, EventProcessor
+from pynopticon.server import AggregationServer, LiveEventProcessor, parse_address
+
+
+class AggregationServerTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    AGGREGATORS = ['average', 'median', 'p90', 'approx_p50']
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _input_lines(self, input_file):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        with open(input_file_path, 'r') as f:
+            return input_file_path, f.readlines()
+
+    def _file_output(self, input_file_path, aggregators):
+        output_file_path = os.path.join(self.RESULT_DIR, "output.json")
+        with EventProcessor(input_file_path, aggregators, output_file_path) as e:
+            e.execute()
+        with open(output_file_path, 'r') as f:
+            return [json.loads(line) for line in f]
+
+    @staticmethod
+    async def _connect(address):
+        # answers of many minutes are long lines
+        if isinstance(address, str):
+            return await asyncio.open_unix_connection(address, limit=2 ** 20)
+        return await asyncio.open_connection(address[0], address[1], limit=2 ** 20)
+
+    @staticmethod
+    async def _request(reader, writer, request):
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    async def _send(self, address, lines):
+        """
+        Sends lines as a producer, and waits until the server has read them
+        """
+        reader, writer = await self._connect(address)
+        writer.write("".join(line.rstrip("\n") + "\n" for line in lines).encode())
+        # queries are answered in the order of the lines
+        await self._request(reader, writer, {'query': 'current'})
+        writer.close()
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json'),
+        ('dense_events', 'dense_events.json'),
+        ('long_gap', 'long_gap.json')
+    ])
+    def test_matches_file_output(self, name, input_file):
+        input_file_path, lines = self._input_lines(input_file)
+        expected = self._file_output(input_file_path, create_aggregators(self.AGGREGATORS, 2))
+
+        async def run():
+            server = AggregationServer(create_aggregators(self.AGGREGATORS, 2), queue_size=4)
+            listening = await server.start('127.0.0.1:0')
+            address = listening.sockets[0].getsockname()[:2]
+            await self._send(address, lines)
+            await server.join()
+            server.processor.close_minute()
+
+            reader, writer = await self._connect(address)
+            last = await self._request(reader, writer, {'query': 'last', 'minutes': 1000})
+            current = await self._request(reader, writer, {'query': 'current'})
+            last_two = await self._request(reader, writer, {'query': 'last', 'minutes': 2})
+            writer.close()
+            await server.close()
+            return last, current, last_two
+
+        last, current, last_two = asyncio.run(run())
+        self.assertEqual(expected[-1000:], last)
+        self.assertEqual(expected[-1], current)
+        self.assertEqual(expected[-2:], last_two)
+
+    def test_concurrent_producers(self):
+        start = datetime.datetime(2024, 5, 1, 10, 0)
+        producers = [["{0}\n".format(json.dumps({
+            'timestamp': (start + datetime.timedelta(seconds=(i * 7 + p) % 60, minutes=i % 2)).strftime(
+                EventProcessor.INPUT_TIME_FORMAT),
+            'duration': i % 13 + p, 'nr_words': 1})) for i in range(100)] for p in range(4)]
+        address = os.path.join(self.RESULT_DIR, "pynopticon.sock")
+
+        async def run():
+            server = AggregationServer(create_aggregators(['average', 'max'], 5), queue_size=2, idle_timeout=0.05)
+            await server.start(address)
+            await asyncio.gather(*[self._send(address, lines) for lines in producers])
+            await server.join()
+            # the idle timeout closes the open minute
+            await asyncio.sleep(0.3)
+            reader, writer = await self._connect(address)
+            last = await self._request(reader, writer, {'query': 'last', 'minutes': 10})
+            writer.close()
+            await server.close()
+            return last
+
+        last = asyncio.run(run())
+        self.assertFalse(os.path.exists(address))
+        # both minutes are closed once all the events are in, whatever the order they arrived in
+        self.assertEqual(3, len(last))
+        events = sorted((json.loads(line) for lines in producers for line in lines), key=lambda e: e['timestamp'])
+        expected = [dict(values, date=minute.strftime(EventProcessor.OUTPUT_TIME_FORMAT))
+                    for minute, values in aggregate(events, ['average', 'max'], window_size=5)]
+        self.assertEqual(expected[0], last[0])
+        self.assertEqual(expected[-1], last[-1])
+
+    def test_invalid_lines_and_queries(self):
+        async def run():
+            server = AggregationServer(create_aggregators(['average'], 1))
+            listening = await server.start('127.0.0.1:0')
+            reader, writer = await self._connect(listening.sockets[0].getsockname()[:2])
+            answers = [await self._request(reader, writer, {'query': 'current'})]
+            writer.write(b"not json\n{\"duration\": 3}\n")
+            answers += [json.loads(await reader.readline()), json.loads(await reader.readline())]
+            for request in [{'query': 'last'}, {'query': 'last', 'minutes': -1}, {'query': 'all'}]:
+                answers.append(await self._request(reader, writer, request))
+            writer.close()
+            await server.close()
+            return answers
+
+        answers = asyncio.run(run())
+        self.assertEqual({}, answers[0])
+        self.assertTrue(all(list(answer) == ['error'] for answer in answers[1:]))
+
+    def test_events_that_are_not_numbers(self):
+        lines = [json.dumps({'timestamp': '2024-05-01 10:00:{0:02d}.000000'.format(s), 'duration': d, 'nr_words': w})
+                 for s, d, w in [(1, "x", 1), (2, 4, 1), (3, 6, [1]), (4, True, 1)]]
+        lines.append(json.dumps({'timestamp': '2024-05-01 10:01:00.000000', 'duration': 1, 'nr_words': 1}))
+
+        async def run():
+            server = AggregationServer(create_aggregators(['average'], 5))
+            listening = await server.start('127.0.0.1:0')
+            reader, writer = await self._connect(listening.sockets[0].getsockname()[:2])
+            writer.write("".join(line + "\n" for line in lines).encode())
+            errors = [json.loads(await reader.readline()) for _ in range(3)]
+            await server.join()
+            current = await self._request(reader, writer, {'query': 'current'})
+            writer.close()
+            await server.close()
+            return errors, current
+
+        errors, current = asyncio.run(run())
+        self.assertTrue(all(list(error) == ['error'] for error in errors))
+        self.assertEqual({'date': '2024-05-01 10:01:00', 'average_delivery_time': 4.0}, current)
+
+        # events handed over directly are checked before any of them is added
+        with LiveEventProcessor(create_aggregators(['average'], 5), 10) as processor:
+            processor.add_events([Event.parse_from_json(line, EventProcessor.INPUT_TIME_FORMAT) for line in lines])
+            processor.close_minute()
+            self.assertEqual(3, processor.invalid_events)
+            self.assertEqual([{'date': '2024-05-01 10:01:00', 'average_delivery_time': 4.0},
+                              {'date': '2024-05-01 10:02:00', 'average_delivery_time': 2.5}],
+                             [json.loads(line) for line in processor.last(2)])
+
+    def test_allowed_lateness(self):
+        lines = ["{0}\n".format(json.dumps({'timestamp': '2024-05-01 10:{0:02d}:{1:02d}.000000'.format(*divmod(s, 60)),
+                                            'duration': s, 'nr_words': 1})) for s in [0, 50, 20, 70, 45, 130, 30]]
+
+        async def run():
+            server = AggregationServer(create_aggregators(['average'], 5), allowed_lateness=30)
+            listening = await server.start('127.0.0.1:0')
+            address = listening.sockets[0].getsockname()[:2]
+            await self._send(address, lines)
+            await server.join()
+            reader, writer = await self._connect(address)
+            late = await self._request(reader, writer, {'query': 'late_events'})
+            last = await self._request(reader, writer, {'query': 'last', 'minutes': 10})
+            writer.close()
+            await server.close()
+            return late, last
+
+        late, last = asyncio.run(run())
+        # the event of second 30 arrives after the one of second 130, and the watermark of second 100
+        self.assertEqual({'late_events': 1}, late)
+        # the event of second 130, which closes the minute of second 70, is held until the watermark passes it
+        self.assertEqual([{'date': '2024-05-01 10:00:00', 'average_delivery_time': 0.0},
+                          {'date': '2024-05-01 10:01:00', 'average_delivery_time': (0 + 50 + 20 + 45) / 4}], last)
+
+    def test_history(self):
+        input_file_path, lines = self._input_lines('long_gap.json')
+        expected = self._file_output(input_file_path, create_aggregators(['average'], 2))
+
+        with LiveEventProcessor(create_aggregators(['average'], 2), 3) as processor:
+            processor.add_events([Event.parse_from_json(line, EventProcessor.INPUT_TIME_FORMAT) for line in lines])
+            processor.close_minute()
+            # the minutes of the gap that don't fit are not even formatted
+            self.assertEqual(expected[-3:], [json.loads(line) for line in processor.last(10)])
+            self.assertEqual(expected[-1:], [json.loads(line) for line in processor.last(1)])
+            self.assertEqual([], processor.last(0))
+
+    def test_parse_address(self):
+        self.assertEqual(('127.0.0.1', 8765), parse_address('127.0.0.1:8765'))
+        self.assertEqual((None, 8765), parse_address(':8765'))
+        self.assertEqual(('::1', 0), parse_address('[::1]:0'))
+        self.assertEqual('/tmp/pynopticon.sock', parse_address('/tmp/pynopticon.sock'))
+        with self.assertRaises(ValueError):
+            parse_address('localhost')
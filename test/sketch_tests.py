@@ -0,0 +1,134 @@
+import json
+import math
+import os
+import random
+import shutil
+import unittest
+
+from parameterized import parameterized
+
+from pynopticon.aggregator import ApproximatePercentileAggregator, OrderStatisticAggregator
+from pynopticon.event_processor import EventProcessor
+from pynopticon.sketch import QuantileSketch
+
+
+class QuantileSketchTestCase(unittest.TestCase):
+
+    def _assert_within_accuracy(self, sketch, values, q):
+        values = sorted(values)
+        rank = q * (len(values) - 1)
+        exact = values[int(rank)]
+        self.assertLessEqual(abs(sketch.quantile(q) - exact), sketch.relative_accuracy * exact + 1e-12)
+
+    @parameterized.expand([
+        ('one_percent', 0.01),
+        ('five_percent', 0.05),
+        ('tenth_of_a_percent', 0.001)
+    ])
+    def test_quantiles_within_relative_accuracy(self, name, relative_accuracy):
+        r = random.Random(0)
+        values = [r.lognormvariate(3, 2) for _ in range(5000)] + [0, 0.0]
+        sketch = QuantileSketch(relative_accuracy)
+        for value in values:
+            sketch.add(value)
+
+        self.assertEqual(len(values), len(sketch))
+        for q in [0, 0.01, 0.25, 0.5, 0.9, 0.99, 1]:
+            self._assert_within_accuracy(sketch, values, q)
+
+    def test_bins_only_depend_on_the_range_of_values(self):
+        r = random.Random(0)
+        sketch = QuantileSketch(0.01)
+        for _ in range(100000):
+            sketch.add(r.uniform(1, 1000))
+        self.assertLessEqual(len(sketch.bins), math.ceil(math.log(1000) / math.log(sketch.gamma)) + 1)
+
+    def test_merge_and_subtract(self):
+        r = random.Random(1)
+        first, second, merged = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for sketch in (first, second):
+            for _ in range(1000):
+                value = r.expovariate(0.01)
+                sketch.add(value)
+                merged.add(value)
+
+        combined = QuantileSketch()
+        combined.merge(first)
+        combined.merge(second)
+        self.assertEqual(merged.bins, combined.bins)
+        self.assertEqual(merged.count, combined.count)
+
+        combined.subtract(second)
+        self.assertEqual(first.bins, combined.bins)
+        self.assertEqual(first.count, combined.count)
+
+    def test_rejects_other_accuracy(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+    def test_state_round_trip(self):
+        sketch = QuantileSketch()
+        for value in [1, 5, 5, 20, 300.5]:
+            sketch.add(value)
+        restored = QuantileSketch()
+        restored.set_state(json.loads(json.dumps(sketch.get_state())))
+        self.assertEqual(sketch.bins, restored.bins)
+        self.assertEqual(sketch.quantile(0.5), restored.quantile(0.5))
+
+
+class RankAggregator(OrderStatisticAggregator):
+    """
+    Value of the rank below, or above, an interpolated percentile
+    """
+
+    def __init__(self, percentile, window_size, round_up, **kwargs):
+        super().__init__(window_size, **kwargs)
+        self.percentile = percentile
+        self.round_up = round_up
+        self.name = "upper" if round_up else "lower"
+
+    def aggregate_sorted(self, sorted_values):
+        if len(sorted_values) == 0:
+            return 0.0
+        rank = (len(sorted_values) - 1) * self.percentile / 100
+        return float(sorted_values[math.ceil(rank) if self.round_up else math.floor(rank)])
+
+
+class ApproximatePercentileAggregatorTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _run(self, input_file_path, aggregators):
+        output_file_path = os.path.join(self.RESULT_DIR, "output.json")
+        with EventProcessor(input_file_path, aggregators, output_file_path) as e:
+            e.execute()
+        with open(output_file_path, 'r') as f:
+            return [json.loads(line) for line in f]
+
+    @parameterized.expand([
+        ('provided_example', 'input1.json', 50, False),
+        ('dense_events_bucketed', 'dense_events.json', 90, True),
+        ('long_gap_bucketed', 'long_gap.json', 10, True)
+    ])
+    def test_close_to_exact_percentile(self, name, input_file, percentile, bucketed):
+        input_file_path = os.path.join(os.getcwd(), "test", "test_inputs", input_file)
+        lower = RankAggregator(percentile, 3, round_up=False)
+        upper = RankAggregator(percentile, 3, round_up=True)
+        approximate = ApproximatePercentileAggregator(percentile, 3, relative_accuracy=0.02, bucketed=bucketed)
+
+        lines = self._run(input_file_path, [lower, upper, approximate])
+        self.assertGreater(len(lines), 0)
+        for line in lines:
+            low, high = line[lower.name], line[upper.name]
+            value = line[approximate.name]
+            self.assertGreaterEqual(value, low * 0.98)
+            self.assertLessEqual(value, high * 1.02)
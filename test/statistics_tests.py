@@ -0,0 +1,81 @@
+import datetime
+import math
+import random
+import statistics
+import unittest
+from bisect import bisect_left
+
+from parameterized import parameterized
+
+from pynopticon.aggregator import AGGREGATOR_REGISTRY, ExponentialAverageAggregator
+from pynopticon.api import aggregate
+from pynopticon.event_processor import Event
+
+
+class MovingStatisticsTestCase(unittest.TestCase):
+    START = datetime.datetime(2024, 5, 1, 10, 0)
+    AGGREGATORS = ['variance', 'stddev', 'ewma', 'events_per_minute', 'words_per_minute']
+
+    def _events(self, count, seed=0):
+        """
+        :return: events a few seconds apart with a few long gaps, whose durations mix huge and small values
+        """
+        rng = random.Random(seed)
+        events = []
+        seconds = 0.0
+        for _ in range(count):
+            seconds += rng.expovariate(1 / 8) if rng.random() > 0.01 else 3000
+            duration = 10 ** 6 + rng.random() if rng.random() < 0.5 else rng.randint(0, 50)
+            events.append(Event(self.START + datetime.timedelta(seconds=seconds), duration, rng.randint(0, 30)))
+        return events
+
+    @staticmethod
+    def _expected(events, minute, window_size):
+        """
+        :return: values of every aggregator for the line of `minute`, computed from the events of its window
+        """
+        timestamps = [e.timestamp for e in events]
+        window = events[bisect_left(timestamps, minute - datetime.timedelta(minutes=window_size)):
+                        bisect_left(timestamps, minute)]
+        durations = [e.duration for e in window]
+        variance = statistics.pvariance(durations) if window else 0.0
+        # each event is weighted by its minute, halving every half window
+        weights = [2 ** -((minute - e.timestamp.replace(second=0, microsecond=0)).total_seconds() / 30 / window_size)
+                   for e in window]
+        return {
+            'variance_delivery_time': variance,
+            'stddev_delivery_time': math.sqrt(variance),
+            'ewma_delivery_time': sum(w * d for w, d in zip(weights, durations)) / sum(weights) if window else 0.0,
+            'events_per_minute': len(window) / window_size,
+            'words_per_minute': sum(e.word_count for e in window) / window_size,
+        }
+
+    @parameterized.expand([
+        ('one_minute', 1, False),
+        ('events', 10, False),
+        ('bucketed', 10, True),
+        ('bucketed_long_window', 60, True)
+    ])
+    def test_matches_window_statistics(self, name, window_size, bucketed):
+        events = self._events(1500)
+        for minute, values in aggregate(events, self.AGGREGATORS, window_size=window_size, bucketed=bucketed):
+            for key, value in self._expected(events, minute, window_size).items():
+                self.assertAlmostEqual(value, values[key], delta=max(1, abs(value)) * 1e-9, msg=(minute, key))
+
+    def test_variance_recovers_after_large_values(self):
+        events = [Event(self.START + datetime.timedelta(seconds=i), 10 ** 9 + i % 7, 1) for i in range(600)]
+        events += [Event(self.START + datetime.timedelta(seconds=600 + i), 5, 1) for i in range(600)]
+        records = list(aggregate(events, ['variance', 'stddev'], window_size=3))
+        # a running sum of squares would be left with the rounding errors of the large values
+        self.assertEqual({'variance_delivery_time': 0.0, 'stddev_delivery_time': 0.0}, records[-1][1])
+        self.assertGreater(records[9][1]['variance_delivery_time'], 0)
+
+    def test_registry(self):
+        aggregator = AGGREGATOR_REGISTRY.create('ewma', 10, half_life=2, relative_accuracy=0.1)
+        self.assertEqual(2, aggregator.half_life)
+        self.assertEqual(5, AGGREGATOR_REGISTRY.create('ewma', 10).half_life)
+        with self.assertRaises(ValueError):
+            ExponentialAverageAggregator(10, half_life=0)
+        # word counts don't depend on --use_word_count
+        self.assertFalse(AGGREGATOR_REGISTRY.create('words_per_minute', 10, use_word_count=True).use_word_count)
+
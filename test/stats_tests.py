@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import unittest
+
+from pynopticon.aggregator import AverageAggregator, MaxAggregator
+from pynopticon.event_processor import EventProcessor
+from pynopticon.grouping import GroupedEventProcessor
+from pynopticon.stats import PipelineStats
+
+
+class RecordingProfiler:
+
+    def __init__(self):
+        self.entered = 0
+        self.exited = 0
+
+    def __enter__(self):
+        self.entered += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.exited += 1
+        return False
+
+
+class PipelineStatsTestCase(unittest.TestCase):
+    RESULT_DIR = os.path.join(os.getcwd(), ".test_results")
+    INPUT_FILE = os.path.join(os.getcwd(), "test", "test_inputs", "input1.json")
+
+    def setUp(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+        os.mkdir(self.RESULT_DIR)
+
+    def tearDown(self):
+        if os.path.isdir(self.RESULT_DIR):
+            shutil.rmtree(self.RESULT_DIR)
+
+    def _process(self, name, **kwargs):
+        output_file_path = os.path.join(self.RESULT_DIR, name)
+        with EventProcessor(self.INPUT_FILE, [AverageAggregator(10), MaxAggregator(10)], output_file_path,
+                            **kwargs) as e:
+            e.execute()
+        with open(output_file_path, 'r') as f:
+            return f.read()
+
+    def test_counts(self):
+        stats = PipelineStats()
+        profiler = RecordingProfiler()
+        output = self._process("stats.json", stats=stats, profiler=profiler)
+
+        self.assertEqual(self._process("plain.json"), output)
+        self.assertEqual((1, 1), (profiler.entered, profiler.exited))
+        self.assertEqual(3, stats.events_parsed)
+        self.assertEqual(3, stats.events_added)
+        # only the first event leaves the 10 minutes window before the end of the input
+        self.assertEqual(1, stats.entries_evicted)
+        self.assertEqual(14, stats.lines_emitted)
+        self.assertDictEqual({"average_delivery_time": 2, "maximum_delivery_time": 2}, stats.max_window_depth)
+        self.assertGreater(stats.wall_seconds, 0)
+        self.assertGreaterEqual(stats.wall_seconds, sum(stats.seconds.values()))
+
+    def test_groups_are_watched(self):
+        stats = PipelineStats()
+        output_file_path = os.path.join(self.RESULT_DIR, "grouped.json")
+        with GroupedEventProcessor(self.INPUT_FILE, lambda: [AverageAggregator(5)], ['client_name'],
+                                   ofile=output_file_path, stats=stats) as e:
+            e.execute()
+
+        self.assertEqual(3, stats.events_added)
+        # the booking event is still in its window at the end of the input
+        self.assertEqual(2, stats.entries_evicted)
+        self.assertEqual(10, stats.lines_emitted)
+        self.assertDictEqual({"average_delivery_time": 2}, stats.max_window_depth)
+
+    def test_json_report(self):
+        stats = PipelineStats()
+        self._process("stats.json", stats=stats)
+        report_path = os.path.join(self.RESULT_DIR, "report.json")
+        stats.write_report(report_path)
+
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+        self.assertSetEqual(set(PipelineStats.STAGES), set(report['stage_seconds']))
+        self.assertEqual(14, report['lines_emitted'])
@@ -0,0 +1,61 @@
+import datetime
+import unittest
+
+from pynopticon.aggregator import AverageAggregator, MedianAggregator, MinAggregator, MaxAggregator
+from pynopticon.event_processor import Event
+from pynopticon.window import share_windows
+
+
+class EventWindowTestCase(unittest.TestCase):
+    START = datetime.datetime(2018, 12, 26, 18, 11)
+
+    def _event(self, seconds, duration):
+        return Event(self.START + datetime.timedelta(seconds=seconds), duration, 10)
+
+    def test_share_windows_groups_by_configuration(self):
+        aggregators = [AverageAggregator(10), MedianAggregator(10), MinAggregator(5),
+                       MaxAggregator(10, use_word_count=True)]
+        stores = share_windows(aggregators)
+
+        self.assertEqual(2, len(stores))
+        self.assertIs(aggregators[0].window, aggregators[1].window)
+        self.assertIsNot(aggregators[0].window, aggregators[2].window)
+        self.assertIs(aggregators[0].window.store, aggregators[2].window.store)
+        self.assertIsNot(aggregators[0].window.store, aggregators[3].window.store)
+
+    def test_shared_window_feeds_every_reducer(self):
+        aggregators = [AverageAggregator(2), MedianAggregator(2), MinAggregator(2), MaxAggregator(2)]
+        store, = share_windows(aggregators)
+        store.window_lower_bound = self.START
+        for seconds, duration in [(5, 20), (30, 40), (70, 10), (100, 90)]:
+            store.add_event(self._event(seconds, duration))
+
+        store.shift_window()
+        store.shift_window()
+        self.assertEqual(4, len(store))
+        self.assertListEqual([40.0, 30.0, 10.0, 90.0], [x.aggregate() for x in aggregators])
+
+        store.shift_window()
+        self.assertEqual(2, len(store))
+        self.assertListEqual([50.0, 50.0, 10.0, 90.0], [x.aggregate() for x in aggregators])
+
+        store.shift_window()
+        self.assertEqual(0, len(store))
+        self.assertListEqual([0.0, 0.0, 0.0, 0.0], [x.aggregate() for x in aggregators])
+
+    def test_nested_windows_share_events(self):
+        aggregators = [AverageAggregator(1), AverageAggregator(3)]
+        store, = share_windows(aggregators)
+        store.window_lower_bound = self.START
+        for seconds, duration in [(5, 20), (70, 40), (130, 60)]:
+            store.add_event(self._event(seconds, duration))
+
+        store.shift_window()
+        store.shift_window()
+        store.shift_window()
+        self.assertEqual(3, len(store))
+        self.assertListEqual([60.0, 40.0], [x.aggregate() for x in aggregators])
+
+        store.shift_window()
+        self.assertEqual(2, len(store))
+        self.assertListEqual([0.0, 50.0], [x.aggregate() for x in aggregators])